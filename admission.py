@@ -0,0 +1,138 @@
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger("Admission")
+
+# Load shedding helpers shared by API-1, API-2 and API-2 MQ.
+# Everything here is cheap, in-process and lock free (single event loop).
+
+
+class Overloaded(Exception):
+    """Raised to turn a request away early; mapped to 429/503 + Retry-After by the APIs."""
+
+    def __init__(self, status_code, retry_after, reason):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Caps the number of requests being worked on at the same time."""
+
+    def __init__(self, max_in_flight, retry_after=1):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise Overloaded(429, self.retry_after, f"Too many requests in flight ({self.in_flight})")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+class CircuitBreaker:
+    """Fails fast while the downstream keeps failing.
+
+    closed    -> calls go through, consecutive failures are counted
+    open      -> calls are rejected with 503 until `reset_timeout` has passed
+    half-open -> a single trial call is let through; success closes, failure re-opens
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0 or self.trial_in_flight:
+            raise Overloaded(503, max(1, math.ceil(remaining)), "Downstream unavailable (circuit open)")
+        self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        # A call that ended without an answer: let the next call be the trial
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Circuit opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+def check_pool(pool, retry_after=1):
+    # Every connection of an aiomysql pool is checked out -> the DB side is saturated
+    if pool.size >= pool.maxsize and pool.freesize == 0:
+        raise Overloaded(503, retry_after, f"DB pool exhausted ({pool.size}/{pool.maxsize} in use)")
+
+
+class QueueDepthMonitor:
+    """Polls the RabbitMQ queue depth in the background so publishers can shed load
+    once the backlog passes `max_depth`, instead of checking it on every request."""
+
+    def __init__(self, channel, queue_name, max_depth, interval=1.0, retry_after=5):
+        self.channel = channel
+        self.queue_name = queue_name
+        self.max_depth = max_depth
+        self.interval = interval
+        self.retry_after = retry_after
+        self.depth = 0
+        self.task = None
+
+    @property
+    def saturated(self):
+        return self.depth >= self.max_depth
+
+    def check(self):
+        if self.saturated:
+            raise Overloaded(503, self.retry_after, f"Queue '{self.queue_name}' saturated ({self.depth} messages)")
+
+    async def poll(self):
+        while True:
+            try:
+                queue = await self.channel.declare_queue(self.queue_name, passive=True)
+                self.depth = queue.declaration_result.message_count
+            except Exception as e:
+                logger.error("Queue depth check failed : %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.task = asyncio.create_task(self.poll())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
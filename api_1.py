@@ -1,74 +1,42 @@
+import os
 import time
-import httpx
+import json
 from datetime import datetime
-from typing import List, Literal, Optional, Union
 from fastapi import FastAPI, Request, status, Response, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from pydantic import ValidationError
 from contextlib import asynccontextmanager
-import logging
-import sys
+import logs
+from models import CallPayload
+from sinks import create_sink
+from ingest import parse_call
+import metrics
+import timings
+from admission import AdmissionController, CircuitBreaker, Overloaded
 
-class CustomFormatter(logging.Formatter):
-    def format(self, record):
-        timestamp = self.formatTime(record, "%Y-%m-%d %H:%M:%S.%f")[:-3]
-        api_name = record.name
-        level = record.levelname
-        correlation_id = getattr(record, 'correlation_id', 'N/A')
-        message = record.getMessage()
-        
-        return f"[{timestamp}] [{level}] [{api_name}] [{correlation_id}] {message}"
+logger = logs.get_logger("API-1")
 
-def setup_logger(api_name):
-    logger = logging.getLogger(api_name)
-
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(CustomFormatter())
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-
-    return logger
-
-logger = setup_logger("API-1")
+SINK_MODE = os.getenv("API1_SINK", "http")
+MAX_IN_FLIGHT = int(os.getenv("API1_MAX_IN_FLIGHT", "500"))
+BREAKER_FAILURES = int(os.getenv("API1_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("API1_BREAKER_RESET_S", "5"))
 
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     try:
-        logger.info("Setting up httpx-Client...", extra={"correlation_id" : "SYSTEM"})
-        app.state.client = httpx.AsyncClient()
+        logger.info("Setting up '%s' sink...", SINK_MODE, extra={"correlation_id" : "SYSTEM"})
+        app.state.sink = create_sink(SINK_MODE)
+        await app.state.sink.start()
+        app.state.admission = AdmissionController(MAX_IN_FLIGHT)
+        app.state.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_S)
+        metrics.IN_FLIGHT.track(lambda: app.state.admission.in_flight, "api_1")
     except Exception as e:
         raise e
     yield
-    logger.info("Closing httpx-Client...", extra={"correlation_id" : "SYSTEM"})
-    await app.state.client.aclose()
-    logger.info("Closed httpx-Client...", extra={"correlation_id" : "SYSTEM"})
-
-
-class Participant(BaseModel):
-    participantAddress: str
-    participantType: str
-    status: str
-    duration: float
-
-class CallPayload(BaseModel):
-    Overall_Call_Status: Literal["Answered", "Missed", "Connected"]
-    Customer_Name: str
-    Client_Correlation_Id: str
-    callType: Literal["OUTBOUND", "INBOUND"]
-    conversationDuration: float
-    Overall_Call_Duration: str = Field(..., pattern=r"^\d{2}:\d{2}:\d{2}$")
-    Campaign_Id: str
-    Campaign_Name: str
-    Caller_ID: str
-    DTMF_Capture: Optional[Union[Literal[0, 1], None]] = None
-    participants: List[Participant]
-    timestamp: datetime  # Auto-parses "YYYY-MM-DD HH:MM:SS"
-    Session_ID: str
-
+    logger.info("Closing '%s' sink...", SINK_MODE, extra={"correlation_id" : "SYSTEM"})
+    await app.state.sink.close()
+    logger.info("Closed '%s' sink...", SINK_MODE, extra={"correlation_id" : "SYSTEM"})
 
 
 app = FastAPI(lifespan = lifespan)
@@ -87,29 +55,71 @@ async def validation_exception_handler(request : Request, err : RequestValidatio
         }
     )
 
+@app.exception_handler(Overloaded)
+async def overloaded_exception_handler(request : Request, err : Overloaded):
+    logger.warning("Shedding load => %s", err.reason, extra={"correlation_id" : "SYSTEM"})
+    return JSONResponse(
+        status_code=err.status_code,
+        headers={"Retry-After" : str(err.retry_after)},
+        content={
+            "status" : "error",
+            "message" : err.reason,
+            "processing_time_ms" : 0
+        }
+    )
+
+
+async def call_sink(app : FastAPI, send, *args):
+    # Fail fast while the sink is down; a saturated sink is alive, so it does not trip the breaker
+    app.state.breaker.check()
+    start = time.perf_counter()
+    try :
+        result = await send(*args)
+    except Overloaded:
+        app.state.breaker.record_success()
+        raise
+    except Exception:
+        app.state.breaker.record_failure()
+        raise
+    except BaseException:
+        # Cancelled (the client went away): nothing was learned about the sink
+        app.state.breaker.release_trial()
+        raise
+    finally:
+        metrics.FORWARD_SECONDS.observe(time.perf_counter() - start, app.state.sink.name, send.__name__)
+    app.state.breaker.record_success()
+    return result
+
 
 @app.post("/api/receive")
-async def receive_data(payload : CallPayload, request : Request):
+async def receive_data(request : Request):
+    # One validation pass straight from the raw bytes; the http sink forwards the
+    # validated model to API-2 marked as trusted (see ingest.py)
+    received_at_ms = timings.now_ms()
+    raw = await request.body()
+    start = time.perf_counter()
+    try :
+        payload = parse_call(raw)
+    finally:
+        metrics.VALIDATION_SECONDS.observe(time.perf_counter() - start, "api_1")
+    async with request.app.state.admission.admit():
+        return await forward_call(payload, request, received_at_ms)
+
+
+async def forward_call(payload : CallPayload, request : Request, received_at_ms : int = None):
     start_time = time.time()
     correlation_id = payload.Client_Correlation_Id
-    api_2_url = "http://127.0.0.1:8001/api/store"
+    data = None
     try : 
-        response = await request.app.state.client.post(
-            api_2_url,
-            json = payload.model_dump(mode="json"),
-            timeout = 10.0
-        )
-        response.raise_for_status()
-        if "application/json" in response.headers.get("content-type", ""):
-            data = response.json()
-        else:
-            # Fallback for HTML error pages or empty responses
-            data = {"error": "Invalid response format", "raw_body": response.text[:100]}
-        success = response.status_code < 400
-        success_status = "success" if success else "error"
-        message = "Data successfully sent!" if success else f"API_2 returned {response.status_code}"
+        data = await call_sink(request.app, request.app.state.sink.send, payload, received_at_ms)
+        success_status = data.get("status", "error")
+        # A duplicate is already stored (or queued): the retry succeeded, nothing new was written
+        success = success_status in ("success", "duplicate")
+        message = "Data successfully sent!" if success else f"{request.app.state.sink.name} sink returned : {data.get('message')}"
         time_taken = (time.time() - start_time)*1000
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error("Data forwarding failed...", extra={"correlation_id" : payload.Client_Correlation_Id})
         success_status = "error"
@@ -125,32 +135,118 @@ async def receive_data(payload : CallPayload, request : Request):
     }
 
 
-# @app.post("/api/store", status_code=status.HTTP_200_OK)
-# async def store_data(payload: CallPayload):
-#     """
-#     Receives CallPayload data and returns a 200 OK status with an empty body.
-#     """
-#     # Logic to process or save 'payload' would go here
-#     return Response(status_code=status.HTTP_200_OK)
-
-
-
-
-
-
-
-
 
+MAX_BATCH_RECORDS = 1000
 
+def parse_batch_body(body : bytes, content_type : str):
+    # Accepts either a JSON array or NDJSON (one JSON object per line); returns the raw
+    # JSON of each record, which is what gets validated and forwarded
+    if "ndjson" in content_type or not body.lstrip().startswith(b"["):
+        return [line for line in body.splitlines() if line.strip()]
+    records = json.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Batch body must be a JSON array or NDJSON")
+    return [json.dumps(record, separators=(",", ":")).encode() for record in records]
 
 
+def raw_correlation_id(raw : bytes):
+    # Only needed to label a record that failed validation
+    try :
+        record = json.loads(raw)
+    except ValueError:
+        return "unknown"
+    return record.get("Client_Correlation_Id", "unknown") if isinstance(record, dict) else "unknown"
 
 
+@app.post("/api/receive/batch")
+async def receive_batch(request : Request):
+    received_at_ms = timings.now_ms()
+    async with request.app.state.admission.admit():
+        return await forward_batch(request, received_at_ms)
 
 
+async def forward_batch(request : Request, received_at_ms : int = None):
+    start_time = time.time()
 
+    try :
+        records = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        logger.info("Unreadable batch body...", extra={"correlation_id" : "BATCH"})
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"status" : "error", "message" : f"Invalid batch body : {e}", "processing_time_ms" : 0}
+        )
+    if len(records) > MAX_BATCH_RECORDS:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"status" : "error", "message" : f"Batch exceeds {MAX_BATCH_RECORDS} records", "processing_time_ms" : 0}
+        )
 
+    # Validate every record on its own so one bad call does not reject the batch
+    results = []
+    valid = []
+    validation_start = time.perf_counter()
+    for index, raw in enumerate(records):
+        try :
+            payload = CallPayload.model_validate_json(raw)
+        except ValidationError as err:
+            results.append({
+                "index" : index,
+                "correlation_id" : raw_correlation_id(raw),
+                "status" : "error",
+                "message" : f"Validation failed : {err.errors()[0]['msg']}"
+            })
+            continue
+        results.append({"index" : index, "correlation_id" : payload.Client_Correlation_Id, "status" : "pending"})
+        valid.append((index, payload))
+    metrics.VALIDATION_SECONDS.observe(time.perf_counter() - validation_start, "api_1_batch")
+
+    if valid:
+        try :
+            stored = await call_sink(
+                request.app, request.app.state.sink.send_batch,
+                [payload for _, payload in valid], received_at_ms
+            )
+            for (index, _), item in zip(valid, stored):
+                results[index].update({
+                    "status" : item.get("status", "error"),
+                    "message" : item.get("message", ""),
+                    "record_id" : item.get("record_id")
+                })
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error("Batch forwarding failed => %s", type(e).__name__, extra={"correlation_id" : "BATCH"})
+            for index, _ in valid:
+                results[index].update({"status" : "error", "message" : f"Data forwarding failed => {type(e).__name__}"})
+
+    # Anything the sink did not answer for is reported as an error, never as pending
+    for item in results:
+        if item["status"] == "pending":
+            item.update({"status" : "error", "message" : "No result returned by the sink"})
+
+    accepted = sum(1 for item in results if item["status"] in ("success", "duplicate"))
+    duplicates = sum(1 for item in results if item["status"] == "duplicate")
+    return {
+        "status" : "success" if accepted == len(results) else "error",
+        "message" : f"{accepted}/{len(results)} records stored",
+        "accepted" : accepted,
+        "duplicates" : duplicates,
+        "rejected" : len(results) - accepted,
+        "processing_time_ms" : (time.time() - start_time)*1000,
+        "results" : results
+    }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
+# @app.post("/api/store", status_code=status.HTTP_200_OK)
+# async def store_data(payload: CallPayload):
+#     """
+#     Receives CallPayload data and returns a 200 OK status with an empty body.
+#     """
+#     # Logic to process or save 'payload' would go here
+#     return Response(status_code=status.HTTP_200_OK)
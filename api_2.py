@@ -1,15 +1,22 @@
+import os
 import time
 import json
 from datetime import datetime
 from typing import List, Literal, Optional, Union
 from fastapi import FastAPI, Request, status, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
 import aiomysql
-import logging
-import sys
+import logs
 from models import CallPayload
+from storage import payload_to_row, insert_records, write_rows, CoalescingWriter
+from dedupe import DuplicateRecord, recent_keys
+from wire import json_payload_to_row
+from ingest import is_trusted, parse_call, parse_batch
+import metrics
+import timings
+from admission import Overloaded, check_pool
 
 # class Participant(BaseModel):
 #     participantAddress: str
@@ -32,30 +39,7 @@ from models import CallPayload
 #     timestamp: datetime
 #     Session_ID: str
 
-class CustomFormatter(logging.Formatter):
-    def format(self, record):
-        timestamp = self.formatTime(record, "%Y-%m-%d %H:%M:%S.%f")[:-3]
-        api_name = record.name
-        level = record.levelname
-        correlation_id = getattr(record, 'correlation_id', 'N/A')
-        message = record.getMessage()
-        
-        return f"[{timestamp}] [{level}] [{api_name}] [{correlation_id}] {message}"
-
-def setup_logger(api_name):
-    logger = logging.getLogger(api_name)
-
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(CustomFormatter())
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-
-    return logger
-
-logger = setup_logger("API-2")
+logger = logs.get_logger("API-2")
 
 DB_CONFIG = {
     'host' : 'localhost',
@@ -66,6 +50,11 @@ DB_CONFIG = {
     'autocommit' : False
 }
 
+# Write coalescing: concurrent /api/store calls arriving within COALESCE_WINDOW_MS
+# (or until COALESCE_MAX_BATCH are waiting) share one INSERT and one commit. 0 disables it.
+COALESCE_WINDOW_MS = float(os.getenv("API2_COALESCE_WINDOW_MS", "2"))
+COALESCE_MAX_BATCH = int(os.getenv("API2_COALESCE_MAX_BATCH", "200"))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -78,10 +67,16 @@ async def lifespan(app: FastAPI):
             pool_recycle=3600
         )
         logger.info("Pool connected to DB....", extra={"correlation_id" : "SYSTEM"})
+        app.state.writer = None
+        if COALESCE_WINDOW_MS > 0:
+            app.state.writer = CoalescingWriter(app.state.pool, COALESCE_WINDOW_MS, COALESCE_MAX_BATCH)
+        metrics.track_pool(app.state.pool, "api_2")
     except Exception as e:
-        logger.error(f"Failed to connect DB : {e}....", exc_info=True, extra={"correlation_id" : "SYSTEM"})
+        logger.error("Failed to connect DB : %s....", e, exc_info=True, extra={"correlation_id" : "SYSTEM"})
         raise e
     yield
+    if app.state.writer:
+        await app.state.writer.close()
     logger.info("Closing the pool....", extra={"correlation_id" : "SYSTEM"})
     app.state.pool.close()
     await app.state.pool.wait_closed()
@@ -89,64 +84,71 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 
+@app.exception_handler(Overloaded)
+async def overloaded_exception_handler(request : Request, err : Overloaded):
+    logger.warning("Shedding load => %s", err.reason, extra={"correlation_id" : "SYSTEM"})
+    return JSONResponse(
+        status_code=err.status_code,
+        headers={"Retry-After" : str(err.retry_after)},
+        content={"status" : "error", "message" : err.reason}
+    )
+
 @app.post("/api/store")
-async def store_data(payload : CallPayload, request : Request):
+async def store_data(request : Request):
 
+    # Tell API-1 to back off instead of queueing on an exhausted pool
+    check_pool(request.app.state.pool)
     start_time = time.time()
-    participants_json = json.dumps([i.model_dump() for i in payload.participants])
-
-    query = """
-        INSERT INTO call_records (
-            overall_call_status, customer_name, client_correlation_id, 
-            call_type, conversation_duration, overall_call_duration, 
-            campaign_id, campaign_name, caller_id, dtmf_capture, 
-            participants_data, call_timestamp, session_id, storage_time_ms
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-    current_process_time = (time.time() - start_time) * 1000
-    values = (
-        payload.Overall_Call_Status,
-        payload.Customer_Name,
-        payload.Client_Correlation_Id,
-        payload.callType,
-        payload.conversationDuration,
-        payload.Overall_Call_Duration,
-        payload.Campaign_Id,
-        payload.Campaign_Name,
-        payload.Caller_ID,
-        payload.DTMF_Capture,
-        participants_json,
-        payload.timestamp,
-        payload.Session_ID,
-        current_process_time
-    )
+    received_at_ms = timings.received_at(request.headers)
+    # Start of the storage stage: storage_time_ms runs from here to the INSERT (see timings.py)
+    storing_at_ms = timings.now_ms(received_at_ms)
+    raw = await request.body()
+    trusted = is_trusted(request.headers)
+    validation_start = time.perf_counter()
+    if trusted:
+        # API-1 validated these exact bytes against the same CallPayload
+        record = json.loads(raw)
+        correlation_id = record['Client_Correlation_Id']
+    else:
+        payload = parse_call(raw)
+        correlation_id = payload.Client_Correlation_Id
+    metrics.VALIDATION_SECONDS.observe(time.perf_counter() - validation_start, "api_2_trusted" if trusted else "api_2")
+    if trusted:
+        values = json_payload_to_row(record, None, received_at_ms, consumed_at_ms=storing_at_ms)
+    else:
+        values = payload_to_row(payload, None, received_at_ms, consumed_at_ms=storing_at_ms)
 
     record_id = None
     status_msg = "error"
     message = ""
 
     try :
-        async with request.app.state.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                try:
-                    await cur.execute(query, values)
-                    await conn.commit()
-
-                    record_id = cur.lastrowid
-                    status_msg = "success"
-                    message = "Data stored successfully"
-                except Exception as e:
-                    logger.error(f"DB Inserting Failed : {e}", extra={"correlation_id" : payload.Client_Correlation_Id})
-                    await conn.rollback()
-                    raise e
+        # Either way, a retry of a call this process just stored never reaches MySQL
+        if request.app.state.writer:
+            # Shares one INSERT + commit with whatever else arrived in the same window
+            result = await request.app.state.writer.write(values)
+        else:
+            try:
+                result, = await write_rows(request.app.state.pool, [values])
+            except Exception as e:
+                logger.error("DB Inserting Failed : %s", e, extra={"correlation_id" : correlation_id})
+                raise e
+        if isinstance(result, DuplicateRecord):
+            record_id = result.record_id
+            status_msg = "duplicate"
+            message = "Already stored, duplicate ignored"
+        else:
+            record_id = result
+            status_msg = "success"
+            message = "Data stored successfully"
     except Exception as e:
         status_msg = "error"
         message = f"Storage failed -> {e}"
-        logger.error(f"Critical Error : {e}", extra={"correlation_id" : payload.Client_Correlation_Id})
+        logger.error("Critical Error : %s", e, extra={"correlation_id" : correlation_id})
     
     process_time = (time.time() - start_time) * 1000
-    logger.info(f"Insert operation complete. Time: {process_time:.2f}ms", 
-                extra={'correlation_id': payload.Client_Correlation_Id})
+    logger.info("Insert operation complete. Time: %.2fms", process_time,
+                extra={'correlation_id': correlation_id})
 
     return {
         "status" : status_msg,
@@ -156,3 +158,74 @@ async def store_data(payload : CallPayload, request : Request):
     }
 
 
+@app.post("/api/store/batch")
+async def store_batch(request : Request):
+
+    check_pool(request.app.state.pool)
+    start_time = time.time()
+    received_at_ms = timings.received_at(request.headers)
+    storing_at_ms = timings.now_ms(received_at_ms)
+    raw = await request.body()
+    trusted = is_trusted(request.headers)
+    validation_start = time.perf_counter()
+    if trusted:
+        records = json.loads(raw)
+        correlation_ids = [record['Client_Correlation_Id'] for record in records]
+        rows = [json_payload_to_row(record, None, received_at_ms, consumed_at_ms=storing_at_ms) for record in records]
+    else:
+        payloads = parse_batch(raw)
+        correlation_ids = [payload.Client_Correlation_Id for payload in payloads]
+        rows = [payload_to_row(payload, None, received_at_ms, consumed_at_ms=storing_at_ms) for payload in payloads]
+    metrics.VALIDATION_SECONDS.observe(time.perf_counter() - validation_start, "api_2_batch")
+
+    results = [None] * len(rows)
+    status_msg = "error"
+    message = ""
+
+    try :
+        # One multi-row INSERT and one commit for the whole batch
+        results = await write_rows(request.app.state.pool, rows)
+        duplicates = sum(1 for result in results if isinstance(result, DuplicateRecord))
+        status_msg = "success"
+        message = f"{len(rows) - duplicates} records stored successfully, {duplicates} duplicates ignored"
+    except Exception as e:
+        status_msg = "error"
+        message = f"Storage failed -> {e}"
+        logger.error("DB Batch Inserting Failed : %s", e, extra={"correlation_id" : "BATCH"})
+
+    process_time = (time.time() - start_time) * 1000
+    logger.info("Batch insert of %d records complete. Time: %.2fms", len(rows), process_time,
+                extra={'correlation_id': "BATCH"})
+
+    return {
+        "status" : status_msg,
+        "storage_time_ms" : process_time,
+        "message" : message,
+        "results" : [record_result(correlation_id, result, status_msg, message) for correlation_id, result in zip(correlation_ids, results)]
+    }
+
+
+def record_result(correlation_id, result, status_msg, message):
+    if isinstance(result, DuplicateRecord):
+        return {
+            "correlation_id" : correlation_id,
+            "status" : "duplicate",
+            "record_id" : result.record_id,
+            "message" : "Already stored, duplicate ignored"
+        }
+    return {
+        "correlation_id" : correlation_id,
+        "status" : status_msg,
+        "record_id" : result,
+        "message" : "Data stored successfully" if status_msg == "success" else message
+    }
+
+
+@app.get("/api/dedupe/stats")
+async def dedupe_stats():
+    return recent_keys.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,37 +1,26 @@
-import logging
+import os
+import logs
 import time
 from typing import Optional
-import sys
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel 
 from contextlib import asynccontextmanager
 import aiomysql
+from summary import GROUPED_SUMMARY_QUERY, build_summary
+import rollups
+import latency_sketches
+import watermark
+from query_cache import QueryCache, parse_window
+import timeseries
+import timings
+import export
+import hot_window
+import participants
+import metrics
 
 
-class CustomFormatter(logging.Formatter):
-    def format(self, record):
-        timestamp = self.formatTime(record, "%Y-%m-%d %H:%M:%S.%f")[:-3]
-        api_name = record.name
-        level = record.levelname
-        correlation_id = getattr(record, 'correlation_id', 'N/A')
-        message = record.getMessage()
-        
-        return f"[{timestamp}] [{level}] [{api_name}] [{correlation_id}] {message}"
-
-def setup_logger(api_name):
-    logger = logging.getLogger(api_name)
-
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(CustomFormatter())
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-
-    return logger
-
-logger = setup_logger("API-3")
+logger = logs.get_logger("API-3")
 
 
 
@@ -46,6 +35,9 @@ DB_CONFIG = {
     "db" : "call_center_db"
 }
 
+CACHE_TTL_S = float(os.getenv("API3_CACHE_TTL_S", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("API3_CACHE_MAX_ENTRIES", "1024"))
+
 @asynccontextmanager
 async def lifespan(app:FastAPI):
     logger.info("Setting up API-3...", extra = {"correlation_id" : "SYSTEM"})
@@ -56,10 +48,24 @@ async def lifespan(app:FastAPI):
             maxsize = 50,
         )
         logger.info("DB connected successfully...", extra = {"correlation_id" : "SYSTEM"})
+        metrics.track_pool(app.state.pool, "api_3")
     except Exception as e:
         logger.error("DB connection failed....", extra={"correlation_id" : "SYSTEM"})
         raise e
+    app.state.cache = QueryCache(CACHE_TTL_S, CACHE_MAX_ENTRIES)
+    app.state.watermark = None
+    if watermark.WATERMARK_ENABLED:
+        app.state.watermark = watermark.WatermarkFollower(app.state.pool, app.state.cache.invalidate)
+        app.state.watermark.start()
+    app.state.hot_window = None
+    if hot_window.HOT_WINDOW_MINUTES > 0:
+        app.state.hot_window = hot_window.HotWindowStore(app.state.pool, hot_window.HOT_WINDOW_MINUTES)
+        app.state.hot_window.start()
     yield
+    if app.state.hot_window:
+        await app.state.hot_window.stop()
+    if app.state.watermark:
+        await app.state.watermark.stop()
     logger.info("Closing DB_Pool...", extra={"correlation_id":"SYSTEM"})
     app.state.pool.close()
     await app.state.pool.wait_closed()
@@ -119,79 +125,315 @@ async def get_summary(
     date_to: Optional[str] = None
 ):
     correlation_id = "MONITOR-" + str(int(time.time()))
-    logger.info(f"Query received. Filters: Campaign={campaign_name}, Status={call_status}", 
+    logger.info("Query received. Filters: Campaign=%s, Status=%s", campaign_name, call_status,
                 extra={'correlation_id': correlation_id})
     
     start_time = time.time()
+
+    # Recent windows are answered from the in-memory columns, without touching MySQL
+    store = request.app.state.hot_window
+    mask = store.build_mask(campaign_name, dtmf, call_status, call_type, date_from, date_to) if store else None
+    if mask is not None:
+        groups = store.summary_groups(mask)
+        summary = build_summary(groups)
+        summary["performance_metrics"]["latency_percentiles"] = store.latency_percentiles(mask)
+        logger.info("Response generation complete. %d groups from hot window in %.2fms", len(groups), (time.time() - start_time)*1000,
+                    extra={'correlation_id': correlation_id})
+        return {
+            "summary": summary,
+            "source": "hot_window",
+            "percentile_source": "hot_window",
+            "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    where_sql, params = build_where_clause(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+    query = GROUPED_SUMMARY_QUERY.format(where_sql=where_sql)
+    source = "call_records"
+
+    # Filters that line up with the rollup dimensions (whole minutes) are answered
+    # from call_rollups_minute: O(buckets) instead of O(rows)
+    rollup_where = rollups.build_rollup_where(campaign_name, dtmf, call_status, call_type, date_from, date_to) \
+        if rollups.ROLLUPS_ENABLED else None
+    if rollup_where is not None:
+        where_sql, params = rollup_where
+        query = rollups.ROLLUP_SUMMARY_QUERY.format(where_sql=where_sql)
+        source = rollups.ROLLUP_TABLE
+
+    # Percentiles (SKETCHES_ENABLED=1 only): merge the per-minute sketches when the
+    # filters allow it, otherwise bin call_records on the fly (no sort either way)
+    percentile_query = percentile_source = None
+    if latency_sketches.SKETCHES_ENABLED:
+        percentile_where = latency_sketches.build_sketch_where(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+        if percentile_where is not None:
+            percentile_query = latency_sketches.SKETCH_MERGE_QUERY.format(where_sql=percentile_where[0])
+            percentile_params = percentile_where[1]
+            percentile_source = latency_sketches.SKETCH_TABLE
+        else:
+            records_where, records_params = build_where_clause(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+            percentile_query, percentile_params = latency_sketches.build_histogram_query(records_where, records_params)
+            percentile_source = "call_records"
+
+    async def load():
+        async with request.app.state.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                query_start = time.perf_counter()
+                # Single scan: one grouped query, every section is folded from it in Python
+                await cur.execute(query, params)
+                groups = await cur.fetchall()
+                if percentile_query is None:
+                    return groups, None
+                await cur.execute(percentile_query, percentile_params)
+                latency_bins = await cur.fetchall()
+                metrics.QUERY_SECONDS.observe(time.perf_counter() - query_start, "summary", source)
+                return groups, latency_bins
+
+    # Identical filters share one cached (or in-flight) execution
+    cache_key = (source, where_sql, tuple(params), percentile_source)
+    groups, latency_bins = await request.app.state.cache.get_or_load(cache_key, parse_window(date_from, date_to), load)
+
+    summary = build_summary(groups)
+    summary["performance_metrics"]["latency_percentiles"] = \
+        latency_sketches.build_percentiles(latency_bins) if latency_bins is not None else None
+    logger.info("Response generation complete. %d groups from %s in %.2fms", len(groups), source, (time.time() - start_time)*1000,
+                extra={'correlation_id': correlation_id})
+
+    return {
+        "summary": summary,
+        "source": source,
+        "percentile_source": percentile_source,
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+@app.get("/api/monitor/timeseries")
+async def get_timeseries(
+    request : Request,
+    bucket: str = Query("hour", pattern="^(minute|hour|day)$"),
+    latency: str = Query("storage", pattern="^(storage|processing)$"),
+    campaign_name: Optional[str] = None,
+    dtmf: Optional[str] = None,
+    call_status: Optional[str] = None,
+    call_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    correlation_id = "TIMESERIES-" + str(int(time.time()))
+    logger.info("Query received. Bucket=%s, Filters: Campaign=%s, Status=%s", bucket, campaign_name, call_status,
+                extra={'correlation_id': correlation_id})
+
+    buckets = timeseries.bucket_count(bucket, date_from, date_to)
+    if buckets is not None and buckets > timeseries.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{buckets} {bucket} buckets requested, at most {timeseries.MAX_BUCKETS} per request: use a larger bucket"
+        )
+
+    start_time = time.time()
+    where_sql, params = build_where_clause(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+    query = timeseries.build_timeseries_query(bucket, latency, where_sql)
+
+    async def load():
+        async with request.app.state.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    cache_key = ("timeseries", bucket, latency, where_sql, tuple(params))
+    rows = await request.app.state.cache.get_or_load(cache_key, parse_window(date_from, date_to), load)
+
+    series = timeseries.build_series(rows)
+    logger.info("Response generation complete. %d buckets from %d rows in %.2fms", len(series), len(rows), (time.time() - start_time)*1000,
+                extra={'correlation_id': correlation_id})
+
+    return {
+        "bucket": bucket,
+        "latency_metric": timeseries.LATENCY_METRICS[latency],
+        "series": series,
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+@app.get("/api/monitor/lag")
+async def get_lag(
+    request : Request,
+    bucket: str = Query("hour", pattern="^(minute|hour|day)$"),
+    stages: str = Query(",".join(timings.STAGES), pattern="^[a-z_]+(,[a-z_]+)*$"),
+    campaign_name: Optional[str] = None,
+    call_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """Ingest lag percentiles (received to INSERT) per campaign and time bucket, split by pipeline stage."""
+    correlation_id = "LAG-" + str(int(time.time()))
+    logger.info("Query received. Bucket=%s, Stages=%s, Filters: Campaign=%s", bucket, stages, campaign_name,
+                extra={'correlation_id': correlation_id})
+
+    stage_names = stages.split(",")
+    unknown = [stage for stage in stage_names if stage not in timings.STAGES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stages {unknown}, expected some of {list(timings.STAGES)}")
+    buckets = timeseries.bucket_count(bucket, date_from, date_to)
+    if buckets is not None and buckets > timeseries.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{buckets} {bucket} buckets requested, at most {timeseries.MAX_BUCKETS} per request: use a larger bucket"
+        )
+
+    start_time = time.time()
+    where_sql, params = build_where_clause(campaign_name, None, None, call_type, date_from, date_to)
+    query = timings.build_lag_query(bucket, stage_names, where_sql)
+
+    async def load():
+        async with request.app.state.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                query_start = time.perf_counter()
+                await cur.execute(query, params * len(stage_names))
+                rows = await cur.fetchall()
+                metrics.QUERY_SECONDS.observe(time.perf_counter() - query_start, "lag", "call_records")
+                return rows
+
+    cache_key = ("lag", bucket, tuple(stage_names), where_sql, tuple(params))
+    rows = await request.app.state.cache.get_or_load(cache_key, parse_window(date_from, date_to), load)
+
+    campaigns = timings.build_lag_report(rows)
+    logger.info("Response generation complete. %d campaigns from %d rows in %.2fms", len(campaigns), len(rows), (time.time() - start_time)*1000,
+                extra={'correlation_id': correlation_id})
+
+    return {
+        "bucket": bucket,
+        "stages": {stage : timings.STAGES[stage] for stage in stage_names},
+        "campaigns": campaigns,
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+@app.get("/api/monitor/export")
+async def export_records(
+    request : Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    campaign_name: Optional[str] = None,
+    dtmf: Optional[str] = None,
+    call_status: Optional[str] = None,
+    call_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    correlation_id = "EXPORT-" + str(int(time.time()))
+    logger.info("Export started. Format=%s, AfterId=%s, Filters: Campaign=%s, Status=%s", format, after_id, campaign_name, call_status,
+                extra={'correlation_id': correlation_id})
+
     where_sql, params = build_where_clause(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export.stream_export(request.app.state.pool, where_sql, params, format, after_id, limit),
+        media_type=media_type,
+        headers={"Content-Disposition" : f"attachment; filename=call_records.{format}"}
+    )
 
-    async with request.app.state.pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute(f"SELECT COUNT(*) as total FROM call_records {where_sql}", params)
-            total_calls = (await cur.fetchone())['total']
-            camp_query = f"""
-                SELECT campaign_name, COUNT(*) as total,
-                SUM(CASE WHEN overall_call_status='Answered' THEN 1 ELSE 0 END) as answered,
-                SUM(CASE WHEN overall_call_status='Missed' THEN 1 ELSE 0 END) as missed,
-                SUM(CASE WHEN overall_call_status='Connected' THEN 1 ELSE 0 END) as connected
-                FROM call_records {where_sql} GROUP BY campaign_name
-            """
-            await cur.execute(camp_query, params)
-            by_campaign = await cur.fetchall()
-            dtmf_query = f"""
-                SELECT dtmf_capture as dtmf_value, COUNT(*) as total,
-                SUM(CASE WHEN overall_call_status='Answered' THEN 1 ELSE 0 END) as answered,
-                SUM(CASE WHEN overall_call_status='Missed' THEN 1 ELSE 0 END) as missed,
-                SUM(CASE WHEN overall_call_status='Connected' THEN 1 ELSE 0 END) as connected
-                FROM call_records {where_sql} GROUP BY dtmf_capture
-            """
-            await cur.execute(dtmf_query, params)
-            by_dtmf = await cur.fetchall()
-            # 4. Breakdown by Call Status (with percentage)
-            status_query = f"SELECT overall_call_status as status, COUNT(*) as count FROM call_records {where_sql} GROUP BY overall_call_status"
-            await cur.execute(status_query, params)
-            by_status = await cur.fetchall()
-            for item in by_status:
-                item['percentage'] = round((item['count'] / total_calls * 100), 2) if total_calls > 0 else 0
-            # 5. Breakdown by Call Type
-            try :
-                logger.info("Executing 'call_type' block...", extra={'correlation_id': correlation_id})
-                type_query = f"SELECT call_type as type, COUNT(*) as count FROM call_records {where_sql} GROUP BY call_type"
-                await cur.execute(type_query, params)
-                by_call_type = await cur.fetchall()
-            except Exception as e:
-                logger.error("Code crashed in 'call_type' block...", extra={'correlation_id': correlation_id})
-                logger.error(f"Failed sql query... : {type_query}", extra={'correlation_id': correlation_id})
-                logger.error(f"params : {params}", extra={'correlation_id': correlation_id})
-                by_status = []
-            # 6. Performance Metrics (Avg times)
-            perf_query = f"""
-                SELECT AVG(processing_time_ms) as avg_processing, 
-                    AVG(storage_time_ms) as avg_storage 
-                FROM call_records {where_sql}
-            """
-            await cur.execute(perf_query, params)
-            perf_data = await cur.fetchone()
-        
-    logger.info("Response generation complete.", extra={'correlation_id': correlation_id})
 
+@app.get("/api/monitor/records")
+async def get_records(
+    request : Request,
+    after_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=export.MAX_PAGE_LIMIT),
+    campaign_name: Optional[str] = None,
+    dtmf: Optional[str] = None,
+    call_status: Optional[str] = None,
+    call_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    where_sql, params = build_where_clause(campaign_name, dtmf, call_status, call_type, date_from, date_to)
+    rows = await export.fetch_page(request.app.state.pool, where_sql, params, after_id, limit)
     return {
-        "summary": {
-            "total_calls": total_calls,
-            "by_campaign": by_campaign,
-            "by_dtmf": by_dtmf,
-            "by_call_status": by_status,
-            "by_call_type": by_call_type,
-            "performance_metrics": {
-                "avg_processing_time_ms": round(perf_data['avg_processing'] or 0, 2),
-                "avg_storage_time_ms": round(perf_data['avg_storage'] or 0, 2),
-                "total_requests": total_calls,
-                "successful_requests": total_calls 
-            }
-        },
+        "records": [export.row_to_record(row) for row in rows],
+        # Pass back as after_id for the next page; None once the filter is exhausted
+        "next_after_id": rows[-1][0] if len(rows) == limit else None
+    }
+
+
+@app.get("/api/monitor/participants")
+async def get_participants(
+    request : Request,
+    participant_type: Optional[str] = None,
+    campaign_name: Optional[str] = None,
+    call_status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    correlation_id = "PARTICIPANTS-" + str(int(time.time()))
+    start_time = time.time()
+    where_sql, params = participants.build_participant_where(None, participant_type, campaign_name, call_status, date_from, date_to)
+    query = participants.build_participant_query(where_sql)
+
+    async def load():
+        async with request.app.state.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    cache_key = ("participants", where_sql, tuple(params))
+    groups = await request.app.state.cache.get_or_load(cache_key, parse_window(date_from, date_to), load)
+
+    results = participants.build_participant_list(groups, limit)
+    logger.info("Response generation complete. %d participants in %.2fms", len(results), (time.time() - start_time)*1000,
+                extra={'correlation_id': correlation_id})
+    return {
+        "participants": results,
         "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
     }
 
 
+@app.get("/api/monitor/participants/{participant_address}")
+async def get_participant(
+    request : Request,
+    participant_address: str,
+    participant_type: Optional[str] = None,
+    campaign_name: Optional[str] = None,
+    call_status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    where_sql, params = participants.build_participant_where(
+        participant_address, participant_type, campaign_name, call_status, date_from, date_to
+    )
+    query = participants.build_participant_query(where_sql, by_campaign=True)
+
+    async def load():
+        async with request.app.state.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    cache_key = ("participant", where_sql, tuple(params))
+    groups = await request.app.state.cache.get_or_load(cache_key, parse_window(date_from, date_to), load)
+    if not groups:
+        raise HTTPException(status_code=404, detail=f"No calls for participant {participant_address}")
+
+    return {
+        "participant_address": participant_address,
+        **participants.build_participant_detail(groups),
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+@app.get("/api/monitor/hot-window")
+async def get_hot_window_stats(request : Request):
+    store = request.app.state.hot_window
+    return store.stats() if store else {"enabled" : False}
+
+
+@app.get("/api/monitor/cache")
+async def get_cache_stats(request : Request):
+    return {
+        **request.app.state.cache.stats(),
+        "watermark_invalidation" : request.app.state.watermark is not None
+    }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
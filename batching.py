@@ -0,0 +1,61 @@
+import asyncio
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into batches.
+
+    `submit(item)` parks the caller until its batch has been handled. A batch is
+    dispatched when `max_batch` items are waiting or `window_ms` after the first
+    item arrived, whichever comes first. `flush(items)` must return one result per
+    item (in order); an Exception instance in that list fails only that caller,
+    while an exception raised by `flush` fails the whole batch.
+    """
+
+    def __init__(self, flush, window_ms, max_batch):
+        self.flush = flush
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_batch:
+            self.dispatch()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.dispatch)
+        return await future
+
+    def dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        task = asyncio.create_task(self.run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch):
+        try:
+            results = await self.flush([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        self.dispatch()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -0,0 +1,116 @@
+"""Which bulk-load strategy wins at which batch size?
+
+Runs every strategy from bulk_load.py against a scratch copy of call_records
+(`call_records_bench`, created LIKE call_records) on a real MySQL server and
+writes rows/sec per (strategy, batch size) to benchmarks/results/.
+
+    python -m benchmarks.bulk_load --sizes 100 500 2000 10000 50000 --repeats 5
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import aiomysql
+from datetime import datetime
+from bulk_load import STRATEGIES
+from timings import row_tail
+
+DB_CONFIG = {
+    "user" : "root",
+    "host" : "localhost",
+    "port" : 3306,
+    "db" : "call_center_db",
+    "password" : "",
+    "autocommit" : False,
+    "local_infile" : True
+}
+BENCH_TABLE = "call_records_bench"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def make_rows(count):
+    rows = []
+    for _ in range(count):
+        rows.append((
+            random.choice(["Answered", "Missed", "Connected"]),
+            f"User_{random.randint(1, 1000)}",
+            str(uuid.uuid4()),
+            random.choice(["INBOUND", "OUTBOUND"]),
+            round(random.uniform(10.0, 300.0), 2),
+            "00:05:00",
+            "CAMP_A",
+            random.choice(["Sales_Team", "Support", "Retention"]),
+            "+19876543210",
+            random.choice([0, 1, None]),
+            json.dumps([{"participantAddress": "Agent_007", "participantType": "AGENT",
+                         "status": "connected", "duration": 120.5}]),
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            f"SESS_{random.randint(1000, 9999)}",
+            *row_tail(0)
+        ))
+    return rows
+
+
+async def run(sizes, repeats, strategies):
+    pool = await aiomysql.create_pool(**DB_CONFIG, minsize=1, maxsize=1)
+    results = []
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"CREATE TABLE IF NOT EXISTS {BENCH_TABLE} LIKE call_records")
+            for size in sizes:
+                rows = make_rows(size)
+                for name in strategies:
+                    timings = []
+                    for _ in range(repeats):
+                        await cur.execute(f"TRUNCATE TABLE {BENCH_TABLE}")
+                        start = time.perf_counter()
+                        await STRATEGIES[name](conn, cur, rows, BENCH_TABLE)
+                        await conn.commit()
+                        timings.append(time.perf_counter() - start)
+                    best = min(timings)
+                    results.append({
+                        "strategy" : name,
+                        "batch_size" : size,
+                        "best_ms" : round(best * 1000, 3),
+                        "median_ms" : round(sorted(timings)[len(timings) // 2] * 1000, 3),
+                        "rows_per_sec" : round(size / best)
+                    })
+                    print(f"{name:>12} x {size:>6} rows : {size / best:>12,.0f} rows/s")
+            await cur.execute(f"DROP TABLE {BENCH_TABLE}")
+    pool.close()
+    await pool.wait_closed()
+    return results
+
+
+def winners(results):
+    best = {}
+    for item in results:
+        size = item["batch_size"]
+        if size not in best or item["rows_per_sec"] > best[size]["rows_per_sec"]:
+            best[size] = item
+    return {size : item["strategy"] for size, item in sorted(best.items())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000, 10000, 50000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--strategies", nargs="+", default=["executemany", "multirow", "load_data"])
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.sizes, args.repeats, args.strategies))
+    report = {
+        "benchmark" : "bulk_load",
+        "generated_at" : time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results" : results,
+        "winner_by_batch_size" : winners(results)
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"bulk_load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["winner_by_batch_size"], indent=2))
+    print(f"Saved to {path}")
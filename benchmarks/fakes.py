@@ -0,0 +1,192 @@
+"""In-memory stand-ins for aiomysql and aio-pika, for benchmarks that run offline.
+
+They implement only what the services call (pool.acquire / cursor / commit,
+channel / default_exchange.publish / declare_queue) and add a fixed latency per
+statement or publish, so the numbers measure our own code plus a nominal I/O cost
+instead of a real server. Reads answer from canned result sets (see FakeDatabase).
+"""
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from pymysql.converters import escape_item
+from pamqp.commands import Basic
+from storage import CALL_RECORD_COLUMNS
+
+MAX_ALLOWED_PACKET = 64 * 1024 * 1024
+
+
+class FakeDatabase:
+    """Statement log plus canned answers, shared by every connection of a FakePool.
+
+    `routes` is a list of (substring, rows) tried in order against each statement;
+    rows are dicts (DictCursor) and are turned into tuples for plain cursors.
+    Anything unmatched returns no rows.
+    """
+
+    def __init__(self, latency_ms=0.0, routes=()):
+        self.latency_s = latency_ms / 1000
+        self.routes = [("@@max_allowed_packet", [{"@@max_allowed_packet" : MAX_ALLOWED_PACKET}]), *routes]
+        self.next_id = itertools.count(1)
+        self.statements = 0
+        self.commits = 0
+        self.rows_inserted = 0
+
+    def answer(self, query):
+        for needle, rows in self.routes:
+            if needle in query:
+                return rows
+        return []
+
+
+class FakeCursor:
+    def __init__(self, db, dict_rows):
+        self.db = db
+        self.dict_rows = dict_rows
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        self.db.statements += 1
+        if self.db.latency_s:
+            await asyncio.sleep(self.db.latency_s)
+        if query.lstrip().upper().startswith("INSERT INTO CALL_RECORDS"):
+            # Parameterized multi-row INSERT, or pre-escaped VALUES (...),(...) chunks
+            count = len(args) // len(CALL_RECORD_COLUMNS) if args else query.count("),(") + 1
+            self.lastrowid = next(self.db.next_id)
+            for _ in range(count - 1):
+                next(self.db.next_id)
+            self.db.rows_inserted += count
+            self.rowcount = count
+            self.rows = []
+            return count
+        self.rows = self.db.answer(query)
+        self.rowcount = len(self.rows)
+        return self.rowcount
+
+    async def executemany(self, query, args):
+        for row in args:
+            await self.execute(query, row)
+
+    def shape(self, row):
+        return row if self.dict_rows else tuple(row.values())
+
+    async def fetchone(self):
+        return self.shape(self.rows[0]) if self.rows else None
+
+    async def fetchall(self):
+        return [self.shape(row) for row in self.rows]
+
+    async def fetchmany(self, size=None):
+        rows, self.rows = self.rows[:size or 1], self.rows[size or 1:]
+        return [self.shape(row) for row in rows]
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db, cursor_class is not None and "Dict" in cursor_class.__name__)
+
+    def escape(self, value):
+        return escape_item(value, "utf8mb4")
+
+    async def commit(self):
+        self.db.commits += 1
+        if self.db.latency_s:
+            await asyncio.sleep(self.db.latency_s)
+
+    async def rollback(self):
+        pass
+
+
+class FakePool:
+    """aiomysql pool surface: `maxsize` connections, callers queue for a free one."""
+
+    def __init__(self, db, maxsize=50):
+        self.db = db
+        self.maxsize = maxsize
+        self.size = maxsize
+        self.freesize = maxsize
+        self.slots = asyncio.Semaphore(maxsize)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.slots:
+            self.freesize -= 1
+            try :
+                yield FakeConnection(self.db)
+            finally:
+                self.freesize += 1
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class FakeDeclaration:
+    def __init__(self, message_count):
+        self.message_count = message_count
+
+
+class FakeQueue:
+    def __init__(self, broker, name):
+        self.broker = broker
+        self.name = name
+
+    @property
+    def declaration_result(self):
+        return FakeDeclaration(len(self.broker.queues[self.name]))
+
+
+class FakeExchange:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def publish(self, message, routing_key, mandatory=False):
+        if self.broker.latency_s:
+            await asyncio.sleep(self.broker.latency_s)
+        self.broker.queues.setdefault(routing_key, []).append(message)
+        return Basic.Ack(delivery_tag=len(self.broker.queues[routing_key]))
+
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.default_exchange = FakeExchange(broker)
+
+    async def declare_queue(self, name, durable=False, passive=False):
+        self.broker.queues.setdefault(name, [])
+        return FakeQueue(self.broker, name)
+
+    async def set_qos(self, prefetch_count=0):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeBroker:
+    """One in-memory RabbitMQ: queues are lists of the published aio_pika.Message objects.
+
+    Every publish is acked after `latency_ms`, like a broker confirming to disk.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_s = latency_ms / 1000
+        self.queues = {}
+
+    async def channel(self, publisher_confirms=False):
+        return FakeChannel(self)
+
+    async def close(self):
+        pass
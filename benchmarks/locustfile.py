@@ -0,0 +1,76 @@
+"""Locust profile for batch ingest and monitoring traffic against the running services.
+
+Unlike the top-level locustfile.py (single calls, one campaign), callers here send
+NDJSON batches and single calls with the campaign / status mix from
+benchmarks/traffic.py, while dashboard users poll API-3 with mixed filters.
+
+    locust -f benchmarks/locustfile.py
+    LOCUST_BATCH_SIZE=200 locust -f benchmarks/locustfile.py --headless -u 200 -r 20 -t 5m
+
+Hosts default to the local ports and can be moved with API_1_HOST / API_3_HOST.
+"""
+import os
+import random
+from locust import HttpUser, task, between, constant_pacing
+from benchmarks import traffic
+
+API_1_HOST = os.getenv("API_1_HOST", "http://127.0.0.1:8000")
+API_3_HOST = os.getenv("API_3_HOST", "http://127.0.0.1:8002")
+BATCH_SIZE = int(os.getenv("LOCUST_BATCH_SIZE", "100"))
+
+
+def check_ingest(response):
+    if response.status_code != 200:
+        response.failure(f"HTTP Error: {response.status_code}")
+        return
+    body = response.json()
+    if body.get("status") not in ("success", "duplicate"):
+        response.failure(f"API Logic Error: {body.get('message')}")
+    else:
+        response.success()
+
+
+class IngestUser(HttpUser):
+    """A dialer pushing finished calls: mostly batches, some single calls."""
+    host = API_1_HOST
+    weight = 4
+    # One request per second per user, however long the request itself took
+    wait_time = constant_pacing(1)
+
+    @task(3)
+    def send_batch(self):
+        body = traffic.make_ndjson(BATCH_SIZE, random)
+        with self.client.post("/api/receive/batch", data=body, headers={"content-type" : "application/x-ndjson"},
+                              name=f"/api/receive/batch [{BATCH_SIZE}]", catch_response=True) as response:
+            check_ingest(response)
+
+    @task(1)
+    def send_call(self):
+        with self.client.post("/api/receive", data=traffic.make_body(random),
+                              headers={"content-type" : "application/json"}, catch_response=True) as response:
+            check_ingest(response)
+
+
+class MonitorUser(HttpUser):
+    """A dashboard refreshing its panels."""
+    host = API_3_HOST
+    weight = 1
+    wait_time = between(2, 5)
+
+    @task(6)
+    def summary(self):
+        self.client.get("/api/monitor/summary", params=traffic.monitor_filters(random), name="/api/monitor/summary")
+
+    @task(2)
+    def timeseries(self):
+        campaign = random.choice(list(traffic.CAMPAIGNS))
+        self.client.get("/api/monitor/timeseries", params={"campaign_name" : campaign, "bucket" : "minute"},
+                        name="/api/monitor/timeseries")
+
+    @task(1)
+    def lag(self):
+        self.client.get("/api/monitor/lag", params={"bucket" : "minute"}, name="/api/monitor/lag")
+
+    @task(1)
+    def participants(self):
+        self.client.get("/api/monitor/participants", params={"limit" : 20}, name="/api/monitor/participants")
@@ -0,0 +1,349 @@
+"""Offline end-to-end benchmark: every stage in-process, no MySQL or RabbitMQ needed.
+
+Each service's FastAPI app is driven through httpx's ASGITransport with the state
+its lifespan would have set up, backed by the stand-ins in benchmarks/fakes.py
+(a fake aiomysql pool and an in-memory broker, each with a fixed per-call latency).
+Stages run one after another with synthetic traffic from benchmarks/traffic.py:
+
+    api_1     POST /api/receive, forwarded by the http sink into API-2 (in-process)
+    api_2     POST /api/store on API-2 (coalescing writer as configured)
+    api_2_mq  POST /api/store on API-2 MQ (confirming publisher)
+    worker    worker.flush_buffer over the messages API-2 MQ published
+    api_3     GET /api/monitor/summary with dashboard-like filters (cache off by default)
+
+Throughput and p50/p99 per stage go to benchmarks/results/pipeline-<time>.json.
+Pass an earlier report as --baseline to flag regressions against it:
+
+    python -m benchmarks.pipeline --requests 5000 --concurrency 32
+    python -m benchmarks.pipeline --baseline benchmarks/results/pipeline-20250101-120000.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import importlib.util
+import logging
+import httpx
+import ingest
+import wire
+import timings
+import dedupe
+import api_1
+import api_2
+import api_3
+import worker
+from sinks import HttpSink
+from storage import CoalescingWriter
+from publisher import ConfirmingPublisher
+from admission import AdmissionController, CircuitBreaker, QueueDepthMonitor
+from query_cache import QueryCache
+from models import CallPayload
+from summary import STATUSES
+from sketch import bin_index
+from latency_sketches import LATENCY_COLUMNS
+from benchmarks import traffic
+from benchmarks.fakes import FakeDatabase, FakePool, FakeBroker
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("api_1", "api_2", "api_2_mq", "worker", "api_3")
+
+
+def load_api_2_mq():
+    # The module name has a dash, so it cannot be imported the usual way
+    spec = importlib.util.spec_from_file_location("api_2_mq", os.path.join(ROOT_DIR, "api-2_mq.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def summary_routes(rng, calls=100000):
+    """Canned answers for API-3: grouped rows and latency bins shaped like real data."""
+    groups = []
+    for campaign, (_, campaign_share) in traffic.CAMPAIGNS.items():
+        for dtmf, dtmf_share in traffic.DTMF.items():
+            for status in STATUSES:
+                for call_type, type_share in traffic.CALL_TYPES.items():
+                    total = int(calls * campaign_share * dtmf_share * traffic.STATUSES[status] * type_share)
+                    groups.append({
+                        "campaign_name" : campaign, "dtmf_capture" : dtmf,
+                        "overall_call_status" : status, "call_type" : call_type,
+                        "total" : total,
+                        "processing_sum" : total * rng.uniform(20, 60), "processing_count" : total,
+                        "storage_sum" : total * rng.uniform(2, 8), "storage_count" : total
+                    })
+
+    bins = []
+    for metric, median in zip(LATENCY_COLUMNS, (40.0, 5.0)):
+        counts = {}
+        maximum = 0.0
+        for _ in range(5000):
+            value = rng.lognormvariate(0, 0.6) * median
+            counts[bin_index(value)] = counts.get(bin_index(value), 0) + 1
+            maximum = max(maximum, value)
+        bins.extend({"metric" : metric, "bin_index" : index, "count" : count, "max_value" : maximum}
+                    for index, count in counts.items())
+    return [("GROUP BY campaign_name, dtmf_capture", groups), ("bin_index", bins)]
+
+
+def percentile(samples, p):
+    return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3) if samples else 0
+
+
+def stage_result(stage, latencies, errors, elapsed, concurrency, records=None):
+    samples = sorted(latencies)
+    result = {
+        "stage" : stage,
+        "requests" : len(samples),
+        "concurrency" : concurrency,
+        "errors" : errors,
+        "throughput_per_s" : round(len(samples) / elapsed, 1) if elapsed else 0,
+        "p50_ms" : percentile(samples, 0.50),
+        "p99_ms" : percentile(samples, 0.99),
+        "max_ms" : round(samples[-1], 3) if samples else 0
+    }
+    if records is not None:
+        result["records_per_s"] = round(records / elapsed, 1) if elapsed else 0
+    print(f"{stage:>9} : {result['throughput_per_s']:>10,.1f} /s   p50 {result['p50_ms']:>8.3f} ms   "
+          f"p99 {result['p99_ms']:>8.3f} ms   errors {errors}")
+    return result
+
+
+async def drive(items, concurrency, call):
+    """Runs `call(item)` for every item with `concurrency` callers; returns (latencies, errors, elapsed)."""
+    pending = iter(items)
+    latencies = []
+    errors = 0
+
+    async def caller():
+        nonlocal errors
+        for item in pending:
+            start = time.perf_counter()
+            try :
+                ok = await call(item)
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - start
+
+
+def accepted(response):
+    return response.status_code == 200 and response.json().get("status") in ("success", "duplicate")
+
+
+class Pipeline:
+    """The services wired to each other and to the fakes, as their lifespans would."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.db = FakeDatabase(args.db_latency_ms, summary_routes(self.rng))
+        self.pool = FakePool(self.db, args.pool_size)
+        self.broker = FakeBroker(args.mq_latency_ms)
+        self.api_2_mq = load_api_2_mq()
+        self.clients = []
+
+    def client(self, app):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        self.clients.append(client)
+        return client
+
+    async def start(self):
+        # API-2
+        api_2.app.state.pool = self.pool
+        api_2.app.state.writer = None
+        if api_2.COALESCE_WINDOW_MS > 0:
+            api_2.app.state.writer = CoalescingWriter(self.pool, api_2.COALESCE_WINDOW_MS, api_2.COALESCE_MAX_BATCH)
+
+        # API-1, forwarding over HTTP into the in-process API-2
+        sink = HttpSink()
+        sink.client = self.client(api_2.app)
+        api_1.app.state.sink = sink
+        api_1.app.state.admission = AdmissionController(api_1.MAX_IN_FLIGHT)
+        api_1.app.state.breaker = CircuitBreaker(api_1.BREAKER_FAILURES, api_1.BREAKER_RESET_S)
+
+        # API-2 MQ
+        mq = self.api_2_mq
+        publisher = ConfirmingPublisher(
+            self.broker, mq.QUEUE_NAME,
+            channels=mq.PUBLISH_CHANNELS,
+            batch_records=mq.PUBLISH_BATCH_RECORDS,
+            linger_ms=mq.PUBLISH_LINGER_MS,
+            wire_format=mq.WIRE_FORMAT
+        )
+        await publisher.start()
+        mq.app.state.publisher = publisher
+        mq.app.state.queue_depth = QueueDepthMonitor(await self.broker.channel(), mq.QUEUE_NAME, mq.MAX_QUEUE_DEPTH)
+
+        # API-3
+        api_3.app.state.pool = self.pool
+        api_3.app.state.cache = QueryCache(self.args.monitor_cache_ttl, api_3.CACHE_MAX_ENTRIES)
+        api_3.app.state.watermark = None
+        api_3.app.state.hot_window = None
+
+    async def close(self):
+        if api_2.app.state.writer:
+            await api_2.app.state.writer.close()
+        await self.api_2_mq.app.state.publisher.close()
+        for client in self.clients:
+            await client.aclose()
+
+    def bodies(self, count):
+        return [traffic.make_body(self.rng) for _ in range(count)]
+
+    def trust(self, body):
+        # What API-1's http sink adds when INGEST_TRUST_TOKEN is set
+        if not self.args.trusted:
+            return {}
+        payload = CallPayload.model_validate_json(body)
+        return {"content-type" : "application/json", **ingest.trust_headers(payload)}
+
+    async def run_api_1(self, count):
+        client = self.client(api_1.app)
+
+        async def call(body):
+            return accepted(await client.post("/api/receive", content=body,
+                                              headers={"content-type" : "application/json"}))
+        return await drive(self.bodies(count), self.args.concurrency, call)
+
+    async def run_api_2(self, count):
+        client = self.client(api_2.app)
+        # Headers are prepared up front so the trusted run does not time API-1's validation
+        requests = [(body, self.trust(body)) for body in self.bodies(count)]
+
+        async def call(request):
+            body, headers = request
+            return accepted(await client.post("/api/store", content=body,
+                                              headers=headers or {"content-type" : "application/json"}))
+        return await drive(requests, self.args.concurrency, call)
+
+    async def run_api_2_mq(self, count):
+        client = self.client(self.api_2_mq.app)
+        requests = [(body, self.trust(body)) for body in self.bodies(count)]
+
+        async def call(request):
+            body, headers = request
+            return accepted(await client.post("/api/store", content=body,
+                                              headers=headers or {"content-type" : "application/json"}))
+        return await drive(requests, self.args.concurrency, call)
+
+    async def run_worker(self):
+        # Consumes what the api_2_mq stage published, in BATCH_SIZE batches like a Consumer
+        messages, self.broker.queues[self.api_2_mq.QUEUE_NAME] = self.broker.queues.get(self.api_2_mq.QUEUE_NAME, []), []
+        # The worker is a process of its own: it has not seen the keys API-2 MQ published
+        dedupe.recent_keys.keys.clear()
+        records = []
+        for message in messages:
+            records.extend(wire.decode(message.body, message.content_type, message.headers, timings.now_ms()))
+        batches = [records[i:i + worker.BATCH_SIZE] for i in range(0, len(records), worker.BATCH_SIZE)]
+
+        async def call(batch):
+            failures, _ = await worker.flush_buffer(self.pool, batch)
+            return not failures
+        latencies, errors, elapsed = await drive(batches, worker.FLUSH_CONCURRENCY, call)
+        return latencies, errors, elapsed, len(records)
+
+    async def run_api_3(self, count):
+        client = self.client(api_3.app)
+        filters = [traffic.monitor_filters(self.rng) for _ in range(count)]
+
+        async def call(params):
+            return (await client.get("/api/monitor/summary", params=params)).status_code == 200
+        return await drive(filters, self.args.concurrency, call)
+
+
+async def run(args):
+    if args.trusted:
+        ingest.TRUST_TOKEN = ingest.TRUST_TOKEN or "benchmark"
+    pipeline = Pipeline(args)
+    await pipeline.start()
+    results = []
+    try :
+        for stage in args.stages:
+            if stage == "worker":
+                if "api_2_mq" not in args.stages:
+                    await pipeline.run_api_2_mq(args.requests)
+                latencies, errors, elapsed, records = await pipeline.run_worker()
+                results.append(stage_result(stage, latencies, errors, elapsed, worker.FLUSH_CONCURRENCY, records))
+                continue
+            runner = getattr(pipeline, f"run_{stage}")
+            await runner(args.warmup)
+            if stage == "api_2_mq":
+                # Warm-up messages would otherwise be counted by the worker stage
+                pipeline.broker.queues[pipeline.api_2_mq.QUEUE_NAME] = []
+            latencies, errors, elapsed = await runner(args.requests)
+            results.append(stage_result(stage, latencies, errors, elapsed, args.concurrency))
+    finally:
+        await pipeline.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Per stage: change in throughput and p99 against `baseline`, flagged past `threshold`."""
+    previous = {item["stage"] : item for item in baseline.get("results", [])}
+    comparison = []
+    for item in results:
+        before = previous.get(item["stage"])
+        if not before:
+            continue
+        throughput_change = (item["throughput_per_s"] - before["throughput_per_s"]) / before["throughput_per_s"] \
+            if before["throughput_per_s"] else 0
+        p99_change = (item["p99_ms"] - before["p99_ms"]) / before["p99_ms"] if before["p99_ms"] else 0
+        regression = throughput_change < -threshold or p99_change > threshold
+        comparison.append({
+            "stage" : item["stage"],
+            "throughput_change" : round(throughput_change, 4),
+            "p99_change" : round(p99_change, 4),
+            "regression" : regression
+        })
+        print(f"{item['stage']:>9} : throughput {throughput_change:>+7.1%}   p99 {p99_change:>+7.1%}"
+              f"{'   REGRESSION' if regression else ''}")
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--requests", type=int, default=5000, help="requests per stage")
+    parser.add_argument("--warmup", type=int, default=200, help="untimed requests before each stage")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="added to every statement and commit")
+    parser.add_argument("--mq-latency-ms", type=float, default=0.5, help="added to every publish confirm")
+    parser.add_argument("--monitor-cache-ttl", type=float, default=0, help="API-3 cache TTL (0 = always query)")
+    parser.add_argument("--trusted", action="store_true", help="send API-1's trusted headers (see ingest.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the services' per-request logs")
+    parser.add_argument("--baseline", help="earlier pipeline report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = asyncio.run(run(args))
+    report = {
+        "benchmark" : "pipeline",
+        "generated_at" : time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings" : {key : value for key, value in vars(args).items() if key not in ("baseline", "verbose")},
+        "results" : results
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["baseline"] = args.baseline
+            report["comparison"] = compare(results, json.load(f), args.threshold)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved to {path}")
+    if any(item["regression"] for item in report.get("comparison", [])):
+        sys.exit(1)
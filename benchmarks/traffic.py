@@ -0,0 +1,98 @@
+"""Synthetic call-center traffic shared by the offline pipeline benchmark and the Locust profile.
+
+Campaigns, statuses, call types and DTMF answers are drawn from weighted tables
+shaped like production traffic (a few campaigns carry most calls, roughly one call
+in five is missed), so grouped queries see realistic cardinalities instead of one
+fixed campaign.
+"""
+import json
+import math
+import uuid
+import random
+from datetime import datetime, timedelta
+
+# campaign name -> (campaign id, share of calls)
+CAMPAIGNS = {
+    "Sales_Team" : ("CAMP_SALES", 0.42),
+    "Support" : ("CAMP_SUPPORT", 0.30),
+    "Retention" : ("CAMP_RETENTION", 0.14),
+    "Collections" : ("CAMP_COLLECT", 0.09),
+    "Survey" : ("CAMP_SURVEY", 0.05),
+}
+STATUSES = {"Answered" : 0.63, "Connected" : 0.17, "Missed" : 0.20}
+CALL_TYPES = {"INBOUND" : 0.58, "OUTBOUND" : 0.42}
+DTMF = {1 : 0.34, 0 : 0.24, None : 0.42}
+AGENTS = [f"Agent_{number:03}" for number in range(1, 81)]
+# Share of answered calls handed over to a second agent
+TRANSFER_RATE = 0.12
+
+
+def weighted(rng, table):
+    return rng.choices(list(table), weights=list(table.values()))[0]
+
+
+def hms(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+
+
+def make_call(rng=random, now=None):
+    """One call as API-1 receives it (CallPayload fields)."""
+    campaign = rng.choices(list(CAMPAIGNS), weights=[share for _, share in CAMPAIGNS.values()])[0]
+    status = weighted(rng, STATUSES)
+    ring_time = rng.uniform(3, 25)
+    # Talk time is long-tailed: median around three minutes, a few calls near an hour
+    talk_time = 0.0 if status == "Missed" else min(3600.0, rng.lognormvariate(math.log(180), 0.8))
+
+    agents = rng.sample(AGENTS, 2 if status != "Missed" and rng.random() < TRANSFER_RATE else 1)
+    shares = [1.0] if len(agents) == 1 else [0.3, 0.7]
+    participants = [
+        {
+            "participantAddress" : agent,
+            "participantType" : "AGENT",
+            "status" : "missed" if status == "Missed" else "connected",
+            "duration" : round(talk_time * share, 2)
+        }
+        for agent, share in zip(agents, shares)
+    ]
+
+    timestamp = (now or datetime.now()) - timedelta(seconds=rng.uniform(0, 5))
+    return {
+        "Overall_Call_Status" : status,
+        "Customer_Name" : f"User_{rng.randint(1, 50000)}",
+        "Client_Correlation_Id" : str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "callType" : weighted(rng, CALL_TYPES),
+        "conversationDuration" : round(talk_time, 2),
+        "Overall_Call_Duration" : hms(ring_time + talk_time),
+        "Campaign_Id" : CAMPAIGNS[campaign][0],
+        "Campaign_Name" : campaign,
+        "Caller_ID" : f"+1{rng.randint(2000000000, 9999999999)}",
+        "DTMF_Capture" : weighted(rng, DTMF),
+        "participants" : participants,
+        "timestamp" : timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "Session_ID" : f"SESS_{rng.randint(100000, 999999)}"
+    }
+
+
+def make_body(rng=random, now=None):
+    return json.dumps(make_call(rng, now)).encode()
+
+
+def make_ndjson(count, rng=random, now=None):
+    return b"\n".join(make_body(rng, now) for _ in range(count))
+
+
+def monitor_filters(rng=random, now=None):
+    """Query parameters for /api/monitor/summary, mixed like dashboard traffic."""
+    now = now or datetime.now()
+    kind = rng.random()
+    if kind < 0.35:
+        return {}
+    campaign = rng.choices(list(CAMPAIGNS), weights=[share for _, share in CAMPAIGNS.values()])[0]
+    if kind < 0.65:
+        return {"campaign_name" : campaign}
+    if kind < 0.80:
+        return {"campaign_name" : campaign, "call_status" : weighted(rng, STATUSES)}
+    # "Last N minutes" panels
+    start = now - timedelta(minutes=rng.choice([5, 15, 60]))
+    return {"date_from" : start.strftime("%Y-%m-%d %H:%M:%S")}
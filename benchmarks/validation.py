@@ -0,0 +1,116 @@
+"""How much Pydantic / JSON work does one call cost on its way to a row?
+
+Replays the API-1 -> API-2 hand-over in-process (no network, no MySQL) for the
+two chains and writes microseconds per call to benchmarks/results/:
+
+    double_pass   API-1: json.loads + model_validate (FastAPI body parameter),
+                  model_dump(mode="json") + json.dumps (httpx json=);
+                  API-2: json.loads + model_validate, payload_to_row
+    single_pass   API-1: model_validate_json on the raw bytes, model_dump_json;
+                  API-2 (trusted header): json.loads + json_payload_to_row
+
+    python -m benchmarks.validation --calls 20000 --repeats 5
+"""
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime
+from models import CallPayload
+from storage import payload_to_row
+from wire import json_payload_to_row
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def make_bodies(count, participants):
+    bodies = []
+    for _ in range(count):
+        bodies.append(json.dumps({
+            "Overall_Call_Status" : random.choice(["Answered", "Missed", "Connected"]),
+            "Customer_Name" : f"User_{random.randint(1, 1000)}",
+            "Client_Correlation_Id" : str(uuid.uuid4()),
+            "callType" : random.choice(["INBOUND", "OUTBOUND"]),
+            "conversationDuration" : round(random.uniform(10.0, 300.0), 2),
+            "Overall_Call_Duration" : "00:05:00",
+            "Campaign_Id" : "CAMP_A",
+            "Campaign_Name" : random.choice(["Sales_Team", "Support", "Retention"]),
+            "Caller_ID" : "+19876543210",
+            "DTMF_Capture" : random.choice([0, 1, None]),
+            "participants" : [
+                {"participantAddress" : f"Agent_{random.randint(1, 50):03}", "participantType" : "AGENT",
+                 "status" : "connected", "duration" : round(random.uniform(10.0, 300.0), 2)}
+                for _ in range(participants)
+            ],
+            "timestamp" : datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Session_ID" : f"SESS_{random.randint(1000, 9999)}"
+        }).encode())
+    return bodies
+
+
+def double_pass(raw):
+    payload = CallPayload.model_validate(json.loads(raw))
+    forwarded = json.dumps(payload.model_dump(mode="json")).encode()
+    return payload_to_row(CallPayload.model_validate(json.loads(forwarded)))
+
+
+def single_pass(raw):
+    forwarded = CallPayload.model_validate_json(raw).model_dump_json()
+    return json_payload_to_row(json.loads(forwarded))
+
+
+CHAINS = {
+    "double_pass" : double_pass,
+    "single_pass" : single_pass,
+}
+
+
+def run(calls, repeats, participants, chains):
+    bodies = make_bodies(calls, participants)
+    results = []
+    for name in chains:
+        chain = CHAINS[name]
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for raw in bodies:
+                chain(raw)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results.append({
+            "chain" : name,
+            "calls" : calls,
+            "participants_per_call" : participants,
+            "best_us_per_call" : round(best / calls * 1e6, 3),
+            "median_us_per_call" : round(sorted(timings)[len(timings) // 2] / calls * 1e6, 3),
+            "calls_per_sec" : round(calls / best)
+        })
+        print(f"{name:>12} : {best / calls * 1e6:>8.2f} us/call, {calls / best:>10,.0f} calls/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--participants", type=int, default=2)
+    parser.add_argument("--chains", nargs="+", default=list(CHAINS))
+    args = parser.parse_args()
+
+    results = run(args.calls, args.repeats, args.participants, args.chains)
+    by_chain = {item["chain"] : item["best_us_per_call"] for item in results}
+    report = {
+        "benchmark" : "validation",
+        "generated_at" : time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results" : results
+    }
+    if "double_pass" in by_chain and "single_pass" in by_chain:
+        report["speedup"] = round(by_chain["double_pass"] / by_chain["single_pass"], 2)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"validation-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report.get("speedup"), indent=2))
+    print(f"Saved to {path}")
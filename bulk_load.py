@@ -0,0 +1,124 @@
+import os
+import asyncio
+import tempfile
+from datetime import datetime
+import pymysql
+from pymysql.constants import ER
+from storage import CALL_RECORD_COLUMNS, build_insert_query
+
+# Bulk-load strategies for the worker's flush. Each one writes `rows` (tuples in
+# CALL_RECORD_COLUMNS order) on the given connection and leaves the commit to the caller.
+#   executemany -> aiomysql's executemany (rewritten into multi-row INSERTs of <= ~1MB)
+#   multirow    -> pre-escaped INSERT ... VALUES (...),(...) chunks sized to max_allowed_packet
+#   load_data   -> LOAD DATA LOCAL INFILE from a TSV written to tmpfs (needs local_infile=True)
+#   auto        -> multirow below LOAD_DATA_MIN_ROWS rows, load_data from there on
+
+LOAD_DATA_MIN_ROWS = int(os.getenv("LOAD_DATA_MIN_ROWS", "5000"))
+# Keep statements a little under the server limit (protocol overhead, multi-byte chars)
+PACKET_HEADROOM = 0.9
+# RAM-backed scratch dir for the TSV when available
+TSV_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+_max_allowed_packet = None
+
+
+async def get_max_allowed_packet(cur):
+    global _max_allowed_packet
+    if _max_allowed_packet is None:
+        await cur.execute("SELECT @@max_allowed_packet")
+        _max_allowed_packet = (await cur.fetchone())[0]
+    return _max_allowed_packet
+
+
+async def load_executemany(conn, cur, rows, table="call_records"):
+    await cur.executemany(build_insert_query(1, table), rows)
+    return len(rows)
+
+
+async def load_multirow(conn, cur, rows, table="call_records"):
+    limit = int(await get_max_allowed_packet(cur) * PACKET_HEADROOM)
+    prefix = f"INSERT INTO {table} ({', '.join(CALL_RECORD_COLUMNS)}) VALUES "
+
+    chunk = []
+    size = len(prefix)
+    for row in rows:
+        values = conn.escape(row)
+        if chunk and size + len(values) + 1 > limit:
+            await cur.execute(prefix + ",".join(chunk))
+            chunk = []
+            size = len(prefix)
+        chunk.append(values)
+        size += len(values) + 1
+    if chunk:
+        await cur.execute(prefix + ",".join(chunk))
+    return len(rows)
+
+
+TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def tsv_field(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, bytes):
+        value = value.decode()
+    return str(value).translate(TSV_ESCAPES)
+
+
+def write_tsv(rows):
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", dir=TSV_DIR, encoding="utf-8", delete=False) as tsv:
+        tsv.writelines("\t".join(tsv_field(value) for value in row) + "\n" for row in rows)
+    return tsv.name
+
+
+async def raise_load_warnings(cur):
+    # LOAD DATA LOCAL implies IGNORE: duplicate keys and bad values only come back as
+    # warnings (rows skipped, values truncated or coerced). Raise the first one the way
+    # an INSERT would have, so the worker never commits a partial load.
+    await cur.execute("SHOW WARNINGS LIMIT 1")
+    warning = await cur.fetchone()
+    if warning is None:
+        return
+    level, code, message = warning
+    error = pymysql.err.IntegrityError if code == ER.DUP_ENTRY else pymysql.err.DataError
+    raise error(code, f"LOAD DATA {level.lower()}: {message}")
+
+
+async def load_data_infile(conn, cur, rows, table="call_records"):
+    # The TSV is written off the event loop
+    path = await asyncio.to_thread(write_tsv, rows)
+    try :
+        await cur.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(CALL_RECORD_COLUMNS)})",
+            (path,)
+        )
+    finally:
+        os.unlink(path)
+    await raise_load_warnings(cur)
+    return len(rows)
+
+
+async def load_auto(conn, cur, rows, table="call_records"):
+    if len(rows) >= LOAD_DATA_MIN_ROWS:
+        return await load_data_infile(conn, cur, rows, table)
+    return await load_multirow(conn, cur, rows, table)
+
+
+STRATEGIES = {
+    "executemany" : load_executemany,
+    "multirow" : load_multirow,
+    "load_data" : load_data_infile,
+    "auto" : load_auto,
+}
+
+
+def get_strategy(name):
+    try :
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown bulk load strategy '{name}', expected one of {sorted(STRATEGIES)}")
+
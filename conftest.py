@@ -0,0 +1,10 @@
+# The services are top-level modules; having this file here puts the repo root on sys.path
+import pytest
+
+import dedupe
+
+
+@pytest.fixture(autouse=True)
+def forget_recent_keys():
+    # recent_keys lives for the whole process: start every test without the keys earlier ones stored
+    dedupe.recent_keys.keys.clear()
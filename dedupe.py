@@ -0,0 +1,173 @@
+import os
+import time
+from collections import OrderedDict
+from models import CALL_RECORD_COLUMNS, stored_datetime
+
+# Idempotent ingest. A call is identified by (Client_Correlation_Id, timestamp): the
+# unique key ux_call_records_correlation in models.py. call_timestamp is part of the key
+# because call_records may be partitioned on it, and retries / redeliveries carry the
+# same payload anyway. Writers drop keys recent_keys knows (prefilter), look the rest
+# up on the unique index before inserting (split_duplicates) and report each duplicate with the id of the stored record.
+DEDUPE_WINDOW_S = float(os.getenv("DEDUPE_WINDOW_S", "600"))
+DEDUPE_MAX_KEYS = int(os.getenv("DEDUPE_MAX_KEYS", "200000"))
+DUPLICATE_KEY_ERROR = 1062
+
+CORRELATION_INDEX = CALL_RECORD_COLUMNS.index("client_correlation_id")
+TIMESTAMP_INDEX = CALL_RECORD_COLUMNS.index("call_timestamp")
+
+
+class DuplicateRecord:
+    """Result for a row that is already stored; `record_id` is the stored row's id."""
+
+    __slots__ = ("record_id",)
+
+    def __init__(self, record_id):
+        self.record_id = record_id
+
+    def __repr__(self):
+        return f"DuplicateRecord({self.record_id})"
+
+
+def normalize_timestamp(value):
+    return None if value is None else stored_datetime(value)
+
+
+def record_key(row):
+    return row[CORRELATION_INDEX], normalize_timestamp(row[TIMESTAMP_INDEX])
+
+
+def payload_key(payload):
+    # record_key of payload_to_row(payload), without building the row
+    return payload.Client_Correlation_Id, normalize_timestamp(payload.timestamp)
+
+
+class RecentKeys:
+    """Time-windowed LRU of keys committed by this process -> their record id.
+
+    Exact (unlike a Bloom filter), so a hit can be answered without asking MySQL.
+    Only keys whose rows are committed (or, in queue mode, confirmed by the broker)
+    are remembered, so a failed write never turns its retry into a "duplicate".
+    """
+
+    def __init__(self, window_s, max_keys):
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self.keys = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.db_lookups = 0
+        self.db_duplicates = 0
+        self.batch_duplicates = 0
+
+    def get(self, key):
+        self.lookups += 1
+        entry = self.keys.get(key)
+        if entry is None:
+            return None
+        record_id, remembered = entry
+        if time.monotonic() - remembered > self.window_s:
+            del self.keys[key]
+            return None
+        self.hits += 1
+        return DuplicateRecord(record_id)
+
+    def remember(self, key, record_id):
+        self.keys[key] = (record_id, time.monotonic())
+        self.keys.move_to_end(key)
+        while len(self.keys) > self.max_keys:
+            self.keys.popitem(last=False)
+
+    def remember_results(self, rows, results):
+        # After commit: every stored row (new or duplicate) is now known to exist
+        for row, result in zip(rows, results):
+            if isinstance(result, DuplicateRecord):
+                result = result.record_id
+            if result is not None and not isinstance(result, Exception):
+                self.remember(record_key(row), result)
+
+    def stats(self):
+        duplicates = self.hits + self.db_duplicates + self.batch_duplicates
+        return {
+            "window_s" : self.window_s,
+            "keys" : len(self.keys),
+            "max_keys" : self.max_keys,
+            "lookups" : self.lookups,
+            "prefilter_hits" : self.hits,
+            "prefilter_hit_rate" : round(self.hits / self.lookups, 4) if self.lookups else 0,
+            "db_lookups" : self.db_lookups,
+            "db_duplicates" : self.db_duplicates,
+            "batch_duplicates" : self.batch_duplicates,
+            "duplicates" : duplicates,
+            # Share of duplicates dropped without a database round trip
+            "prefilter_share" : round(self.hits / duplicates, 4) if duplicates else 0
+        }
+
+
+# One per process: API-2, the mysql sink and each worker process dedupe independently;
+# the unique key is what makes them agree
+recent_keys = RecentKeys(DEDUPE_WINDOW_S, DEDUPE_MAX_KEYS)
+
+
+async def find_existing(cur, keys, locking=False):
+    """{key: record id} for the keys already in call_records (one indexed lookup)."""
+    keys = [key for key in dict.fromkeys(keys) if key[1] is not None]
+    if not keys:
+        return {}
+    recent_keys.db_lookups += 1
+    await cur.execute(
+        "SELECT client_correlation_id, call_timestamp, id FROM call_records "
+        "WHERE (client_correlation_id, call_timestamp) IN (" + ", ".join(["(%s, %s)"] * len(keys)) + ")"
+        # A locking read sees rows committed after this transaction's snapshot
+        + (" FOR SHARE" if locking else ""),
+        [value for key in keys for value in key]
+    )
+    return {(correlation_id, timestamp) : record_id for correlation_id, timestamp, record_id in await cur.fetchall()}
+
+
+def prefilter(rows):
+    """Answers what recent_keys already knows, before any database round trip.
+
+    Returns (results, unknown_positions): DuplicateRecords for the hits, None elsewhere.
+    """
+    results = [recent_keys.get(record_key(row)) for row in rows]
+    return results, [position for position, result in enumerate(results) if result is None]
+
+
+async def split_duplicates(cur, rows, locking=False):
+    """Separates `rows` into new rows and rows already in call_records.
+
+    Returns (results, new_positions, repeats): `results[i]` is a DuplicateRecord for
+    rows already stored and None otherwise; `new_positions` lists the rows to insert,
+    in order; `repeats` maps a row repeating an earlier row of the same batch to that
+    row's position. fill_results completes `results` once the new rows have ids.
+    """
+    results = [None] * len(rows)
+    keys = [record_key(row) for row in rows]
+    existing = await find_existing(cur, keys, locking)
+
+    new_positions = []
+    repeats = {}
+    first_position = {}
+    for position, key in enumerate(keys):
+        if key in existing:
+            results[position] = DuplicateRecord(existing[key])
+            recent_keys.db_duplicates += 1
+        elif key in first_position:
+            repeats[position] = first_position[key]
+            recent_keys.batch_duplicates += 1
+        else:
+            first_position[key] = position
+            new_positions.append(position)
+    return results, new_positions, repeats
+
+
+def fill_results(results, new_positions, repeats, record_ids):
+    for position, record_id in zip(new_positions, record_ids):
+        results[position] = record_id
+    for position, first in repeats.items():
+        results[position] = DuplicateRecord(results[first])
+    return results
+
+
+def is_duplicate_key_error(e):
+    return bool(getattr(e, "args", None)) and e.args[0] == DUPLICATE_KEY_ERROR
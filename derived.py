@@ -0,0 +1,103 @@
+"""Scaffolding shared by the tables derived from call_records (rollups.py, ...).
+
+Each of those modules supplies its DDL and a statement that rebuilds a time range;
+this module owns the maintenance connection, the upsert, the backfill loop and the
+command line they all expose:
+
+    python <module>.py create                                   # create the table
+    python <module>.py backfill [--date-from D] [--date-to D]   # rebuild from call_records
+
+Backfill overwrites what it touches, so run it before the writers start maintaining
+the table (or over a range that no longer receives calls).
+"""
+import asyncio
+import argparse
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import aiomysql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects import mysql
+
+DB_CONFIG = {
+    "user" : "root",
+    "host" : "localhost",
+    "port" : 3306,
+    "db" : "call_center_db",
+    "password" : "",
+    "autocommit" : False
+}
+
+logger = logging.getLogger("Derived")
+
+
+def create_table_ddl(table):
+    return str(CreateTable(table, if_not_exists=True).compile(dialect=mysql.dialect()))
+
+
+async def upsert(cur, query, placeholder, buckets):
+    """One INSERT ... ON DUPLICATE KEY UPDATE for {key tuple: value tuple}.
+
+    `query` has a `{values}` slot that receives one `placeholder` per key.
+    """
+    if not buckets:
+        return
+    # Sorted so concurrent writers lock the rows in the same order (no deadlocks)
+    keys = sorted(buckets)
+    params = [value for key in keys for value in (*key, *buckets[key])]
+    await cur.execute(query.format(values=", ".join([placeholder] * len(keys))), params)
+
+
+@asynccontextmanager
+async def connect():
+    pool = await aiomysql.create_pool(**DB_CONFIG, minsize=1, maxsize=1)
+    try:
+        async with pool.acquire() as conn:
+            yield conn
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+async def create(name, create_table):
+    async with connect() as conn:
+        async with conn.cursor() as cur:
+            await create_table(cur)
+        await conn.commit()
+    logger.info("%s ready", name)
+
+
+async def backfill(name, create_table, fill_range, date_from=None, date_to=None):
+    """Runs `fill_range(cur, start, end)` over [date_from, date_to), default: every call."""
+    async with connect() as conn:
+        async with conn.cursor() as cur:
+            await create_table(cur)
+            await cur.execute("SELECT MIN(call_timestamp), MAX(call_timestamp) FROM call_records")
+            first, last = await cur.fetchone()
+            if first is None:
+                logger.info("call_records is empty, nothing to backfill")
+                return
+            # Whole minutes only: a partial bucket would be overwritten with a partial count
+            start = (date_from or first).replace(second=0, microsecond=0)
+            end = (date_to or last + timedelta(minutes=1)).replace(second=0, microsecond=0)
+            # One day per transaction keeps locks and undo logs small
+            while start < end:
+                next_day = min(start.replace(hour=0, minute=0) + timedelta(days=1), end)
+                await fill_range(cur, start, next_day)
+                await conn.commit()
+                logger.info("Backfilled %s %s -> %s", name, f"{start:%Y-%m-%d %H:%M}", f"{next_day:%Y-%m-%d %H:%M}")
+                start = next_day
+
+
+def main(doc, name, create_table, fill_range):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["create", "backfill"])
+    parser.add_argument("--date-from", type=datetime.fromisoformat, help="YYYY-MM-DD[ HH:MM], default: oldest call")
+    parser.add_argument("--date-to", type=datetime.fromisoformat, help="YYYY-MM-DD[ HH:MM] (exclusive), default: newest call")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        asyncio.run(create(name, create_table))
+    else:
+        asyncio.run(backfill(name, create_table, fill_range, args.date_from, args.date_to))
@@ -0,0 +1,100 @@
+import io
+import os
+import csv
+import json
+import aiomysql
+from models import CALL_RECORD_COLUMNS
+
+EXPORT_COLUMNS = ("id",) + CALL_RECORD_COLUMNS + ("processing_time_ms",)
+EXPORT_PAGE_SIZE = int(os.getenv("API3_EXPORT_PAGE_SIZE", "5000"))
+# Server-side cap per page query, so one export can never pin a connection on a slow scan
+EXPORT_PAGE_TIMEOUT_MS = int(os.getenv("API3_EXPORT_PAGE_TIMEOUT_MS", "30000"))
+FETCH_CHUNK = 500
+MAX_PAGE_LIMIT = 10000
+
+PAGE_QUERY = (
+    f"SELECT /*+ MAX_EXECUTION_TIME({EXPORT_PAGE_TIMEOUT_MS}) */ {', '.join(EXPORT_COLUMNS)} "
+    "FROM call_records {where_sql} ORDER BY id LIMIT %s"
+)
+
+
+def keyset_where(where_sql, params, after_id):
+    # Keyset pagination: `id > last id seen` walks the primary key, no OFFSET re-scans
+    if after_id is None:
+        return where_sql, list(params)
+    condition = "id > %s"
+    return (f"{where_sql} AND {condition}" if where_sql else f" WHERE {condition}"), [*params, after_id]
+
+
+async def fetch_page(pool, where_sql, params, after_id, limit):
+    """Up to `limit` rows after `after_id`, as tuples in EXPORT_COLUMNS order.
+
+    Rows are streamed off the server with an unbuffered cursor and the connection is
+    released before the caller sees them: a slow consumer only ever holds one page in
+    memory, never a connection.
+    """
+    page_where, page_params = keyset_where(where_sql, params, after_id)
+    rows = []
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(PAGE_QUERY.format(where_sql=page_where), [*page_params, limit])
+            while True:
+                chunk = await cur.fetchmany(FETCH_CHUNK)
+                if not chunk:
+                    break
+                rows.extend(chunk)
+        # Ends the read snapshot so the pooled connection does not pin old row versions
+        await conn.commit()
+    return rows
+
+
+def row_to_record(row):
+    record = {}
+    for column, value in zip(EXPORT_COLUMNS, row):
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        elif column == "participants_data" and isinstance(value, (str, bytes)):
+            try :
+                value = json.loads(value)
+            except ValueError:
+                pass
+        record[column] = value
+    return record
+
+
+def to_ndjson(rows):
+    return "".join(json.dumps(row_to_record(row), default=str) + "\n" for row in rows).encode()
+
+
+def to_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def stream_export(pool, where_sql, params, export_format, after_id=None, limit=None):
+    """Yields the filtered rows page by page, encoded as NDJSON lines or CSV.
+
+    Every record carries its id, so an interrupted export resumes with `after_id`
+    set to the last id received.
+    """
+    sent = 0
+    first = True
+    while limit is None or sent < limit:
+        page_size = EXPORT_PAGE_SIZE if limit is None else min(EXPORT_PAGE_SIZE, limit - sent)
+        rows = await fetch_page(pool, where_sql, params, after_id, page_size)
+        if export_format == "csv":
+            yield to_csv(rows, header=first)
+        elif rows:
+            yield to_ndjson(rows)
+        first = False
+        if len(rows) < page_size:
+            break
+        sent += len(rows)
+        after_id = rows[-1][0]
@@ -0,0 +1,250 @@
+import os
+import logging
+from datetime import datetime, timedelta
+
+try :
+    import numpy as np
+except ImportError:  # optional: without it API-3 always queries MySQL
+    np = None
+from tailing import IdTail, Poller
+
+# In-process columnar copy of the most recent call_records, for API-3 summaries that
+# only look at the last few hours. Rows are pulled incrementally (new ids, see tailing.py)
+# and kept as NumPy columns; string dimensions are dictionary-encoded. The window is
+# relative to the newest call_timestamp seen, so it does not depend on clock or
+# timezone agreement between API-3 and the writers.
+HOT_WINDOW_MINUTES = int(os.getenv("API3_HOT_WINDOW_MINUTES", "0"))
+HOT_WINDOW_POLL_S = float(os.getenv("API3_HOT_WINDOW_POLL_S", "0.5"))
+POLL_LIMIT = 50000
+# Compact the columns once this share of rows has fallen out of the window
+COMPACT_RATIO = 0.1
+
+EPOCH = datetime(1970, 1, 1)
+POLL_COLUMNS = ("id", "call_timestamp", "campaign_name", "overall_call_status", "call_type",
+                "dtmf_capture", "processing_time_ms", "storage_time_ms")
+DIMENSIONS = ("campaign_name", "dtmf_capture", "overall_call_status", "call_type")
+LATENCY_COLUMNS = ("processing_time_ms", "storage_time_ms")
+PERCENTILES = (50, 90, 99)
+
+logger = logging.getLogger("API-3")
+
+
+def to_micros(value):
+    return (value.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+
+
+class Column:
+    """Growable NumPy array (capacity doubling, so appends are amortized O(1))."""
+
+    def __init__(self, dtype):
+        self.data = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def append(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, len(self.data) * 2), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def keep(self, mask):
+        kept = self.data[:self.size][mask]
+        self.data[:len(kept)] = kept
+        self.size = len(kept)
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+
+class Dictionary:
+    """Value <-> small int code. Codes are never reused, so cached codes stay valid."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class HotWindowStore(Poller):
+
+    def __init__(self, pool, window_minutes, poll_interval=HOT_WINDOW_POLL_S):
+        if np is None:
+            raise RuntimeError("The hot window store needs the numpy package (pip install numpy)")
+        super().__init__(pool, poll_interval, logger, "Hot window")
+        self.window = timedelta(minutes=window_minutes)
+        self.columns = {
+            "id" : Column(np.int64),
+            "call_timestamp" : Column(np.int64),
+            "processing_time_ms" : Column(np.float64),
+            "storage_time_ms" : Column(np.float64),
+            **{name : Column(np.int32) for name in DIMENSIONS}
+        }
+        self.dictionaries = {name : Dictionary() for name in DIMENSIONS}
+        self.tail = None
+        self.newest = None
+        self.covered_from = None
+        self.ready = False
+
+    @property
+    def size(self):
+        return self.columns["id"].size
+
+    def cutoff(self):
+        return self.newest - self.window if self.newest else None
+
+    def append(self, rows):
+        if not rows:
+            return
+        newest = max((row[1] for row in rows if row[1] is not None), default=None)
+        if newest is not None and (self.newest is None or newest > self.newest):
+            self.newest = newest.replace(tzinfo=None)
+        cutoff = self.cutoff()
+        if cutoff is not None and self.covered_from is not None and cutoff > self.covered_from:
+            # Rows before the cutoff are dropped from here on, so coverage starts there
+            self.covered_from = cutoff
+        rows = [row for row in rows if row[1] is not None and (cutoff is None or row[1] >= cutoff)]
+        if not rows:
+            return
+
+        self.columns["id"].append([row[0] for row in rows])
+        self.columns["call_timestamp"].append([to_micros(row[1]) for row in rows])
+        for position, name in ((6, "processing_time_ms"), (7, "storage_time_ms")):
+            self.columns[name].append([np.nan if row[position] is None else row[position] for row in rows])
+        for position, name in ((2, "campaign_name"), (5, "dtmf_capture"), (3, "overall_call_status"), (4, "call_type")):
+            encode = self.dictionaries[name].encode
+            self.columns[name].append([encode(row[position]) for row in rows])
+
+    def evict(self):
+        cutoff = self.cutoff()
+        if cutoff is None or not self.size:
+            return
+        timestamps = self.columns["call_timestamp"].values
+        keep = timestamps >= to_micros(cutoff)
+        if self.size - np.count_nonzero(keep) >= COMPACT_RATIO * self.size:
+            for column in self.columns.values():
+                column.keep(keep)
+
+    async def poll_once(self, cur):
+        if self.tail is None:
+            await cur.execute("SELECT MAX(call_timestamp) FROM call_records")
+            newest = (await cur.fetchone())[0]
+            start = newest - self.window if newest else EPOCH
+            await cur.execute(
+                f"SELECT {', '.join(POLL_COLUMNS)} FROM call_records WHERE call_timestamp >= %s ORDER BY id",
+                (start,)
+            )
+            rows = await cur.fetchall()
+            self.append(rows)
+            self.tail = IdTail(rows[-1][0] if rows else 0)
+            self.covered_from = start
+            self.evict()
+            self.ready = True
+            logger.info("Hot window loaded: %d rows from %s", self.size, start, extra={"correlation_id" : "SYSTEM"})
+            return
+
+        while True:
+            condition, params = self.tail.condition()
+            await cur.execute(
+                f"SELECT {', '.join(POLL_COLUMNS)} FROM call_records WHERE {condition} ORDER BY id LIMIT {POLL_LIMIT}",
+                params
+            )
+            rows = await cur.fetchall()
+            self.append(rows)
+            self.tail.seen([row[0] for row in rows])
+            if len(rows) < POLL_LIMIT:
+                break
+        self.evict()
+
+    def build_mask(self, campaign_name, dtmf, call_status, call_type, date_from, date_to):
+        """Boolean mask equivalent to api_3.build_where_clause, or None if the window
+        cannot answer (store not loaded, or date_from before the covered range)."""
+        if not self.ready or not date_from or self.covered_from is None:
+            return None
+        try :
+            # Naive, like the stored call_timestamp values
+            start = datetime.fromisoformat(date_from).replace(tzinfo=None)
+            end = datetime.fromisoformat(date_to).replace(tzinfo=None) if date_to else None
+            dtmf_value = None if dtmf is None or dtmf.lower() == 'null' else int(dtmf)
+        except ValueError:
+            return None
+        if start < self.covered_from:
+            return None
+
+        timestamps = self.columns["call_timestamp"].values
+        mask = timestamps >= to_micros(start)
+        if end is not None:
+            mask &= timestamps <= to_micros(end)
+        for name, value, active in (
+            ("campaign_name", campaign_name, bool(campaign_name)),
+            ("dtmf_capture", dtmf_value, dtmf is not None),
+            ("overall_call_status", call_status, bool(call_status)),
+            ("call_type", call_type, bool(call_type))
+        ):
+            if not active:
+                continue
+            code = self.dictionaries[name].codes.get(value)
+            if code is None:
+                return np.zeros(self.size, dtype=bool)
+            mask &= self.columns[name].values == code
+        return mask
+
+    def summary_groups(self, mask):
+        """Same rows as summary.GROUPED_SUMMARY_QUERY, computed with bincount over the mask."""
+        codes = [self.columns[name].values[mask].astype(np.int64) for name in DIMENSIONS]
+        if not len(codes[0]):
+            return []
+        sizes = [len(self.dictionaries[name].values) for name in DIMENSIONS]
+        keys = np.ravel_multi_index(codes, sizes)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse)
+        measures = {}
+        for name, prefix in (("processing_time_ms", "processing"), ("storage_time_ms", "storage")):
+            values = self.columns[name].values[mask]
+            measured = ~np.isnan(values)
+            measures[f"{prefix}_sum"] = np.bincount(inverse, weights=np.where(measured, values, 0))
+            measures[f"{prefix}_count"] = np.bincount(inverse, weights=measured)
+
+        groups = []
+        for position, key in enumerate(zip(*np.unravel_index(unique_keys, sizes))):
+            group = {name : self.dictionaries[name].values[code] for name, code in zip(DIMENSIONS, key)}
+            group["total"] = int(totals[position])
+            for measure, values in measures.items():
+                group[measure] = float(values[position]) if measure.endswith("_sum") else int(values[position])
+            groups.append(group)
+        return groups
+
+    def latency_percentiles(self, mask):
+        # Exact, from the raw values (same shape as latency_sketches.build_percentiles)
+        percentiles = {}
+        for name in LATENCY_COLUMNS:
+            values = self.columns[name].values[mask]
+            values = values[~np.isnan(values)]
+            if len(values):
+                p50, p90, p99 = np.percentile(values, PERCENTILES)
+                percentiles[name] = {"p50" : round(float(p50), 3), "p90" : round(float(p90), 3),
+                                     "p99" : round(float(p99), 3), "max" : round(float(values.max()), 3)}
+            else:
+                percentiles[name] = {"p50" : 0, "p90" : 0, "p99" : 0, "max" : 0}
+        return percentiles
+
+    def stats(self):
+        return {
+            "enabled" : True,
+            "ready" : self.ready,
+            "rows" : self.size,
+            "window_minutes" : self.window.total_seconds() / 60,
+            "covered_from" : self.covered_from.isoformat() if self.covered_from else None,
+            "newest_call" : self.newest.isoformat() if self.newest else None,
+            "last_id" : self.tail.last_id if self.tail else None,
+            "id_gaps" : len(self.tail.gaps) if self.tail else 0,
+            "memory_bytes" : sum(column.data.nbytes for column in self.columns.values())
+        }
@@ -0,0 +1,66 @@
+import os
+import hmac
+from typing import List
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from models import CallPayload
+from dedupe import normalize_timestamp
+
+# Trusted pass-through between API-1 and API-2. API-1 validates the raw body once
+# (CallPayload.model_validate_json) and forwards the model's model_dump_json(): the
+# coerced values (numbers, ISO timestamps), never the client's own spelling of them.
+# The headers below tell API-2 it may skip its own validation. Only honoured when both
+# sides share INGEST_TRUST_TOKEN, so a client talking to API-2 directly is still
+# validated. Trusted bodies are turned into rows with wire.json_payload_to_row, no
+# Pydantic involved.
+TRUST_TOKEN = os.getenv("INGEST_TRUST_TOKEN", "")
+TRUST_HEADER = "x-ingest-trusted"
+# The dedupe key travels alongside, so API-2 MQ can publish without parsing the body
+CORRELATION_HEADER = "x-correlation-id"
+TIMESTAMP_HEADER = "x-call-timestamp"
+
+
+def trust_headers(payload):
+    if not TRUST_TOKEN:
+        return {}
+    return {
+        TRUST_HEADER : TRUST_TOKEN,
+        CORRELATION_HEADER : payload.Client_Correlation_Id,
+        TIMESTAMP_HEADER : payload.timestamp.isoformat()
+    }
+
+
+def batch_trust_headers():
+    return {TRUST_HEADER : TRUST_TOKEN} if TRUST_TOKEN else {}
+
+
+def is_trusted(headers):
+    token = headers.get(TRUST_HEADER)
+    return bool(TRUST_TOKEN) and token is not None and hmac.compare_digest(token, TRUST_TOKEN)
+
+
+def trusted_key(headers):
+    # dedupe.payload_key of the forwarded call, or None if API-1 did not send it
+    correlation_id = headers.get(CORRELATION_HEADER)
+    timestamp = headers.get(TIMESTAMP_HEADER)
+    if not correlation_id or not timestamp:
+        return None
+    return correlation_id, normalize_timestamp(timestamp)
+
+
+CALL_BATCH = TypeAdapter(List[CallPayload])
+
+
+def parse_call(raw):
+    # Raw bytes -> CallPayload in one pass; same error as a FastAPI body parameter
+    try :
+        return CallPayload.model_validate_json(raw)
+    except ValidationError as err:
+        raise RequestValidationError(err.errors(include_url=False))
+
+
+def parse_batch(raw):
+    try :
+        return CALL_BATCH.validate_json(raw)
+    except ValidationError as err:
+        raise RequestValidationError(err.errors(include_url=False))
@@ -0,0 +1,151 @@
+"""Per-minute, per-campaign latency sketches that API-3 merges into summary percentiles.
+
+Writers (api_2, the mysql sink and the worker) add their rows' latencies to
+`call_latency_sketches` in the same transaction as the rows when SKETCHES_ENABLED=1.
+Each row is one log bin of a DDSketch-style histogram (see sketch.py), so merging
+any set of minutes and campaigns is a SUM per bin: constant cost per query no
+matter how many calls the window holds, with 1% relative error on every percentile.
+
+    python latency_sketches.py create|backfill [--date-from D] [--date-to D]   # see derived.py
+
+Backfill before turning SKETCHES_ENABLED on for the writers.
+"""
+import os
+import derived
+from models import CALL_RECORD_COLUMNS, LatencySketchMinute
+from rollups import as_number, minute_bucket, rollup_window
+from sketch import bin_index, sql_bin_expression, quantiles
+
+SKETCHES_ENABLED = os.getenv("SKETCHES_ENABLED", "0") == "1"
+SKETCH_TABLE = LatencySketchMinute.__tablename__
+# Latency columns that get a sketch; only the ones present in written rows are updated
+LATENCY_COLUMNS = ("processing_time_ms", "storage_time_ms")
+PERCENTILES = (0.5, 0.9, 0.99)
+
+COLUMN_INDEX = {name : index for index, name in enumerate(CALL_RECORD_COLUMNS)}
+
+
+def aggregate(rows):
+    """Rows in CALL_RECORD_COLUMNS order -> {(bucket, campaign, metric, bin): [count, max]}."""
+    timestamp_index = COLUMN_INDEX["call_timestamp"]
+    campaign_index = COLUMN_INDEX["campaign_name"]
+    metrics = [(metric, COLUMN_INDEX[metric]) for metric in LATENCY_COLUMNS if metric in COLUMN_INDEX]
+
+    bins = {}
+    for row in rows:
+        if row[timestamp_index] is None:
+            continue
+        bucket = minute_bucket(row[timestamp_index])
+        campaign = row[campaign_index] or ""
+        for metric, column_index in metrics:
+            value = as_number(row[column_index])
+            if value is None:
+                continue
+            entry = bins.setdefault((bucket, campaign, metric, bin_index(value)), [0, value])
+            entry[0] += 1
+            entry[1] = max(entry[1], value)
+    return bins
+
+
+UPSERT_QUERY = (
+    f"INSERT INTO {SKETCH_TABLE} (bucket_start, campaign_name, metric, bin_index, count, max_value) "
+    "VALUES {values} "
+    "ON DUPLICATE KEY UPDATE count = count + VALUES(count), max_value = GREATEST(max_value, VALUES(max_value))"
+)
+UPSERT_PLACEHOLDER = "(%s, %s, %s, %s, %s, %s)"
+
+
+async def upsert_sketches(cur, rows):
+    await derived.upsert(cur, UPSERT_QUERY, UPSERT_PLACEHOLDER, aggregate(rows))
+
+
+def build_sketch_where(campaign_name, dtmf, call_status, call_type, date_from, date_to):
+    # Sketches only have the campaign and minute dimensions; None = not answerable
+    if dtmf is not None or call_status or call_type:
+        return None
+    window = rollup_window(date_from, date_to)
+    if window is None:
+        return None
+    bucket_from, bucket_to = window
+
+    conditions = []
+    params = []
+    if campaign_name:
+        conditions.append("campaign_name = %s")
+        params.append(campaign_name)
+    if bucket_from:
+        conditions.append("bucket_start >= %s")
+        params.append(bucket_from)
+    if bucket_to:
+        conditions.append("bucket_start <= %s")
+        params.append(bucket_to)
+
+    where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_sql, params
+
+
+# Both queries return (metric, bin_index, count, max_value) rows for build_percentiles
+SKETCH_MERGE_QUERY = f"""
+    SELECT metric, bin_index, SUM(count) AS count, MAX(max_value) AS max_value
+    FROM {SKETCH_TABLE} {{where_sql}}
+    GROUP BY metric, bin_index
+"""
+
+
+def build_histogram_query(where_sql, params):
+    """Same bins computed from call_records, for filters the sketches cannot answer.
+
+    Still one pass per latency column and no sort, but O(rows) instead of O(buckets).
+    """
+    selects = []
+    all_params = []
+    for metric in LATENCY_COLUMNS:
+        not_null = f"{'AND' if where_sql else ' WHERE'} {metric} IS NOT NULL"
+        selects.append(
+            f"SELECT '{metric}' AS metric, {sql_bin_expression(metric)} AS bin_index, "
+            f"COUNT(*) AS count, MAX({metric}) AS max_value "
+            f"FROM call_records {where_sql} {not_null} GROUP BY bin_index"
+        )
+        all_params.extend(params)
+    return " UNION ALL ".join(selects), all_params
+
+
+def build_percentiles(rows):
+    """Merges (metric, bin_index, count, max_value) rows into p50/p90/p99/max per latency column."""
+    bins = {metric : {} for metric in LATENCY_COLUMNS}
+    maxima = {}
+    for row in rows:
+        metric_bins = bins.setdefault(row["metric"], {})
+        index = int(row["bin_index"])
+        metric_bins[index] = metric_bins.get(index, 0) + int(row["count"])
+        maxima[row["metric"]] = max(maxima.get(row["metric"], 0), float(row["max_value"]))
+
+    percentiles = {}
+    for metric, metric_bins in bins.items():
+        p50, p90, p99 = quantiles(metric_bins, PERCENTILES, maxima.get(metric))
+        percentiles[metric] = {"p50" : p50, "p90" : p90, "p99" : p99, "max" : round(maxima.get(metric, 0), 3)}
+    return percentiles
+
+
+def backfill_query(metric):
+    return (
+        f"INSERT INTO {SKETCH_TABLE} (bucket_start, campaign_name, metric, bin_index, count, max_value) "
+        "SELECT DATE_FORMAT(call_timestamp, '%%Y-%%m-%%d %%H:%%i:00'), COALESCE(campaign_name, ''), "
+        f"'{metric}', {sql_bin_expression(metric)}, COUNT(*), MAX({metric}) "
+        f"FROM call_records WHERE call_timestamp >= %s AND call_timestamp < %s AND {metric} IS NOT NULL "
+        "GROUP BY 1, 2, 4 "
+        "ON DUPLICATE KEY UPDATE count = VALUES(count), max_value = VALUES(max_value)"
+    )
+
+
+async def create_table(cur):
+    await cur.execute(derived.create_table_ddl(LatencySketchMinute.__table__))
+
+
+async def fill_range(cur, start, end):
+    for metric in LATENCY_COLUMNS:
+        await cur.execute(backfill_query(metric), (start, end))
+
+
+if __name__ == "__main__":
+    derived.main(__doc__, SKETCH_TABLE, create_table, fill_range)
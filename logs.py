@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import metrics
+
+# Logging shared by every service. Loggers only put records on an in-memory queue;
+# one listener thread per process formats them and writes to stdout, so neither the
+# string formatting nor a slow log consumer ever runs on the event loop.
+#
+#   LOG_FORMAT=text|json     text is "[time] [LEVEL] [logger] [correlation id] message"
+#   LOG_LEVEL=INFO
+#   LOG_SAMPLE_RATE=1.0      share of INFO/DEBUG records kept, per logger
+#   LOG_SAMPLE_RATES=API-2=0.01,API-3=0.1   per-logger overrides
+#   LOG_QUEUE_SIZE=10000
+#
+# Warnings and errors are never sampled. Nothing ever waits for room on the queue:
+# INFO records are dropped once it is 90% full, leaving the rest to warnings and
+# errors, which are only dropped when it is completely full. Drops are counted.
+#
+# Formatting is lazy: pass values as arguments (logger.info("took %.2fms", ms)) and
+# the message is only built in the listener thread, for records that were kept.
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+def parse_rates(value):
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.rsplit("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+LOG_DROPPED = metrics.REGISTRY.gauge(
+    "log_records_dropped", "Log records not written since start, by reason.", labelnames=("reason",))
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        timestamp = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')}.{int(record.msecs):03d}"
+        correlation_id = getattr(record, 'correlation_id', 'N/A')
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return f"[{timestamp}] [{record.levelname}] [{record.name}] [{correlation_id}] {message}"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp" : f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            "level" : record.levelname,
+            "logger" : record.name,
+            "correlation_id" : getattr(record, 'correlation_id', None),
+            "message" : record.getMessage(),
+            "process" : record.process
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+FORMATTERS = {"text" : TextFormatter, "json" : JsonFormatter}
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps `rate` of the records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+# Share of the queue INFO records may fill; the rest is kept for warnings and errors
+INFO_QUEUE_SHARE = 0.9
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener and never blocks the caller.
+
+    The stock prepare() formats the message in the caller; here the record is queued
+    as is. A record that does not fit is dropped and counted, never waited for.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.dropped_warnings = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if record.levelno < logging.WARNING and self.queue.qsize() >= LOG_QUEUE_SIZE * INFO_QUEUE_SHARE:
+            self.dropped += 1
+            return
+        try :
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.dropped_warnings += 1
+            else:
+                self.dropped += 1
+
+
+_handler = None
+_listener = None
+_filters = {}
+
+
+def start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(FORMATTERS.get(LOG_FORMAT, TextFormatter)())
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, output)
+    _listener.start()
+
+
+def stop_listener():
+    # Flushes whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure():
+    """Routes the root logger through the queue. Idempotent; safe to call from every module."""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = NonBlockingQueueHandler(None)
+    start_listener()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    atexit.register(stop_listener)
+    # A forked worker process has the handler but not the listener thread
+    os.register_at_fork(after_in_child=start_listener)
+    LOG_DROPPED.track(lambda: _handler.dropped, "queue_full")
+    LOG_DROPPED.track(lambda: _handler.dropped_warnings, "queue_full_warning")
+    LOG_DROPPED.track(lambda: sum(sampler.sampled_out for sampler in _filters.values()), "sampled")
+
+
+def get_logger(name, sample_rate=None):
+    """A service logger on the shared queue, sampled at `sample_rate` (LOG_SAMPLE_RATE[S] by default)."""
+    configure()
+    logger = logging.getLogger(name)
+    if name not in _filters:
+        rate = sample_rate if sample_rate is not None else LOG_SAMPLE_RATES.get(name, LOG_SAMPLE_RATE)
+        _filters[name] = SamplingFilter(rate)
+        logger.addFilter(_filters[name])
+    return logger
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from bisect import bisect_left
+
+# In-process metrics in the Prometheus text format (version 0.0.4), served on GET /metrics
+# by every API and on METRICS_PORT by the worker. Recording is a bisect plus two list
+# increments, with no locks (one event loop per process) and no I/O: everything stays
+# in memory until a scrape renders it. Gauges read their value at scrape time from a
+# callback, so pool usage or buffer length cost nothing on the request path.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds: 0.5 ms .. 10 s, roughly x2.5 per step
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Records per INSERT / flush / message
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+logger = logging.getLogger("Metrics")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames + ('le',), labels + (format_value(bound),))} {cumulative}")
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time: `track(callback, *labels)` registers one series."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callbacks = {}
+
+    def track(self, callback, *labels):
+        self.callbacks[labels] = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, callback in self.callbacks.items():
+            try :
+                value = callback()
+            except Exception:
+                # A resource that is not up yet (or already closed) is left out of this scrape
+                continue
+            if value is not None:
+                lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # Idempotent, so modules loaded twice (uvicorn --reload, benchmarks) share one series
+        return self.metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS, labelnames=()):
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# One per process, like dedupe.recent_keys
+REGISTRY = Registry()
+
+VALIDATION_SECONDS = REGISTRY.histogram(
+    "call_validation_seconds", "Time to parse and validate a request body.", labelnames=("service",))
+FORWARD_SECONDS = REGISTRY.histogram(
+    "call_forward_seconds", "Time API-1 spends handing calls to its sink.", labelnames=("sink", "kind"))
+DB_INSERT_SECONDS = REGISTRY.histogram(
+    "db_insert_seconds", "Time to write one batch of call_records rows, commit included.", labelnames=("writer",))
+DB_INSERT_ROWS = REGISTRY.histogram(
+    "db_insert_batch_rows", "Rows per call_records write.", SIZE_BUCKETS, labelnames=("writer",))
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "mq_publish_seconds", "Time from publish to broker confirm, per message.")
+PUBLISH_RECORDS = REGISTRY.histogram(
+    "mq_publish_batch_records", "Call records per published message.", SIZE_BUCKETS)
+FLUSH_SECONDS = REGISTRY.histogram(
+    "worker_flush_seconds", "Time to write one worker batch, bisection retries included.")
+FLUSH_RECORDS = REGISTRY.histogram(
+    "worker_flush_batch_records", "Records per worker batch.", SIZE_BUCKETS)
+QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Time to run the queries behind one API-3 response.", labelnames=("query", "source"))
+IN_FLIGHT = REGISTRY.gauge(
+    "api_requests_in_flight", "Requests admitted and still being worked on.", labelnames=("service",))
+POOL_IN_USE = REGISTRY.gauge(
+    "db_pool_connections_in_use", "Connections currently checked out of the pool.", labelnames=("pool",))
+POOL_SIZE = REGISTRY.gauge(
+    "db_pool_connections_max", "Pool size limit.", labelnames=("pool",))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "mq_queue_depth_messages", "Messages waiting in the queue (consumer lag), as last polled.", labelnames=("queue",))
+BUFFER_RECORDS = REGISTRY.gauge(
+    "worker_buffer_records", "Records buffered by a consumer, not flushed yet.", labelnames=("consumer",))
+UNACKED_MESSAGES = REGISTRY.gauge(
+    "worker_unacked_messages", "Messages delivered to a consumer and not acked yet.", labelnames=("consumer",))
+INFLIGHT_FLUSHES = REGISTRY.gauge(
+    "worker_flushes_in_flight", "Batches a consumer is writing right now.", labelnames=("consumer",))
+
+
+def track_pool(pool, name):
+    POOL_IN_USE.track(lambda: pool.size - pool.freesize, name)
+    POOL_SIZE.track(lambda: pool.maxsize, name)
+
+
+def track_queue(monitor):
+    QUEUE_DEPTH.track(lambda: monitor.depth, monitor.queue_name)
+
+
+async def handle_scrape(reader, writer):
+    # Enough HTTP for a Prometheus scrape: read the request head, always answer /metrics
+    try :
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        body = REGISTRY.render().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            + f"Content-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning("Metrics scrape failed : %s", e)
+    finally:
+        writer.close()
+
+
+async def serve(port, host="0.0.0.0"):
+    """Serves REGISTRY on http://host:port/metrics for processes without an HTTP app (the worker)."""
+    server = await asyncio.start_server(handle_scrape, host, port)
+    logger.info("Metrics on http://%s:%s/metrics", host, port)
+    return server
@@ -1,21 +1,26 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, JSON, Index, func
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Literal, Union, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class Base(DeclarativeBase):
-    pass
+    # MySQL needs a length for VARCHAR columns (schema.py creates the tables from here)
+    type_annotation_map = {str : String(255)}
 
 class CallRecord(Base):
     __tablename__ = "call_records"
 
     # We define the columns to match your existing DB exactly
-    id: Mapped[int] = mapped_column(primary_key=True)
-    overall_call_status: Mapped[Optional[str]]
+    # call_timestamp is part of the primary key because MySQL requires every unique key
+    # of a partitioned table to contain the partitioning column (see schema.py)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # Closed sets (CallPayload literals): narrow, so ix_call_records_summary stays under
+    # InnoDB's 3072-byte key limit with utf8mb4 (4 bytes per character)
+    overall_call_status: Mapped[Optional[str]] = mapped_column(String(32))
     customer_name: Mapped[Optional[str]]
     client_correlation_id: Mapped[str]
-    call_type: Mapped[Optional[str]]
+    call_type: Mapped[Optional[str]] = mapped_column(String(32))
     conversation_duration: Mapped[Optional[float]]
     overall_call_duration: Mapped[Optional[str]]
     campaign_id: Mapped[Optional[str]]
@@ -26,14 +31,128 @@ class CallRecord(Base):
     # Using JSON type for participants allows us to query inside it if needed later
     participants_data: Mapped[Optional[dict]] = mapped_column(JSON)
     
-    call_timestamp: Mapped[Optional[datetime]]
+    call_timestamp: Mapped[datetime] = mapped_column(primary_key=True)
     session_id: Mapped[Optional[str]]
     
     # Performance metrics we added earlier
     processing_time_ms: Mapped[Optional[float]]
     storage_time_ms: Mapped[Optional[float]]
 
+    # Pipeline stage stamps, epoch milliseconds (see timings.py), and the ingest lag
+    # derived from them: insert_at_ms - received_at_ms.
+    received_at_ms: Mapped[Optional[int]] = mapped_column(BigInteger)
+    published_at_ms: Mapped[Optional[int]] = mapped_column(BigInteger)
+    consumed_at_ms: Mapped[Optional[int]] = mapped_column(BigInteger)
+    insert_at_ms: Mapped[Optional[int]] = mapped_column(BigInteger)
+    ingest_lag_ms: Mapped[Optional[float]]
 
+    # Matched to API-3's filters (build_where_clause) and the grouped summary scan:
+    # every equality filter is paired with the call_timestamp range, and the summary
+    # index covers GROUPED_SUMMARY_QUERY so it never reads the wide participants column.
+    __table_args__ = (
+        # Idempotent ingest (see dedupe.py); includes call_timestamp for partitioning
+        Index("ux_call_records_correlation", "client_correlation_id", "call_timestamp", unique=True),
+        Index("ix_call_records_timestamp", "call_timestamp"),
+        Index("ix_call_records_status_timestamp", "overall_call_status", "call_timestamp"),
+        Index("ix_call_records_type_timestamp", "call_type", "call_timestamp"),
+        Index("ix_call_records_dtmf_timestamp", "dtmf_capture", "call_timestamp"),
+        Index(
+            "ix_call_records_summary",
+            "campaign_name", "dtmf_capture", "overall_call_status", "call_type",
+            "call_timestamp", "processing_time_ms", "storage_time_ms"
+        ),
+    )
+
+
+# Column order used by every write path into call_records (see storage.py)
+CALL_RECORD_COLUMNS = (
+    "overall_call_status", "customer_name", "client_correlation_id",
+    "call_type", "conversation_duration", "overall_call_duration",
+    "campaign_id", "campaign_name", "caller_id", "dtmf_capture",
+    "participants_data", "call_timestamp", "session_id", "storage_time_ms",
+    "received_at_ms", "published_at_ms", "consumed_at_ms", "insert_at_ms", "ingest_lag_ms"
+)
+
+
+def stored_datetime(value):
+    """A timestamp (datetime or ISO string/bytes) as the naive DATETIME MySQL stores for it."""
+    if isinstance(value, (bytes, str)):
+        value = datetime.fromisoformat(value.decode() if isinstance(value, bytes) else value)
+    value = value.replace(tzinfo=None)
+    # DATETIME keeps whole seconds and MySQL rounds the fraction half up
+    if value.microsecond:
+        value = (value + timedelta(microseconds=500000)).replace(microsecond=0)
+    return value
+
+
+class CallRollupMinute(Base):
+    __tablename__ = "call_rollups_minute"
+
+    # Pre-aggregated call_records per minute and dimension combination (see rollups.py).
+    # Dimensions are NOT NULL so they can be part of the key: NULL is stored as '' / -1.
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    campaign_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    overall_call_status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    call_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    dtmf_capture: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+    total_calls: Mapped[int] = mapped_column(default=0)
+    processing_sum: Mapped[float] = mapped_column(Float(precision=53), default=0)
+    processing_count: Mapped[int] = mapped_column(default=0)
+    storage_sum: Mapped[float] = mapped_column(Float(precision=53), default=0)
+    storage_count: Mapped[int] = mapped_column(default=0)
+    conversation_sum: Mapped[float] = mapped_column(Float(precision=53), default=0)
+    conversation_count: Mapped[int] = mapped_column(default=0)
+
+
+
+
+class LatencySketchMinute(Base):
+    __tablename__ = "call_latency_sketches"
+
+    # Mergeable latency histograms (see sketch.py / latency_sketches.py): one row per
+    # minute, campaign, latency column and log bin. Counts add up across rows and writers.
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    campaign_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    metric: Mapped[str] = mapped_column(String(32), primary_key=True)
+    bin_index: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+    count: Mapped[int] = mapped_column(default=0)
+    max_value: Mapped[float] = mapped_column(Float(precision=53), default=0)
+
+
+class CallParticipant(Base):
+    __tablename__ = "call_participants"
+
+    # participants_data unnested, one row per participant (see participants.py).
+    # Linked to call_records by client_correlation_id: bulk loads do not report the
+    # parent ids, and no foreign key because call_records may be partitioned.
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    client_correlation_id: Mapped[str]
+    call_timestamp: Mapped[datetime]
+    campaign_name: Mapped[Optional[str]]
+    overall_call_status: Mapped[Optional[str]] = mapped_column(String(32))
+    participant_address: Mapped[str]
+    participant_type: Mapped[str] = mapped_column(String(64))
+    status: Mapped[Optional[str]] = mapped_column(String(64))
+    duration: Mapped[Optional[float]]
+
+    __table_args__ = (
+        Index("ix_call_participants_address_timestamp", "participant_address", "call_timestamp"),
+        Index("ix_call_participants_type_timestamp", "participant_type", "call_timestamp"),
+        Index("ix_call_participants_correlation", "client_correlation_id"),
+    )
+
+
+class IngestWatermark(Base):
+    __tablename__ = "ingest_watermarks"
+
+    # One row per committed write transaction: the call_timestamp range it touched.
+    # API-3 follows this log to invalidate cached results (see watermark.py).
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    min_call_timestamp: Mapped[datetime] = mapped_column(DateTime)
+    max_call_timestamp: Mapped[datetime] = mapped_column(DateTime)
+    committed_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
 
 
 class Participant(BaseModel):
@@ -42,13 +161,15 @@ class Participant(BaseModel):
     status: str
     duration: float
 
+# The one call schema: API-1 validates raw bodies against it (model_validate_json) and
+# everything downstream trusts that or validates against the same rules
 class CallPayload(BaseModel):
     Overall_Call_Status: Literal["Answered", "Missed", "Connected"]
     Customer_Name: str
     Client_Correlation_Id: str
     callType: Literal["OUTBOUND", "INBOUND"]
     conversationDuration: float
-    Overall_Call_Duration: str
+    Overall_Call_Duration: str = Field(..., pattern=r"^\d{2}:\d{2}:\d{2}$")
     Campaign_Id: str
     Campaign_Name: str
     Caller_ID: str
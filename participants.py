@@ -0,0 +1,189 @@
+"""`call_participants`: participants_data unnested into one indexed row per participant.
+
+Writers (api_2, the mysql sink and the worker) insert the participant rows in the
+same transaction as their calls when PARTICIPANTS_ENABLED=1, so per-agent questions
+("talk time per agent", "missed calls per participantAddress") become index range
+scans instead of JSON parsing over every call. API-3 serves them on
+/api/monitor/participants.
+
+    python participants.py create|backfill [--date-from D] [--date-to D]   # see derived.py
+
+Backfill (which replaces the participant rows of its range) before turning
+PARTICIPANTS_ENABLED on for the writers.
+"""
+import os
+import json
+from sqlalchemy.schema import CreateTable, CreateIndex
+from sqlalchemy.dialects import mysql
+import derived
+from models import CALL_RECORD_COLUMNS, CallParticipant
+
+PARTICIPANTS_ENABLED = os.getenv("PARTICIPANTS_ENABLED", "0") == "1"
+PARTICIPANT_TABLE = CallParticipant.__tablename__
+
+COLUMN_INDEX = {name : index for index, name in enumerate(CALL_RECORD_COLUMNS)}
+INSERT_COLUMNS = ("client_correlation_id", "call_timestamp", "campaign_name", "overall_call_status",
+                  "participant_address", "participant_type", "status", "duration")
+INSERT_PLACEHOLDER = "(" + ", ".join(["%s"] * len(INSERT_COLUMNS)) + ")"
+
+
+def explode(rows):
+    """Rows in CALL_RECORD_COLUMNS order -> participant rows in INSERT_COLUMNS order."""
+    call_columns = [COLUMN_INDEX[name] for name in INSERT_COLUMNS[:4]]
+    participants_index = COLUMN_INDEX["participants_data"]
+
+    participant_rows = []
+    for row in rows:
+        participants = row[participants_index]
+        if isinstance(participants, (str, bytes)):
+            try :
+                participants = json.loads(participants)
+            except ValueError:
+                continue
+        call = [row[index] for index in call_columns]
+        for participant in participants or ():
+            participant_rows.append((
+                *call,
+                participant.get("participantAddress"),
+                participant.get("participantType"),
+                participant.get("status"),
+                participant.get("duration")
+            ))
+    return participant_rows
+
+
+async def insert_participants(cur, rows):
+    participant_rows = explode(rows)
+    if not participant_rows:
+        return
+    params = [value for row in participant_rows for value in row]
+    await cur.execute(
+        f"INSERT INTO {PARTICIPANT_TABLE} ({', '.join(INSERT_COLUMNS)}) VALUES "
+        + ", ".join([INSERT_PLACEHOLDER] * len(participant_rows)),
+        params
+    )
+
+
+def build_participant_where(participant_address, participant_type, campaign_name, call_status, date_from, date_to):
+    conditions = []
+    params = []
+    for column, value in (
+        ("participant_address", participant_address),
+        ("participant_type", participant_type),
+        ("campaign_name", campaign_name),
+        ("overall_call_status", call_status)
+    ):
+        if value:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+    if date_from:
+        conditions.append("call_timestamp >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("call_timestamp <= %s")
+        params.append(date_to)
+
+    where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_sql, params
+
+
+# Finest grouping the participant endpoints fold from; {extra_columns} adds campaign_name for the detail view
+PARTICIPANT_QUERY = f"""
+    SELECT participant_address, participant_type, status, overall_call_status{{extra_columns}},
+        COUNT(*) AS calls, SUM(duration) AS duration_sum, COUNT(duration) AS duration_count,
+        MAX(call_timestamp) AS last_call
+    FROM {PARTICIPANT_TABLE} {{where_sql}}
+    GROUP BY participant_address, participant_type, status, overall_call_status{{extra_columns}}
+"""
+
+
+def build_participant_query(where_sql, by_campaign=False):
+    return PARTICIPANT_QUERY.format(where_sql=where_sql, extra_columns=", campaign_name" if by_campaign else "")
+
+
+def empty_aggregate():
+    return {"calls" : 0, "talk_time" : 0.0, "duration_count" : 0, "by_status" : {}, "by_call_status" : {}, "last_call" : None}
+
+
+def add_group(aggregate, group):
+    calls = int(group["calls"])
+    aggregate["calls"] += calls
+    aggregate["talk_time"] += float(group["duration_sum"] or 0)
+    aggregate["duration_count"] += int(group["duration_count"] or 0)
+    aggregate["by_status"][group["status"]] = aggregate["by_status"].get(group["status"], 0) + calls
+    aggregate["by_call_status"][group["overall_call_status"]] = \
+        aggregate["by_call_status"].get(group["overall_call_status"], 0) + calls
+    if group["last_call"] is not None and (aggregate["last_call"] is None or group["last_call"] > aggregate["last_call"]):
+        aggregate["last_call"] = group["last_call"]
+
+
+def finish_aggregate(aggregate):
+    duration_count = aggregate.pop("duration_count")
+    aggregate["talk_time"] = round(aggregate["talk_time"], 2)
+    aggregate["avg_duration"] = round(aggregate["talk_time"] / duration_count, 2) if duration_count else 0
+    aggregate["missed_calls"] = aggregate["by_call_status"].get("Missed", 0)
+    if aggregate["last_call"] is not None:
+        aggregate["last_call"] = aggregate["last_call"].isoformat()
+    return aggregate
+
+
+def build_participant_list(groups, limit):
+    """One aggregate per (participant_address, participant_type), busiest first."""
+    aggregates = {}
+    for group in groups:
+        aggregate = aggregates.setdefault((group["participant_address"], group["participant_type"]), empty_aggregate())
+        add_group(aggregate, group)
+    ranked = sorted(aggregates.items(), key=lambda item: item[1]["calls"], reverse=True)[:limit]
+    return [
+        {"participant_address" : address, "participant_type" : participant_type, **finish_aggregate(aggregate)}
+        for (address, participant_type), aggregate in ranked
+    ]
+
+
+def build_participant_detail(groups):
+    """Totals for one participant plus the same aggregate per campaign."""
+    total = empty_aggregate()
+    types = set()
+    by_campaign = {}
+    for group in groups:
+        add_group(total, group)
+        types.add(group["participant_type"])
+        add_group(by_campaign.setdefault(group["campaign_name"], empty_aggregate()), group)
+    return {
+        **finish_aggregate(total),
+        "participant_types" : sorted(types),
+        "by_campaign" : [{"campaign_name" : name, **finish_aggregate(aggregate)} for name, aggregate in by_campaign.items()]
+    }
+
+
+DELETE_RANGE_QUERY = f"DELETE FROM {PARTICIPANT_TABLE} WHERE call_timestamp >= %s AND call_timestamp < %s"
+BACKFILL_QUERY = (
+    f"INSERT INTO {PARTICIPANT_TABLE} ({', '.join(INSERT_COLUMNS)}) "
+    "SELECT r.client_correlation_id, r.call_timestamp, r.campaign_name, r.overall_call_status, "
+    "p.participant_address, p.participant_type, p.status, p.duration "
+    "FROM call_records r, JSON_TABLE(r.participants_data, '$[*]' COLUMNS ("
+    "participant_address VARCHAR(255) PATH '$.participantAddress', "
+    "participant_type VARCHAR(64) PATH '$.participantType', "
+    "status VARCHAR(64) PATH '$.status', "
+    "duration DOUBLE PATH '$.duration')) p "
+    "WHERE r.call_timestamp >= %s AND r.call_timestamp < %s"
+)
+
+
+async def create_table(cur):
+    # CREATE TABLE does not carry the indexes on MySQL; a new table gets them right away
+    await cur.execute(f"SHOW TABLES LIKE '{PARTICIPANT_TABLE}'")
+    if await cur.fetchone():
+        return
+    await cur.execute(str(CreateTable(CallParticipant.__table__).compile(dialect=mysql.dialect())))
+    for index in CallParticipant.__table__.indexes:
+        await cur.execute(str(CreateIndex(index).compile(dialect=mysql.dialect())))
+
+
+async def fill_range(cur, start, end):
+    await cur.execute(DELETE_RANGE_QUERY, (start, end))
+    await cur.execute(BACKFILL_QUERY, (start, end))
+
+
+if __name__ == "__main__":
+    derived.main(__doc__, PARTICIPANT_TABLE, create_table, fill_range)
@@ -0,0 +1,185 @@
+import os
+import time
+from datetime import datetime, timezone
+import itertools
+from collections import deque
+import asyncio
+import aio_pika
+from pamqp.commands import Basic
+from batching import MicroBatcher
+import wire
+from dedupe import recent_keys, payload_key
+import metrics
+import timings
+
+# Publishing settings shared by api-2_mq and API-1's mq sink
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "1000000"))
+PUBLISH_CHANNELS = int(os.getenv("MQ_PUBLISH_CHANNELS", "4"))
+# Opt-in: pack up to N records per AMQP message (1 = one message per record)
+PUBLISH_BATCH_RECORDS = int(os.getenv("MQ_PUBLISH_BATCH_RECORDS", "1"))
+PUBLISH_LINGER_MS = float(os.getenv("MQ_PUBLISH_LINGER_MS", "5"))
+# json | msgpack -- switch to msgpack once every worker understands it
+WIRE_FORMAT = os.getenv("MQ_WIRE_FORMAT", "json")
+
+
+class PublishNotConfirmed(Exception):
+    pass
+
+
+class ConfirmingPublisher:
+    """Publishes to RabbitMQ over a pool of confirm-mode channels.
+
+    A publish only counts as done once the broker has acked it. Channels are used
+    round-robin and each one keeps many publishes in flight: aio-pika matches the
+    broker's acks to delivery tags asynchronously, so confirms never serialize callers.
+
+    With `batch_records > 1`, records are packed into one AMQP message (marked with
+    the `x-record-count` header). Single records are then held back for up to
+    `linger_ms` so concurrent callers can share a message. `wire_format` picks the
+    body encoding (see wire.py).
+
+    Records this process has had confirmed within the dedupe window are not published
+    again: `publish` returns their DuplicateRecord instead (record_id None, the worker
+    assigns ids).
+
+    Every message carries the records' received stamps and its own published stamp
+    as headers (see timings.py), so the worker can store them with the rows.
+    """
+
+    def __init__(self, connection, queue_name, channels=4, batch_records=1, linger_ms=5,
+                 wire_format="json", latency_samples=10000):
+        self.connection = connection
+        self.queue_name = queue_name
+        self.wire_format = wire.check_format(wire_format)
+        self.channel_count = channels
+        self.batch_records = batch_records
+        self.linger_ms = linger_ms
+        self.channels = []
+        self.next_channel = None
+        self.batcher = None
+        self.latencies_ms = deque(maxlen=latency_samples)
+        self.published_messages = 0
+        self.published_records = 0
+        self.failed_messages = 0
+
+    async def start(self):
+        for _ in range(self.channel_count):
+            self.channels.append(await self.connection.channel(publisher_confirms=True))
+        await self.channels[0].declare_queue(self.queue_name, durable=True)
+        self.next_channel = itertools.cycle(self.channels)
+        if self.batch_records > 1:
+            self.batcher = MicroBatcher(self.publish_many, self.linger_ms, self.batch_records)
+
+    async def close(self):
+        if self.batcher:
+            await self.batcher.close()
+        for channel in self.channels:
+            await channel.close()
+
+    async def publish_message(self, items):
+        # `items` are (payload, received_at_ms) pairs
+        body, content_type, headers = wire.encode([payload for payload, _ in items], self.wire_format)
+        headers[timings.RECEIVED_HEADER] = [received for _, received in items]
+        await self.publish_body(body, content_type, headers, len(items))
+
+    async def publish_body(self, body, content_type, headers, record_count):
+        received = [stamp for stamp in headers.get(timings.RECEIVED_HEADER, ()) if stamp is not None]
+        published = timings.now_ms(max(received, default=None))
+        message = aio_pika.Message(
+            body=body,
+            content_type=content_type,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            headers={**headers, timings.PUBLISHED_HEADER : published},
+            timestamp=datetime.fromtimestamp(published / 1000, timezone.utc)
+        )
+        start = time.perf_counter()
+        try:
+            confirmation = await next(self.next_channel).default_exchange.publish(
+                message, routing_key=self.queue_name, mandatory=True
+            )
+            if not isinstance(confirmation, Basic.Ack):
+                raise PublishNotConfirmed(f"Broker did not ack the message ({type(confirmation).__name__})")
+        except Exception:
+            self.failed_messages += 1
+            raise
+        elapsed = time.perf_counter() - start
+        self.latencies_ms.append(elapsed * 1000)
+        metrics.PUBLISH_SECONDS.observe(elapsed)
+        metrics.PUBLISH_RECORDS.observe(record_count)
+        self.published_messages += 1
+        self.published_records += record_count
+
+    async def publish_many(self, items):
+        # One message per chunk of `batch_records` records; returns one outcome per record
+        results = []
+        chunks = [items[i:i + self.batch_records] for i in range(0, len(items), self.batch_records)]
+        outcomes = await asyncio.gather(
+            *[self.publish_message(chunk) for chunk in chunks],
+            return_exceptions=True
+        )
+        for chunk, outcome in zip(chunks, outcomes):
+            results.extend([outcome] * len(chunk))
+        return results
+
+    async def publish(self, payload, received_at_ms=None):
+        key = payload_key(payload)
+        duplicate = recent_keys.get(key)
+        if duplicate is not None:
+            return duplicate
+        item = (payload, received_at_ms)
+        if self.batcher:
+            await self.batcher.submit(item)
+        else:
+            await self.publish_message([item])
+        recent_keys.remember(key, None)
+
+    @property
+    def accepts_raw(self):
+        # Raw JSON bodies go out unchanged only when that is exactly what encode would send
+        return self.wire_format == "json" and self.batcher is None
+
+    async def publish_raw(self, body, key, received_at_ms=None):
+        # `body` is one call API-1 already validated (ingest.py); `key` its payload_key
+        duplicate = recent_keys.get(key)
+        if duplicate is not None:
+            return duplicate
+        await self.publish_body(body, wire.JSON_CONTENT_TYPE, {timings.RECEIVED_HEADER : [received_at_ms]}, 1)
+        recent_keys.remember(key, None)
+
+    async def publish_batch(self, payloads, received_at_ms=None):
+        outcomes = [recent_keys.get(payload_key(payload)) for payload in payloads]
+        pending = [position for position, outcome in enumerate(outcomes) if outcome is None]
+        if self.batch_records > 1:
+            published = await self.publish_many([(payloads[position], received_at_ms) for position in pending])
+        else:
+            published = await asyncio.gather(
+                *[self.publish_message([(payloads[position], received_at_ms)]) for position in pending],
+                return_exceptions=True
+            )
+        for position, outcome in zip(pending, published):
+            outcomes[position] = outcome
+            if not isinstance(outcome, Exception):
+                recent_keys.remember(payload_key(payloads[position]), None)
+        return outcomes
+
+    def stats(self):
+        samples = sorted(self.latencies_ms)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3) if samples else 0
+
+        return {
+            "channels" : len(self.channels),
+            "batch_records" : self.batch_records,
+            "wire_format" : self.wire_format,
+            "published_messages" : self.published_messages,
+            "published_records" : self.published_records,
+            "failed_messages" : self.failed_messages,
+            "publish_latency_ms" : {
+                "samples" : len(samples),
+                "avg" : round(sum(samples) / len(samples), 3) if samples else 0,
+                "p50" : percentile(0.50),
+                "p99" : percentile(0.99),
+                "max" : round(samples[-1], 3) if samples else 0
+            }
+        }
@@ -0,0 +1,121 @@
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+
+
+class CacheEntry:
+    __slots__ = ("value", "created", "window")
+
+    def __init__(self, value, created, window):
+        self.value = value
+        self.created = created
+        self.window = window
+
+
+def parse_window(date_from, date_to):
+    # Unparseable bounds count as open, i.e. invalidated by any write
+    # Naive, like the call_timestamp ranges invalidate() compares them with
+    def parse(value):
+        try :
+            return datetime.fromisoformat(value).replace(tzinfo=None) if value else None
+        except ValueError:
+            return None
+    return parse(date_from), parse(date_to)
+
+
+def overlaps(window, min_ts, max_ts):
+    start, end = window
+    return (start is None or start <= max_ts) and (end is None or end >= min_ts)
+
+
+class QueryCache:
+    """TTL + LRU result cache with single-flight loading.
+
+    Keys are normalized query arguments (e.g. the where clause and params produced
+    by build_where_clause). Concurrent misses on the same key share one load. Each
+    entry remembers its call_timestamp window, so `invalidate(min_ts, max_ts)` (driven
+    by the ingest watermark) only drops results that new writes could have changed.
+    """
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.stale_loads = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.served_age_total = 0.0
+
+    async def get_or_load(self, key, window, loader):
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now - entry.created < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.served_age_total += now - entry.created
+                return entry.value
+            del self.entries[key]
+
+        if key in self.inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so a load nobody else waited on does not warn
+            future.exception()
+            raise
+        except BaseException:
+            # The loading request was cancelled: its waiters are cancelled with it
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            self.inflight.pop(key, None)
+            stale = key in self.stale_loads
+            self.stale_loads.discard(key)
+
+        # A write landed in this window while we were loading -> serve it once, do not keep it
+        if not stale:
+            self.entries[key] = CacheEntry(value, time.monotonic(), window)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, min_ts, max_ts):
+        for key in [key for key, entry in self.entries.items() if overlaps(entry.window, min_ts, max_ts)]:
+            del self.entries[key]
+            self.invalidations += 1
+        self.stale_loads.update(self.inflight)
+
+    def stats(self):
+        now = time.monotonic()
+        ages = [now - entry.created for entry in self.entries.values()]
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries" : len(self.entries),
+            "max_entries" : self.max_entries,
+            "ttl_seconds" : self.ttl,
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "coalesced" : self.coalesced,
+            "hit_rate" : round((self.hits + self.coalesced) / lookups, 4) if lookups else 0,
+            "invalidations" : self.invalidations,
+            "evictions" : self.evictions,
+            "avg_served_age_s" : round(self.served_age_total / self.hits, 3) if self.hits else 0,
+            "avg_entry_age_s" : round(sum(ages) / len(ages), 3) if ages else 0,
+            "oldest_entry_age_s" : round(max(ages), 3) if ages else 0
+        }
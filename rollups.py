@@ -0,0 +1,176 @@
+"""Per-minute rollups of call_records that API-3 can answer summaries from.
+
+Writers (api_2, the mysql sink and the worker) upsert `call_rollups_minute` in the
+same transaction as the rows themselves when ROLLUPS_ENABLED=1, so API-3 summaries
+cost O(buckets) instead of O(rows).
+
+    python rollups.py create|backfill [--date-from D] [--date-to D]   # see derived.py
+
+Backfill before turning ROLLUPS_ENABLED on for the writers.
+"""
+import os
+from datetime import datetime
+import derived
+from models import CALL_RECORD_COLUMNS, CallRollupMinute, stored_datetime
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "0") == "1"
+ROLLUP_TABLE = CallRollupMinute.__tablename__
+NULL_DTMF = -1
+
+COLUMN_INDEX = {name : index for index, name in enumerate(CALL_RECORD_COLUMNS)}
+DIMENSIONS = ("bucket_start", "campaign_name", "overall_call_status", "call_type", "dtmf_capture")
+MEASURES = ("total_calls", "processing_sum", "processing_count", "storage_sum", "storage_count",
+            "conversation_sum", "conversation_count")
+# (sum, count) measure pairs and the call_records column they aggregate
+SUMMED_COLUMNS = (("processing_sum", "processing_count", "processing_time_ms"),
+                  ("storage_sum", "storage_count", "storage_time_ms"),
+                  ("conversation_sum", "conversation_count", "conversation_duration"))
+
+
+def minute_bucket(value):
+    # Bucket the value MySQL stores, so writers and backfill agree at hh:mm:59.5
+    return stored_datetime(value).replace(second=0)
+
+
+def as_number(value):
+    try :
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def aggregate(rows):
+    """Rows in CALL_RECORD_COLUMNS order -> {dimension key: measures}."""
+    timestamp_index = COLUMN_INDEX["call_timestamp"]
+    campaign_index = COLUMN_INDEX["campaign_name"]
+    status_index = COLUMN_INDEX["overall_call_status"]
+    type_index = COLUMN_INDEX["call_type"]
+    dtmf_index = COLUMN_INDEX["dtmf_capture"]
+    summed = [(MEASURES.index(sum_name), COLUMN_INDEX.get(column)) for sum_name, _, column in SUMMED_COLUMNS]
+
+    buckets = {}
+    for row in rows:
+        if row[timestamp_index] is None:
+            continue
+        key = (
+            minute_bucket(row[timestamp_index]),
+            row[campaign_index] or "",
+            row[status_index] or "",
+            row[type_index] or "",
+            NULL_DTMF if row[dtmf_index] is None else row[dtmf_index]
+        )
+        measures = buckets.setdefault(key, [0, 0.0, 0, 0.0, 0, 0.0, 0])
+        measures[0] += 1
+        for position, column_index in summed:
+            value = as_number(row[column_index]) if column_index is not None else None
+            if value is not None:
+                measures[position] += value
+                measures[position + 1] += 1
+    return buckets
+
+
+UPSERT_QUERY = (
+    f"INSERT INTO {ROLLUP_TABLE} ({', '.join(DIMENSIONS + MEASURES)}) VALUES {{values}} "
+    "ON DUPLICATE KEY UPDATE " + ", ".join(f"{name} = {name} + VALUES({name})" for name in MEASURES)
+)
+UPSERT_PLACEHOLDER = "(" + ", ".join(["%s"] * len(DIMENSIONS + MEASURES)) + ")"
+
+
+async def upsert_rollups(cur, rows):
+    await derived.upsert(cur, UPSERT_QUERY, UPSERT_PLACEHOLDER, aggregate(rows))
+
+
+def parse_datetime(value):
+    try :
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rollup_window(date_from, date_to):
+    """(first bucket, last bucket) if the filter window covers whole minutes, else None.
+
+    `call_timestamp >= date_from` lines up with buckets when date_from is on a minute;
+    `call_timestamp <= date_to` when date_to is the last second of a minute (hh:mm:59).
+    """
+    bucket_from = bucket_to = None
+    if date_from:
+        parsed = parse_datetime(date_from)
+        if parsed is None or parsed.second or parsed.microsecond:
+            return None
+        bucket_from = parsed
+    if date_to:
+        parsed = parse_datetime(date_to)
+        if parsed is None or parsed.second != 59:
+            return None
+        bucket_to = parsed.replace(second=0, microsecond=0)
+    return bucket_from, bucket_to
+
+
+def build_rollup_where(campaign_name, dtmf, call_status, call_type, date_from, date_to):
+    # Mirror of api_3.build_where_clause over the rollup dimensions; None = not answerable
+    window = rollup_window(date_from, date_to)
+    if window is None:
+        return None
+    bucket_from, bucket_to = window
+
+    conditions = []
+    params = []
+    if campaign_name:
+        conditions.append("campaign_name = %s")
+        params.append(campaign_name)
+    if dtmf is not None:
+        conditions.append("dtmf_capture = %s")
+        params.append(NULL_DTMF if dtmf.lower() == 'null' else int(dtmf))
+    if call_status:
+        conditions.append("overall_call_status = %s")
+        params.append(call_status)
+    if call_type:
+        conditions.append("call_type = %s")
+        params.append(call_type)
+    if bucket_from:
+        conditions.append("bucket_start >= %s")
+        params.append(bucket_from)
+    if bucket_to:
+        conditions.append("bucket_start <= %s")
+        params.append(bucket_to)
+
+    where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where_sql, params
+
+
+# Same output shape as summary.GROUPED_SUMMARY_QUERY, so summary.build_summary can fold it
+ROLLUP_SUMMARY_QUERY = f"""
+    SELECT NULLIF(campaign_name, '') AS campaign_name, NULLIF(dtmf_capture, {NULL_DTMF}) AS dtmf_capture,
+        NULLIF(overall_call_status, '') AS overall_call_status, NULLIF(call_type, '') AS call_type,
+        SUM(total_calls) AS total,
+        SUM(processing_sum) AS processing_sum, SUM(processing_count) AS processing_count,
+        SUM(storage_sum) AS storage_sum, SUM(storage_count) AS storage_count
+    FROM {ROLLUP_TABLE} {{where_sql}}
+    GROUP BY campaign_name, dtmf_capture, overall_call_status, call_type
+"""
+
+
+BACKFILL_QUERY = (
+    f"INSERT INTO {ROLLUP_TABLE} ({', '.join(DIMENSIONS + MEASURES)}) "
+    "SELECT DATE_FORMAT(call_timestamp, '%%Y-%%m-%%d %%H:%%i:00'), COALESCE(campaign_name, ''), "
+    f"COALESCE(overall_call_status, ''), COALESCE(call_type, ''), COALESCE(dtmf_capture, {NULL_DTMF}), "
+    "COUNT(*), COALESCE(SUM(processing_time_ms), 0), COUNT(processing_time_ms), "
+    "COALESCE(SUM(storage_time_ms), 0), COUNT(storage_time_ms), "
+    "COALESCE(SUM(conversation_duration), 0), COUNT(conversation_duration) "
+    "FROM call_records WHERE call_timestamp >= %s AND call_timestamp < %s "
+    "GROUP BY 1, 2, 3, 4, 5 "
+    "ON DUPLICATE KEY UPDATE " + ", ".join(f"{name} = VALUES({name})" for name in MEASURES)
+)
+
+
+async def create_table(cur):
+    await cur.execute(derived.create_table_ddl(CallRollupMinute.__table__))
+
+
+async def fill_range(cur, start, end):
+    await cur.execute(BACKFILL_QUERY, (start, end))
+
+
+if __name__ == "__main__":
+    derived.main(__doc__, ROLLUP_TABLE, create_table, fill_range)
@@ -0,0 +1,273 @@
+"""Creates and maintains the call_center_db tables from models.py.
+
+    python schema.py create [--partitioned] [--dedupe] [--months-back N] [--months-ahead N]
+    python schema.py add-partitions [--months-ahead N]      # run monthly (cron)
+    python schema.py drop-partitions --before YYYY-MM       # retention: drops whole months
+    python schema.py show
+
+`create` is idempotent: it creates missing tables and adds any column or index from
+models.py an existing table lacks, narrowing VARCHAR columns first where models.py
+declares them narrower (a table copy). A unique index is only added once no key is
+stored twice: `create` reports the duplicates, and --dedupe deletes all but the
+first copy (lowest id) of each. With --partitioned, a new call_records is
+RANGE partitioned by month on call_timestamp, so `date_from`/`date_to` queries are
+pruned to the months they cover and old months are removed with DROP PARTITION
+instead of DELETE.
+An existing unpartitioned call_records is left as is: converting it rebuilds the
+whole table, so do that in a maintenance window (ALTER TABLE ... PARTITION BY).
+"""
+import asyncio
+import argparse
+import logging
+from datetime import date
+import aiomysql
+from sqlalchemy.schema import CreateTable, CreateIndex, CreateColumn
+from sqlalchemy.dialects import mysql
+from models import Base, CallRecord
+
+DB_CONFIG = {
+    "user" : "root",
+    "host" : "localhost",
+    "port" : 3306,
+    "db" : "call_center_db",
+    "password" : "",
+    "autocommit" : True
+}
+
+PARTITIONED_TABLE = CallRecord.__tablename__
+PARTITION_COLUMN = "call_timestamp"
+CATCH_ALL_PARTITION = "pmax"
+
+logger = logging.getLogger("Schema")
+
+
+def compile_ddl(element):
+    return str(element.compile(dialect=mysql.dialect())).strip()
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_definition(month):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+
+
+def partition_clause(first_month, last_month):
+    definitions = []
+    month = first_month
+    while month <= last_month:
+        definitions.append(partition_definition(month))
+        month = add_months(month, 1)
+    # Catch-all so a late add-partitions run never rejects inserts
+    definitions.append(f"PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return f"PARTITION BY RANGE COLUMNS({PARTITION_COLUMN}) (\n    " + ",\n    ".join(definitions) + "\n)"
+
+
+async def existing_tables(cur):
+    await cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+    return {row[0] for row in await cur.fetchall()}
+
+
+async def existing_columns(cur, table):
+    await cur.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return {row[0] for row in await cur.fetchall()}
+
+
+async def narrow_columns(cur, table):
+    """Shrinks VARCHAR columns an existing table declares wider than models.py does.
+
+    Needed before indexes that only fit InnoDB's key size limit with the narrow
+    types. Skipped (with a warning) when stored values would not fit. This is a
+    table copy: run it in a maintenance window on large tables.
+    """
+    await cur.execute(
+        "SELECT column_name, character_maximum_length FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND data_type = 'varchar'",
+        (table.name,)
+    )
+    widths = dict(await cur.fetchall())
+    for column in table.columns:
+        length = getattr(column.type, "length", None)
+        if length is None or column.name not in widths or widths[column.name] <= length:
+            continue
+        await cur.execute(f"SELECT COALESCE(MAX(CHAR_LENGTH({column.name})), 0) FROM {table.name}")
+        longest, = await cur.fetchone()
+        if longest > length:
+            logger.warning("%s.%s holds values of %d characters, not narrowing it to %d", table.name, column.name, longest, length)
+            continue
+        await cur.execute(f"ALTER TABLE {table.name} MODIFY COLUMN {compile_ddl(CreateColumn(column))}")
+        logger.info("Narrowed %s.%s to VARCHAR(%d)", table.name, column.name, length)
+
+
+async def count_duplicates(cur, table, columns):
+    # Key values held by more than one row, i.e. what a new unique index would reject
+    group = ", ".join(columns)
+    await cur.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(copies - 1), 0) FROM "
+        f"(SELECT COUNT(*) AS copies FROM {table} GROUP BY {group} HAVING COUNT(*) > 1) AS duplicated"
+    )
+    keys, extra_rows = await cur.fetchone()
+    return int(keys), int(extra_rows)
+
+
+async def remove_duplicates(cur, table, columns, keep_column):
+    # Keeps the first stored copy (lowest `keep_column`) of every duplicated key
+    group = ", ".join(columns)
+    matches = " AND ".join(f"t.{column} = d.{column}" for column in columns)
+    await cur.execute(
+        f"DELETE t FROM {table} t JOIN "
+        f"(SELECT {group}, MIN({keep_column}) AS keep_id FROM {table} GROUP BY {group} HAVING COUNT(*) > 1) d "
+        f"ON {matches} AND t.{keep_column} <> d.keep_id"
+    )
+    return cur.rowcount
+
+
+async def existing_indexes(cur, table):
+    await cur.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return {row[0] for row in await cur.fetchall()}
+
+
+async def list_partitions(cur, table=PARTITIONED_TABLE):
+    await cur.execute(
+        "SELECT partition_name, partition_description, table_rows FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position",
+        (table,)
+    )
+    return await cur.fetchall()
+
+
+async def create_tables(cur, partitioned=False, months_back=1, months_ahead=3, dedupe=False):
+    tables = await existing_tables(cur)
+    this_month = date.today().replace(day=1)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            ddl = compile_ddl(CreateTable(table))
+            if partitioned and table.name == PARTITIONED_TABLE:
+                ddl += "\n" + partition_clause(add_months(this_month, -months_back), add_months(this_month, months_ahead))
+            await cur.execute(ddl)
+            logger.info("Created %s%s", table.name, " (partitioned by month)" if partitioned and table.name == PARTITIONED_TABLE else "")
+
+        columns = await existing_columns(cur, table.name)
+        for column in table.columns:
+            if column.name not in columns:
+                # Nullable columns appended in place: a metadata change, no table rebuild
+                await cur.execute(f"ALTER TABLE {table.name} ADD COLUMN {compile_ddl(CreateColumn(column))}, ALGORITHM=INSTANT")
+                logger.info("Added column %s to %s", column.name, table.name)
+
+        await narrow_columns(cur, table)
+        indexes = await existing_indexes(cur, table.name)
+        for index in table.indexes:
+            if index.name not in indexes:
+                if index.unique:
+                    columns = [column.name for column in index.columns]
+                    keys, extra_rows = await count_duplicates(cur, table.name, columns)
+                    if keys and not dedupe:
+                        logger.error(
+                            "Not creating %s: %d (%s) values are stored more than once "
+                            "(%d extra rows). Rerun with --dedupe to keep the first copy of each.",
+                            index.name, keys, ", ".join(columns), extra_rows
+                        )
+                        continue
+                    if keys:
+                        removed = await remove_duplicates(cur, table.name, columns, list(table.primary_key.columns)[0].name)
+                        logger.info("Removed %d duplicate rows from %s; rerun the rollups / sketches / participants backfills if they are enabled", removed, table.name)
+                # Online DDL: the table stays writable while the index builds
+                await cur.execute(compile_ddl(CreateIndex(index)) + " ALGORITHM=INPLACE LOCK=NONE")
+                logger.info("Created index %s on %s", index.name, table.name)
+
+
+async def add_partitions(cur, months_ahead=3):
+    """Splits the catch-all partition so every month up to `months_ahead` has its own."""
+    partitions = await list_partitions(cur)
+    if not partitions:
+        logger.warning("%s is not partitioned, nothing to do", PARTITIONED_TABLE)
+        return
+    names = {name for name, _, _ in partitions}
+    month = date.today().replace(day=1)
+    last_month = add_months(month, months_ahead)
+    missing = []
+    while month <= last_month:
+        if partition_name(month) not in names:
+            missing.append(month)
+        month = add_months(month, 1)
+    # Only months after the newest existing one can be split off the catch-all partition
+    newest = max((name for name in names if name != CATCH_ALL_PARTITION), default="")
+    missing = [month for month in missing if partition_name(month) > newest]
+    if not missing:
+        logger.info("Partitions are up to date")
+        return
+    definitions = [partition_definition(month) for month in missing]
+    definitions.append(f"PARTITION {CATCH_ALL_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    await cur.execute(
+        f"ALTER TABLE {PARTITIONED_TABLE} REORGANIZE PARTITION {CATCH_ALL_PARTITION} INTO (" + ", ".join(definitions) + ")"
+    )
+    logger.info("Added partitions %s", ", ".join(partition_name(month) for month in missing))
+
+
+async def drop_partitions(cur, before):
+    """Drops every monthly partition that ends on or before the first day of `before`."""
+    cutoff = partition_name(before)
+    expired = [name for name, _, _ in await list_partitions(cur) if name != CATCH_ALL_PARTITION and name < cutoff]
+    if not expired:
+        logger.info("No partitions before %s", f"{before:%Y-%m}")
+        return
+    await cur.execute(f"ALTER TABLE {PARTITIONED_TABLE} DROP PARTITION {', '.join(expired)}")
+    logger.info("Dropped partitions %s", ", ".join(expired))
+
+
+async def show(cur):
+    for table in sorted(await existing_tables(cur)):
+        logger.info("%s: indexes %s", table, sorted(await existing_indexes(cur, table)))
+    for name, description, rows in await list_partitions(cur):
+        logger.info("%s partition %s < %s (~%s rows)", PARTITIONED_TABLE, name, description, rows)
+
+
+async def main(args):
+    pool = await aiomysql.create_pool(**DB_CONFIG, minsize=1, maxsize=1)
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            if args.command == "create":
+                await create_tables(cur, args.partitioned, args.months_back, args.months_ahead, args.dedupe)
+            elif args.command == "add-partitions":
+                await add_partitions(cur, args.months_ahead)
+            elif args.command == "drop-partitions":
+                await drop_partitions(cur, args.before)
+            else:
+                await show(cur)
+    pool.close()
+    await pool.wait_closed()
+
+
+def parse_month(value):
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["create", "add-partitions", "drop-partitions", "show"])
+    parser.add_argument("--partitioned", action="store_true", help="create call_records partitioned by month")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="before adding a unique index, delete all but the first copy of duplicated keys (create)")
+    parser.add_argument("--months-back", type=int, default=1, help="past months to pre-create (create)")
+    parser.add_argument("--months-ahead", type=int, default=3, help="future months to pre-create")
+    parser.add_argument("--before", type=parse_month, help="YYYY-MM, drop partitions older than this month")
+    args = parser.parse_args()
+    if args.command == "drop-partitions" and args.before is None:
+        parser.error("drop-partitions needs --before YYYY-MM")
+
+    asyncio.run(main(args))
@@ -0,0 +1,41 @@
+import math
+
+# DDSketch-style log bins: a value v > 0 falls in bin ceil(log_gamma(v)), and every value
+# in a bin is within RELATIVE_ACCURACY of the bin's representative value. Bins are
+# plain counts, so histograms from different rows, buckets or processes merge by adding.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Smaller latencies (including 0) share the lowest bin
+MIN_VALUE = 0.001
+
+
+def bin_index(value):
+    return math.ceil(math.log(max(value, MIN_VALUE), GAMMA))
+
+
+def bin_value(index):
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def sql_bin_expression(column):
+    # bin_index() in MySQL; NULL stays NULL so unmeasured rows land in no bin
+    return f"CEIL(LOG({GAMMA!r}, GREATEST({column}, {MIN_VALUE!r})))"
+
+
+def quantiles(bins, qs, maximum=None):
+    """{bin index: count} -> [estimate per q]. `maximum` (exact) caps the top estimate."""
+    total = sum(bins.values())
+    if not total:
+        return [0 for _ in qs]
+    ordered = sorted(bins.items())
+    results = []
+    for q in qs:
+        rank = q * (total - 1)
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen > rank:
+                break
+        value = bin_value(index)
+        results.append(round(min(value, maximum) if maximum is not None else value, 3))
+    return results
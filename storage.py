@@ -0,0 +1,189 @@
+import json
+import time
+import pymysql
+from batching import MicroBatcher
+from models import CALL_RECORD_COLUMNS
+import rollups
+import latency_sketches
+import participants
+import dedupe
+import watermark
+import metrics
+import timings
+
+# CallPayload field behind each column (the columns from storage_time_ms on are measured, not sent)
+PAYLOAD_KEYS = (
+    "Overall_Call_Status", "Customer_Name", "Client_Correlation_Id",
+    "callType", "conversationDuration", "Overall_Call_Duration",
+    "Campaign_Id", "Campaign_Name", "Caller_ID", "DTMF_Capture",
+    "participants", "timestamp", "Session_ID"
+)
+
+ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * len(CALL_RECORD_COLUMNS)) + ")"
+
+
+def build_insert_query(row_count, table="call_records"):
+    # One INSERT with `row_count` VALUES tuples -> one statement, one round trip
+    return (
+        f"INSERT INTO {table} ({', '.join(CALL_RECORD_COLUMNS)}) VALUES "
+        + ", ".join([ROW_PLACEHOLDER] * row_count)
+    )
+
+
+def payload_to_row(payload, storage_time_ms=0, received_at_ms=None, published_at_ms=None, consumed_at_ms=None):
+    return (
+        payload.Overall_Call_Status,
+        payload.Customer_Name,
+        payload.Client_Correlation_Id,
+        payload.callType,
+        payload.conversationDuration,
+        payload.Overall_Call_Duration,
+        payload.Campaign_Id,
+        payload.Campaign_Name,
+        payload.Caller_ID,
+        payload.DTMF_Capture,
+        json.dumps([i.model_dump() for i in payload.participants]),
+        payload.timestamp,
+        payload.Session_ID,
+        *timings.row_tail(storage_time_ms, received_at_ms, published_at_ms, consumed_at_ms)
+    )
+
+
+def row_to_payload(row):
+    # Inverse of payload_to_row, e.g. to re-publish a row that could not be stored
+    payload = {}
+    for key, value in zip(PAYLOAD_KEYS, row):
+        if key == "participants" and isinstance(value, (str, bytes)):
+            try :
+                value = json.loads(value)
+            except ValueError:
+                pass
+        elif key == "timestamp" and hasattr(value, "isoformat"):
+            value = value.isoformat()
+        payload[key] = value
+    return payload
+
+
+async def insert_rows(cur, rows):
+    """Inserts `rows` with a single multi-row INSERT and returns their ids.
+
+    InnoDB hands out consecutive auto-increment values to a multi-row INSERT,
+    so the ids are derived from `lastrowid` (the first id of the statement).
+    The caller owns the transaction.
+    """
+    if not rows:
+        return []
+    params = [value for row in rows for value in row]
+    await cur.execute(build_insert_query(len(rows)), params)
+    first_id = cur.lastrowid
+    return [first_id + i for i in range(len(rows))]
+
+
+async def write_derived(cur, rows):
+    # Tables derived from call_records, kept in the same transaction as the rows
+    if rollups.ROLLUPS_ENABLED:
+        await rollups.upsert_rollups(cur, rows)
+    if latency_sketches.SKETCHES_ENABLED:
+        await latency_sketches.upsert_sketches(cur, rows)
+    if participants.PARTICIPANTS_ENABLED:
+        await participants.insert_participants(cur, rows)
+    if watermark.WATERMARK_ENABLED:
+        await watermark.advance(cur, rows)
+
+
+async def insert_records(cur, rows):
+    """insert_rows plus everything derived from the rows, skipping rows already stored.
+
+    Returns one result per row: the new record id, or a DuplicateRecord carrying the
+    id of the stored copy. The caller owns the transaction and, after committing,
+    should pass the results to dedupe.recent_keys.remember_results.
+    """
+    for attempt in range(3):
+        # A concurrent writer can store the same key between the lookup and the INSERT:
+        # the unique key rejects it, and the retry reads past our snapshot to find it
+        results, new_positions, repeats = await dedupe.split_duplicates(cur, rows, locking=attempt > 0)
+        new_rows = timings.stamp_insert([rows[position] for position in new_positions])
+        try:
+            record_ids = await insert_rows(cur, new_rows)
+            break
+        except pymysql.err.IntegrityError as e:
+            if not dedupe.is_duplicate_key_error(e) or attempt == 2:
+                raise
+    await write_derived(cur, new_rows)
+    return dedupe.fill_results(results, new_positions, repeats, record_ids)
+
+
+async def write_rows(pool, rows):
+    """insert_records in its own transaction, for callers without one.
+
+    Rows recent_keys already knows are answered without a database round trip.
+    """
+    results, unknown = dedupe.prefilter(rows)
+    if not unknown:
+        return results
+    pending = [rows[position] for position in unknown]
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            start = time.perf_counter()
+            try:
+                stored = await insert_records(cur, pending)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            metrics.DB_INSERT_SECONDS.observe(time.perf_counter() - start, "write_rows")
+            metrics.DB_INSERT_ROWS.observe(len(pending), "write_rows")
+    dedupe.recent_keys.remember_results(pending, stored)
+    for position, result in zip(unknown, stored):
+        results[position] = result
+    return results
+
+
+class CoalescingWriter:
+    """Merges concurrent single-row writes into one multi-row INSERT and one commit.
+
+    Each caller still gets its own record id, DuplicateRecord or exception: if the
+    merged INSERT fails, the rows are retried one by one so a bad row only fails itself.
+    """
+
+    def __init__(self, pool, window_ms, max_batch):
+        self.pool = pool
+        self.batcher = MicroBatcher(self.write_batch, window_ms, max_batch)
+
+    async def write(self, row):
+        # Known duplicates never join a batch
+        duplicate = dedupe.recent_keys.get(dedupe.record_key(row))
+        if duplicate is not None:
+            return duplicate
+        return await self.batcher.submit(row)
+
+    async def write_batch(self, rows):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                start = time.perf_counter()
+                try:
+                    results = await insert_records(cur, rows)
+                    await conn.commit()
+                    metrics.DB_INSERT_SECONDS.observe(time.perf_counter() - start, "coalescing")
+                    metrics.DB_INSERT_ROWS.observe(len(rows), "coalescing")
+                    dedupe.recent_keys.remember_results(rows, results)
+                    return results
+                except Exception as e:
+                    await conn.rollback()
+                    if len(rows) == 1:
+                        return [e]
+
+                results = []
+                for row in rows:
+                    try:
+                        result, = await insert_records(cur, [row])
+                        await conn.commit()
+                        dedupe.recent_keys.remember_results([row], [result])
+                        results.append(result)
+                    except Exception as e:
+                        await conn.rollback()
+                        results.append(e)
+                return results
+
+    async def close(self):
+        await self.batcher.close()
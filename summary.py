@@ -0,0 +1,69 @@
+STATUSES = ("Answered", "Missed", "Connected")
+
+# One scan over the filtered range: the finest grouping every summary section can be
+# folded from in Python. Sums and non-NULL counts (not AVGs) so groups merge exactly.
+GROUPED_SUMMARY_QUERY = """
+    SELECT campaign_name, dtmf_capture, overall_call_status, call_type,
+        COUNT(*) AS total,
+        SUM(processing_time_ms) AS processing_sum, COUNT(processing_time_ms) AS processing_count,
+        SUM(storage_time_ms) AS storage_sum, COUNT(storage_time_ms) AS storage_count
+    FROM call_records {where_sql}
+    GROUP BY campaign_name, dtmf_capture, overall_call_status, call_type
+"""
+
+
+def status_breakdown():
+    return {"total" : 0, "answered" : 0, "missed" : 0, "connected" : 0}
+
+
+def build_summary(groups):
+    """Folds grouped rows (dicts shaped like GROUPED_SUMMARY_QUERY's output) into the
+    `summary` section returned by /api/monitor/summary."""
+    total_calls = 0
+    by_campaign = {}
+    by_dtmf = {}
+    by_status = {}
+    by_call_type = {}
+    processing_sum = processing_count = storage_sum = storage_count = 0
+
+    for group in groups:
+        count = int(group["total"])
+        status = group["overall_call_status"]
+        total_calls += count
+
+        for breakdown in (
+            by_campaign.setdefault(group["campaign_name"], status_breakdown()),
+            by_dtmf.setdefault(group["dtmf_capture"], status_breakdown())
+        ):
+            breakdown["total"] += count
+            if status in STATUSES:
+                breakdown[status.lower()] += count
+
+        by_status[status] = by_status.get(status, 0) + count
+        by_call_type[group["call_type"]] = by_call_type.get(group["call_type"], 0) + count
+
+        processing_sum += group["processing_sum"] or 0
+        processing_count += int(group["processing_count"] or 0)
+        storage_sum += group["storage_sum"] or 0
+        storage_count += int(group["storage_count"] or 0)
+
+    return {
+        "total_calls": total_calls,
+        "by_campaign": [{"campaign_name" : name, **values} for name, values in by_campaign.items()],
+        "by_dtmf": [{"dtmf_value" : value, **values} for value, values in by_dtmf.items()],
+        "by_call_status": [
+            {
+                "status" : status,
+                "count" : count,
+                "percentage" : round((count / total_calls * 100), 2) if total_calls > 0 else 0
+            }
+            for status, count in by_status.items()
+        ],
+        "by_call_type": [{"type" : call_type, "count" : count} for call_type, count in by_call_type.items()],
+        "performance_metrics": {
+            "avg_processing_time_ms": round(processing_sum / processing_count, 2) if processing_count else 0,
+            "avg_storage_time_ms": round(storage_sum / storage_count, 2) if storage_count else 0,
+            "total_requests": total_calls,
+            "successful_requests": total_calls
+        }
+    }
@@ -0,0 +1,77 @@
+import time
+import asyncio
+
+# Following an AUTO_INCREMENT table by id. Ids are assigned at INSERT but become
+# visible at COMMIT, so with concurrent writers a poll can see id 12 before id 11.
+# Ids skipped that way are asked for again on later polls until they show up or
+# GAP_TIMEOUT_S passes (a rolled-back insert leaves a hole that never fills).
+GAP_TIMEOUT_S = 30
+MAX_GAPS = 10000
+
+
+class IdTail:
+    """The ids of a table read so far: everything up to `last_id` except `gaps`."""
+
+    def __init__(self, last_id, gap_timeout=GAP_TIMEOUT_S):
+        self.last_id = last_id
+        self.gap_timeout = gap_timeout
+        self.gaps = {}
+
+    def condition(self, column="id"):
+        """(sql, params) selecting the ids not read yet."""
+        expired = time.monotonic() - self.gap_timeout
+        self.gaps = {gap : missed_at for gap, missed_at in self.gaps.items() if missed_at > expired}
+        if not self.gaps:
+            return f"{column} > %s", [self.last_id]
+        gaps = sorted(self.gaps)
+        return f"({column} > %s OR {column} IN ({', '.join(['%s'] * len(gaps))}))", [self.last_id, *gaps]
+
+    def seen(self, ids):
+        """Records the ids a poll returned, in ascending order."""
+        now = time.monotonic()
+        for entry_id in ids:
+            if entry_id <= self.last_id:
+                self.gaps.pop(entry_id, None)
+                continue
+            first_gap = max(self.last_id + 1, entry_id - MAX_GAPS)
+            self.gaps.update(dict.fromkeys(range(first_gap, entry_id), now))
+            self.last_id = entry_id
+        if len(self.gaps) > MAX_GAPS:
+            self.gaps = dict(sorted(self.gaps.items())[-MAX_GAPS:])
+
+
+class Poller:
+    """Runs `poll_once(cur)` every `interval` seconds in a background task."""
+
+    def __init__(self, pool, interval, logger, name):
+        self.pool = pool
+        self.interval = interval
+        self.logger = logger
+        self.name = name
+        self.task = None
+
+    async def poll_once(self, cur):
+        raise NotImplementedError
+
+    async def run(self):
+        while True:
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.cursor() as cur:
+                        await self.poll_once(cur)
+                    # Ends the read snapshot so the next poll sees new commits
+                    await conn.commit()
+            except Exception as e:
+                self.logger.error("%s poll failed : %s", self.name, e, extra={"correlation_id" : "SYSTEM"})
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
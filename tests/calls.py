@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+# Call bodies for the tests, as a client sends them to API-1
+
+
+def make_call(index=0, **fields):
+    call = {
+        "Overall_Call_Status" : "Answered",
+        "Customer_Name" : f"User_{index}",
+        "Client_Correlation_Id" : f"corr-{index:06d}",
+        "callType" : "INBOUND",
+        "conversationDuration" : 120.5 + index,
+        "Overall_Call_Duration" : "00:02:10",
+        "Campaign_Id" : "CMP-1",
+        "Campaign_Name" : "Renewals",
+        "Caller_ID" : "+15550100",
+        "DTMF_Capture" : 1,
+        "participants" : [
+            {"participantAddress" : "agent-7", "participantType" : "AGENT", "status" : "connected", "duration" : 120.5}
+        ],
+        "timestamp" : (datetime(2025, 1, 6, 10, 0, 0) + timedelta(seconds=index)).isoformat(),
+        "Session_ID" : f"SESS_{index}"
+    }
+    call.update(fields)
+    return call
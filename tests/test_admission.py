@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+import admission
+import api_1
+from admission import AdmissionController, CircuitBreaker, Overloaded
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_admission_caps_requests_in_flight():
+    controller = AdmissionController(max_in_flight=2, retry_after=3)
+
+    async def scenario():
+        async with controller.admit():
+            async with controller.admit():
+                with pytest.raises(Overloaded) as err:
+                    async with controller.admit():
+                        pass
+                assert (err.value.status_code, err.value.retry_after) == (429, 3)
+        assert controller.in_flight == 0
+        # A failing request still gives its slot back
+        with pytest.raises(ValueError):
+            async with controller.admit():
+                raise ValueError("boom")
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+    assert controller.rejected == 1
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 2
+    with pytest.raises(Overloaded) as err:
+        breaker.check()
+    assert (err.value.status_code, err.value.retry_after) == (503, 3)
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.state == "half-open"
+    breaker.check()
+    with pytest.raises(Overloaded):
+        breaker.check()
+
+    # A failed trial re-opens for a full reset_timeout
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 5
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.check()
+    breaker.check()
+
+
+def test_cancelled_trial_does_not_keep_the_breaker_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock.now += 5
+    app = SimpleNamespace(state=SimpleNamespace(breaker=breaker, sink=SimpleNamespace(name="fake")))
+
+    async def cancelled(*args):
+        raise asyncio.CancelledError()
+
+    async def answers(*args):
+        return {"status" : "success"}
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(api_1.call_sink(app, cancelled))
+    assert not breaker.trial_in_flight
+    assert asyncio.run(api_1.call_sink(app, answers)) == {"status" : "success"}
+    assert breaker.state == "closed"
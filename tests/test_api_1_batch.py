@@ -0,0 +1,87 @@
+import json
+import asyncio
+import httpx
+
+import api_1
+from admission import AdmissionController, CircuitBreaker
+from tests.calls import make_call
+
+
+class FakeSink:
+    """Answers send_batch with a stored record per payload, or the result in `answers`."""
+
+    name = "fake"
+
+    def __init__(self, answers=None, error=None):
+        self.answers = answers or {}
+        self.error = error
+        self.batches = []
+
+    async def send_batch(self, payloads, received_at_ms=None):
+        self.batches.append(payloads)
+        if self.error is not None:
+            raise self.error
+        return [
+            self.answers.get(payload.Client_Correlation_Id, {"status" : "success", "message" : "stored", "record_id" : position + 1})
+            for position, payload in enumerate(payloads)
+        ]
+
+
+def post_batch(sink, body):
+    api_1.app.state.sink = sink
+    api_1.app.state.admission = AdmissionController(10)
+    api_1.app.state.breaker = CircuitBreaker(5, 5)
+
+    async def post():
+        transport = httpx.ASGITransport(app=api_1.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api-1") as client:
+            return await client.post("/api/receive/batch", content=body, headers={"content-type" : "application/x-ndjson"})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    return response.json()
+
+
+def ndjson_batch():
+    calls = [make_call(index) for index in range(4)]
+    del calls[1]["Customer_Name"]
+    return calls, b"\n".join(json.dumps(call).encode() for call in calls)
+
+
+def test_partial_failure_is_reported_per_record():
+    calls, body = ndjson_batch()
+    sink = FakeSink(answers={
+        calls[2]["Client_Correlation_Id"] : {"status" : "duplicate", "message" : "already stored", "record_id" : 9},
+        calls[3]["Client_Correlation_Id"] : {"status" : "error", "message" : "Data too long"}
+    })
+    result = post_batch(sink, body)
+
+    # The invalid record never reaches the sink
+    assert [payload.Client_Correlation_Id for payload in sink.batches[0]] == [calls[i]["Client_Correlation_Id"] for i in (0, 2, 3)]
+    assert [item["index"] for item in result["results"]] == [0, 1, 2, 3]
+    assert [item["status"] for item in result["results"]] == ["success", "error", "duplicate", "error"]
+    assert result["results"][1]["correlation_id"] == calls[1]["Client_Correlation_Id"]
+    assert result["results"][1]["message"].startswith("Validation failed : ")
+    assert result["results"][2]["record_id"] == 9
+    assert (result["status"], result["accepted"], result["duplicates"], result["rejected"]) == ("error", 2, 1, 2)
+
+
+def test_sink_failure_fails_only_the_forwarded_records():
+    _, body = ndjson_batch()
+    result = post_batch(FakeSink(error=ConnectionError("refused")), body)
+    assert [item["status"] for item in result["results"]] == ["error"] * 4
+    assert result["results"][0]["message"] == "Data forwarding failed => ConnectionError"
+    assert result["results"][1]["message"].startswith("Validation failed : ")
+    assert (result["accepted"], result["rejected"]) == (0, 4)
+
+
+def test_records_the_sink_did_not_answer_are_errors():
+    _, body = ndjson_batch()
+
+    class ShortSink(FakeSink):
+        async def send_batch(self, payloads, received_at_ms=None):
+            return (await super().send_batch(payloads))[:1]
+
+    result = post_batch(ShortSink(), body)
+    assert [item["status"] for item in result["results"]] == ["success", "error", "error", "error"]
+    assert result["results"][3]["message"] == "No result returned by the sink"
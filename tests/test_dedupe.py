@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timezone
+
+import dedupe
+from dedupe import DuplicateRecord, RecentKeys, record_key
+from models import CALL_RECORD_COLUMNS
+
+
+def make_row(correlation_id, timestamp):
+    row = [None] * len(CALL_RECORD_COLUMNS)
+    row[dedupe.CORRELATION_INDEX] = correlation_id
+    row[dedupe.TIMESTAMP_INDEX] = timestamp
+    return tuple(row)
+
+
+class LookupCursor:
+    """Answers find_existing's SELECT with the given (correlation id, timestamp, id) rows."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.queries = []
+
+    async def execute(self, query, args=None):
+        self.queries.append((query, args))
+
+    async def fetchall(self):
+        return self.stored
+
+
+def test_normalize_timestamp_matches_mysql_datetime():
+    assert dedupe.normalize_timestamp("2024-05-01T10:00:00.6") == datetime(2024, 5, 1, 10, 0, 1)
+    assert dedupe.normalize_timestamp(b"2024-05-01 10:00:00.4") == datetime(2024, 5, 1, 10, 0, 0)
+    aware = datetime(2024, 5, 1, 10, 0, 0, tzinfo=timezone.utc)
+    assert dedupe.normalize_timestamp(aware) == datetime(2024, 5, 1, 10, 0, 0)
+    assert dedupe.normalize_timestamp(None) is None
+
+
+def test_recent_keys_window_and_size(monkeypatch):
+    keys = RecentKeys(window_s=10, max_keys=2)
+    now = [100.0]
+    monkeypatch.setattr(dedupe.time, "monotonic", lambda: now[0])
+    keys.remember("a", 1)
+    keys.remember("b", 2)
+    keys.remember("c", 3)
+    # Oldest key evicted by size
+    assert keys.get("a") is None
+    assert keys.get("b").record_id == 2
+    now[0] += 11
+    # Expired by age
+    assert keys.get("c") is None
+
+
+def test_remember_results_skips_failures():
+    keys = RecentKeys(window_s=60, max_keys=10)
+    rows = [make_row("a", datetime(2024, 1, 1)), make_row("b", datetime(2024, 1, 1)), make_row("c", datetime(2024, 1, 1))]
+    keys.remember_results(rows, [7, DuplicateRecord(3), ValueError("failed")])
+    assert keys.get(record_key(rows[0])).record_id == 7
+    assert keys.get(record_key(rows[1])).record_id == 3
+    assert keys.get(record_key(rows[2])) is None
+
+
+def test_split_duplicates_and_fill_results():
+    when = datetime(2024, 1, 1, 12, 0, 0)
+    rows = [make_row("stored", when), make_row("new", when), make_row("new", when), make_row("other", when)]
+    cursor = LookupCursor([("stored", when, 41)])
+
+    results, new_positions, repeats = asyncio.run(dedupe.split_duplicates(cursor, rows))
+    assert isinstance(results[0], DuplicateRecord) and results[0].record_id == 41
+    assert new_positions == [1, 3]
+    assert repeats == {2 : 1}
+
+    filled = dedupe.fill_results(results, new_positions, repeats, [100, 101])
+    assert filled[1] == 100 and filled[3] == 101
+    assert isinstance(filled[2], DuplicateRecord) and filled[2].record_id == 100
+
+
+def test_locking_lookup_reads_past_the_snapshot():
+    cursor = LookupCursor([])
+    asyncio.run(dedupe.find_existing(cursor, [("a", datetime(2024, 1, 1))], locking=True))
+    assert cursor.queries[0][0].endswith("FOR SHARE")
@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import io
+import json
+from contextlib import asynccontextmanager
+
+import export
+
+
+class FakeCursor:
+    """Answers PAGE_QUERY from `table` (EXPORT_COLUMNS tuples), honouring `id > %s` and LIMIT."""
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    async def execute(self, query, params):
+        self.db.queries.append((query, params))
+        *filters, limit = params
+        after_id = filters[-1] if "id > %s" in query else 0
+        self.pending = [row for row in self.db.table if row[0] > after_id][:limit]
+
+    async def fetchmany(self, size):
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db)
+
+    async def commit(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, ids):
+        blank = (None,) * (len(export.EXPORT_COLUMNS) - 1)
+        self.table = [(row_id,) + blank for row_id in ids]
+        self.queries = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+
+def collect(pool, export_format, **options):
+    async def scenario():
+        return [chunk async for chunk in export.stream_export(pool, "", [], export_format, **options)]
+    return b"".join(asyncio.run(scenario()))
+
+
+def test_pages_walk_the_primary_key(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_PAGE_SIZE", 3)
+    pool = FakePool([1, 2, 4, 5, 7, 9, 10])
+    lines = collect(pool, "ndjson").decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 4, 5, 7, 9, 10]
+    # Each page starts after the last id of the previous one, never with an OFFSET
+    assert [params for _, params in pool.queries] == [[3], [4, 3], [9, 3]]
+    assert "OFFSET" not in pool.queries[0][0]
+
+
+def test_resume_and_limit(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_PAGE_SIZE", 2)
+    pool = FakePool(range(1, 11))
+    rows = list(csv.reader(io.StringIO(collect(pool, "csv", after_id=4, limit=3).decode())))
+    assert rows[0] == list(export.EXPORT_COLUMNS)
+    assert [int(row[0]) for row in rows[1:]] == [5, 6, 7]
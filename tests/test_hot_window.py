@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from api_3 import build_where_clause
+from hot_window import POLL_COLUMNS, HotWindowStore
+from summary import GROUPED_SUMMARY_QUERY
+
+START = datetime(2025, 1, 6, 10, 0)
+CAMPAIGNS = ("Renewals", "Sales", None)
+STATUSES = ("Answered", "Missed", "Connected")
+
+
+def make_rows(count):
+    # POLL_COLUMNS tuples: id, call_timestamp, campaign, status, type, dtmf, processing, storage
+    return [
+        (row_id, START + timedelta(seconds=7 * row_id), CAMPAIGNS[row_id % 3], STATUSES[row_id % 5 % 3],
+         "INBOUND" if row_id % 2 else "OUTBOUND", None if row_id % 4 == 0 else row_id % 3,
+         None if row_id % 6 == 0 else float(row_id % 40), float(row_id % 17))
+        for row_id in range(1, count + 1)
+    ]
+
+
+def sql_groups(rows, filters):
+    """GROUPED_SUMMARY_QUERY with api_3's where clause, run by SQLite."""
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute(f"CREATE TABLE call_records ({', '.join(POLL_COLUMNS)})")
+    db.executemany(f"INSERT INTO call_records VALUES ({', '.join('?' * len(POLL_COLUMNS))})",
+                   [(row[0], row[1].isoformat(" "), *row[2:]) for row in rows])
+    where_sql, params = build_where_clause(*filters)
+    query = GROUPED_SUMMARY_QUERY.format(where_sql=where_sql).replace("%s", "?")
+    return [dict(row) for row in db.execute(query, params)]
+
+
+def comparable(groups):
+    return sorted(
+        (tuple(str(group[name]) for name in ("campaign_name", "dtmf_capture", "overall_call_status", "call_type")),
+         group["total"], round(group["processing_sum"] or 0, 6), group["processing_count"],
+         round(group["storage_sum"] or 0, 6), group["storage_count"])
+        for group in groups
+    )
+
+
+def loaded_store(rows):
+    store = HotWindowStore(None, window_minutes=24 * 60)
+    store.append(rows)
+    store.covered_from = START
+    store.tail = object()
+    store.ready = True
+    return store
+
+
+@pytest.mark.parametrize("filters", [
+    (None, None, None, None, "2025-01-06 10:00:00", None),
+    ("Sales", None, None, None, "2025-01-06 10:05:00", "2025-01-06 10:20:00"),
+    (None, "null", "Answered", None, "2025-01-06 10:00:00", None),
+    (None, "2", None, "INBOUND", "2025-01-06 10:01:00", "2025-01-06 10:30:00"),
+])
+def test_mask_and_groups_match_the_grouped_query(filters):
+    rows = make_rows(300)
+    store = loaded_store(rows)
+    mask = store.build_mask(*filters)
+    assert comparable(store.summary_groups(mask)) == comparable(sql_groups(rows, filters))
+
+
+def test_unknown_values_and_uncovered_windows():
+    store = loaded_store(make_rows(10))
+    assert not store.build_mask("Nobody", None, None, None, "2025-01-06 10:00:00", None).any()
+    assert store.build_mask(None, None, None, None, "2025-01-06 09:00:00", None) is None
+    assert store.build_mask(None, None, None, None, None, None) is None
+
+
+def test_aware_dates_are_compared_as_stored():
+    store = loaded_store(make_rows(10))
+    mask = store.build_mask(None, None, None, None, "2025-01-06T10:00:30+00:00", "2025-01-06T10:01:00Z")
+    assert store.columns["id"].values[mask].tolist() == [5, 6, 7, 8]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.visible = rows
+        self.result = None
+
+    async def execute(self, query, params=()):
+        if "MAX(call_timestamp)" in query:
+            self.result = [(max(row[1] for row in self.visible),)]
+        elif "call_timestamp >= %s" in query:
+            self.result = [row for row in self.visible if row[1] >= params[0]]
+        else:
+            last_id, *gaps = params
+            self.result = sorted(row for row in self.visible if row[0] > last_id or row[0] in gaps)
+
+    async def fetchone(self):
+        return self.result[0]
+
+    async def fetchall(self):
+        return self.result
+
+
+def test_late_commits_are_picked_up_once():
+    rows = make_rows(6)
+    cursor = FakeCursor(rows[:3])
+    store = HotWindowStore(None, window_minutes=60)
+
+    async def scenario():
+        await store.poll_once(cursor)
+        # Id 6 commits before ids 4 and 5
+        cursor.visible = rows[:3] + rows[5:]
+        await store.poll_once(cursor)
+        cursor.visible = rows
+        await store.poll_once(cursor)
+        await store.poll_once(cursor)
+
+    asyncio.run(scenario())
+    assert sorted(store.columns["id"].values.tolist()) == [1, 2, 3, 4, 5, 6]
+    assert not store.tail.gaps
@@ -0,0 +1,52 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+
+import ingest
+from models import CallPayload
+from sinks import HttpSink
+from storage import payload_to_row
+from tests.calls import make_call
+from wire import json_payload_to_row
+
+
+def forward(monkeypatch, calls):
+    """Bodies and headers API-1's http sink sends to API-2 for `calls`."""
+    monkeypatch.setattr(ingest, "TRUST_TOKEN", "secret")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        body = json.loads(request.content)
+        if isinstance(body, list):
+            return httpx.Response(200, json={"results" : [{"status" : "success"} for _ in body]})
+        return httpx.Response(200, json={"status" : "success"})
+
+    async def scenario():
+        sink = HttpSink()
+        sink.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        payloads = [ingest.parse_call(json.dumps(call).encode()) for call in calls]
+        await sink.send(payloads[0])
+        await sink.send_batch(payloads)
+        await sink.close()
+        return payloads
+
+    return asyncio.run(scenario()), requests
+
+
+@pytest.mark.parametrize("fields", [
+    {"timestamp" : "1736157600"},
+    {"timestamp" : 1736157600000},
+    {"conversationDuration" : "125.5"},
+    {"DTMF_Capture" : None, "participants" : []},
+])
+def test_trusted_rows_match_the_validated_rows(monkeypatch, fields):
+    payloads, (single, batch) = forward(monkeypatch, [make_call(1, **fields), make_call(2)])
+    assert ingest.is_trusted(single.headers) and ingest.is_trusted(batch.headers)
+    assert ingest.trusted_key(single.headers) == (payloads[0].Client_Correlation_Id, payloads[0].timestamp.replace(tzinfo=None))
+
+    expected = [payload_to_row(payload) for payload in payloads]
+    assert json_payload_to_row(json.loads(single.content)) == expected[0]
+    assert [json_payload_to_row(record) for record in json.loads(batch.content)] == expected
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from latency_sketches import aggregate, build_percentiles
+from models import CallPayload
+from sketch import RELATIVE_ACCURACY, bin_index
+from storage import payload_to_row
+from tests.calls import make_call
+
+
+def row(index, storage_time_ms, **fields):
+    return payload_to_row(CallPayload.model_validate(make_call(index, **fields)), storage_time_ms=storage_time_ms)
+
+
+def test_rows_fold_into_per_minute_bins():
+    bins = aggregate([row(0, 10), row(1, 10.05), row(2, 50, Campaign_Name="Sales"), row(3, None)])
+    minute = datetime(2025, 1, 6, 10, 0)
+    assert bins == {
+        (minute, "Renewals", "storage_time_ms", bin_index(10)) : [2, 10.05],
+        (minute, "Sales", "storage_time_ms", bin_index(50)) : [1, 50]
+    }
+
+
+def test_merged_bins_give_percentiles_within_the_relative_accuracy():
+    latencies = list(range(1, 101))
+    bins = aggregate([row(index, latency) for index, latency in enumerate(latencies)])
+    # Shaped like SKETCH_MERGE_QUERY rows
+    merged = {}
+    for (_, _, metric, index), (count, maximum) in bins.items():
+        total, top = merged.get((metric, index), (0, 0))
+        merged[(metric, index)] = (total + count, max(top, maximum))
+    percentiles = build_percentiles([
+        {"metric" : metric, "bin_index" : index, "count" : count, "max_value" : maximum}
+        for (metric, index), (count, maximum) in merged.items()
+    ])
+    storage = percentiles["storage_time_ms"]
+    for name, exact in (("p50", 50), ("p90", 90), ("p99", 99)):
+        assert abs(storage[name] - exact) <= exact * RELATIVE_ACCURACY + 1
+    assert storage["max"] == 100
+    assert percentiles["processing_time_ms"] == {"p50" : 0, "p90" : 0, "p99" : 0, "max" : 0}
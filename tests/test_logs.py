@@ -0,0 +1,36 @@
+import queue
+import logging
+import logs
+
+
+def record(level, message="message"):
+    return logging.LogRecord("test", level, __file__, 1, message, None, None)
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(logs, "LOG_QUEUE_SIZE", 10)
+    handler = logs.NonBlockingQueueHandler(queue.Queue(10))
+    for _ in range(20):
+        handler.handle(record(logging.INFO))
+    # INFO stops at 90%, the rest of the queue is kept for warnings and errors
+    assert handler.queue.qsize() == 9
+    assert handler.dropped == 11
+    for _ in range(3):
+        handler.handle(record(logging.ERROR))
+    assert handler.queue.qsize() == 10
+    assert handler.dropped_warnings == 2
+
+
+def test_records_are_queued_unformatted():
+    handler = logs.NonBlockingQueueHandler(queue.Queue(10))
+    handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, "took %.2fms", (1.5,), None))
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "took %.2fms" and queued.args == (1.5,)
+
+
+def test_sampling_never_drops_warnings_or_errors():
+    sampler = logs.SamplingFilter(0.0)
+    assert not sampler.filter(record(logging.INFO))
+    assert sampler.filter(record(logging.WARNING))
+    assert sampler.filter(record(logging.ERROR))
+    assert sampler.sampled_out == 1
@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+from metrics import Gauge, Histogram, Registry, serve
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("call_seconds", "Call time.", buckets=(0.1, 1.0), labelnames=("service",))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "api_2")
+    assert histogram.render() == [
+        "# HELP call_seconds Call time.",
+        "# TYPE call_seconds histogram",
+        'call_seconds_bucket{service="api_2",le="0.1"} 2',
+        'call_seconds_bucket{service="api_2",le="1.0"} 3',
+        'call_seconds_bucket{service="api_2",le="+Inf"} 4',
+        'call_seconds_sum{service="api_2"} 3.65',
+        'call_seconds_count{service="api_2"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("rows", "Rows.", buckets=(1,), labelnames=("writer",))
+    histogram.observe(1, 'a"b\\c\nd')
+    assert 'rows_count{writer="a\\"b\\\\c\\nd"} 1' in histogram.render()
+
+
+def test_gauges_are_read_at_scrape_time():
+    gauge = Gauge("in_use", "Connections in use.", labelnames=("pool",))
+    pool = SimpleNamespace(in_use=1)
+    gauge.track(lambda: pool.in_use, "api_2")
+    gauge.track(lambda: pool.closed.size, "closed")
+    gauge.track(lambda: None, "unknown")
+    pool.in_use = 4
+    # A failing or empty callback leaves its series out instead of failing the scrape
+    assert gauge.render()[2:] == ['in_use{pool="api_2"} 4']
+
+
+def test_registering_twice_keeps_one_series():
+    registry = Registry()
+    first = registry.histogram("flush_seconds", "Flush time.")
+    assert registry.histogram("flush_seconds", "Flush time.") is first
+    first.observe(0.2)
+    assert registry.render().count("# TYPE flush_seconds histogram") == 1
+    assert registry.render().endswith("flush_seconds_count 1\n")
+
+
+def test_serve_answers_a_scrape():
+    async def scenario():
+        server = await serve(0, "127.0.0.1")
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    head, body = asyncio.run(scenario()).split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"# TYPE call_validation_seconds histogram" in body
@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+
+from models import CallPayload
+from participants import build_participant_detail, build_participant_list, explode
+from storage import payload_to_row
+from tests.calls import make_call
+
+AGENT = {"participantAddress" : "agent-7", "participantType" : "AGENT", "status" : "connected", "duration" : 120.5}
+CUSTOMER = {"participantAddress" : "+15550100", "participantType" : "CUSTOMER", "status" : "connected", "duration" : 118}
+
+
+def row(index, participants, **fields):
+    return payload_to_row(CallPayload.model_validate(make_call(index, participants=participants, **fields)))
+
+
+def test_explode_makes_one_row_per_participant():
+    rows = [row(0, [AGENT, CUSTOMER]), row(1, []), row(2, [AGENT], Overall_Call_Status="Missed")]
+    exploded = explode(rows)
+    assert [participant[4:] for participant in exploded] == [
+        ("agent-7", "AGENT", "connected", 120.5), ("+15550100", "CUSTOMER", "connected", 118),
+        ("agent-7", "AGENT", "connected", 120.5)
+    ]
+    assert exploded[0][:4] == ("corr-000000", datetime(2025, 1, 6, 10, 0), "Renewals", "Answered")
+    assert exploded[2][3] == "Missed"
+
+
+def test_explode_reads_stored_json():
+    stored = row(0, [AGENT])
+    index = 10
+    assert isinstance(stored[index], str) and json.loads(stored[index])
+    unreadable = stored[:index] + ("{not json",) + stored[index + 1:]
+    assert len(explode([stored])) == 1 and explode([unreadable]) == []
+
+
+def group(address, status, call_status, calls, duration_sum, campaign="Renewals"):
+    # Shaped like a PARTICIPANT_QUERY row
+    return {
+        "participant_address" : address, "participant_type" : "AGENT", "status" : status,
+        "overall_call_status" : call_status, "campaign_name" : campaign, "calls" : calls,
+        "duration_sum" : duration_sum, "duration_count" : calls, "last_call" : datetime(2025, 1, 6, 10, calls)
+    }
+
+
+def test_groups_fold_per_participant():
+    groups = [group("agent-7", "connected", "Answered", 3, 300), group("agent-7", "missed", "Missed", 1, 0, "Sales"),
+              group("agent-9", "connected", "Answered", 2, 100)]
+    busiest, = build_participant_list(groups, limit=1)
+    assert busiest["participant_address"] == "agent-7"
+    assert (busiest["calls"], busiest["talk_time"], busiest["avg_duration"], busiest["missed_calls"]) == (4, 300, 75, 1)
+    assert busiest["last_call"] == "2025-01-06T10:03:00"
+
+    detail = build_participant_detail(groups[:2])
+    assert detail["participant_types"] == ["AGENT"]
+    assert [(campaign["campaign_name"], campaign["calls"]) for campaign in detail["by_campaign"]] == [("Renewals", 3), ("Sales", 1)]
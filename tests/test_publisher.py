@@ -0,0 +1,126 @@
+import json
+import asyncio
+import pytest
+from pamqp.commands import Basic
+
+from dedupe import DuplicateRecord
+from models import CallPayload
+from publisher import ConfirmingPublisher, PublishNotConfirmed
+from wire import RECORD_COUNT_HEADER
+from tests.calls import make_call
+
+
+class FakeExchange:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def publish(self, message, routing_key, mandatory=False):
+        self.broker.messages.append(message)
+        if self.broker.nack:
+            return Basic.Nack(delivery_tag=len(self.broker.messages))
+        return Basic.Ack(delivery_tag=len(self.broker.messages))
+
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.default_exchange = FakeExchange(broker)
+
+    async def declare_queue(self, name, durable=False):
+        return None
+
+    async def close(self):
+        pass
+
+
+class FakeBroker:
+    """A connection whose channels confirm (or nack) every publish."""
+
+    def __init__(self, nack=False):
+        self.nack = nack
+        self.messages = []
+
+    async def channel(self, publisher_confirms=False):
+        assert publisher_confirms
+        return FakeChannel(self)
+
+
+def payload(index):
+    return CallPayload.model_validate(make_call(index))
+
+
+def ids(message):
+    body = json.loads(message.body)
+    return [call["Client_Correlation_Id"] for call in (body if isinstance(body, list) else [body])]
+
+
+def run(broker, scenario, **options):
+    async def main():
+        publisher = ConfirmingPublisher(broker, "calls", channels=2, **options)
+        await publisher.start()
+        try:
+            return publisher, await scenario(publisher)
+        finally:
+            await publisher.close()
+
+    return asyncio.run(main())
+
+
+def test_acked_publishes_are_counted():
+    broker = FakeBroker()
+    publisher, results = run(broker, lambda publisher: publisher.publish_batch([payload(1), payload(2)]))
+    assert results == [None, None]
+    assert [ids(message) for message in broker.messages] == [["corr-000001"], ["corr-000002"]]
+    assert (publisher.published_messages, publisher.published_records, publisher.failed_messages) == (2, 2, 0)
+
+
+def test_nacked_publish_fails_its_caller():
+    broker = FakeBroker(nack=True)
+
+    async def scenario(publisher):
+        with pytest.raises(PublishNotConfirmed):
+            await publisher.publish(payload(1))
+        return await publisher.publish_batch([payload(2)])
+
+    publisher, results = run(broker, scenario)
+    assert isinstance(results[0], PublishNotConfirmed)
+    assert (publisher.published_messages, publisher.failed_messages) == (0, 2)
+
+
+def test_concurrent_records_share_a_message():
+    broker = FakeBroker()
+
+    async def scenario(publisher):
+        return await asyncio.gather(*(publisher.publish(payload(i)) for i in range(5)))
+
+    publisher, _ = run(broker, scenario, batch_records=3, linger_ms=20)
+    assert [ids(message) for message in broker.messages] == [
+        ["corr-000000", "corr-000001", "corr-000002"], ["corr-000003", "corr-000004"]
+    ]
+    assert [message.headers[RECORD_COUNT_HEADER] for message in broker.messages] == [3, 2]
+    assert publisher.published_records == 5
+
+
+def test_confirmed_records_are_not_published_again():
+    broker = FakeBroker()
+
+    async def scenario(publisher):
+        await publisher.publish(payload(1))
+        return await publisher.publish(payload(1)), await publisher.publish_batch([payload(1), payload(2)])
+
+    publisher, (repeat, results) = run(broker, scenario)
+    assert isinstance(repeat, DuplicateRecord) and repeat.record_id is None
+    assert isinstance(results[0], DuplicateRecord) and results[1] is None
+    assert [ids(message) for message in broker.messages] == [["corr-000001"], ["corr-000002"]]
+
+
+def test_a_nacked_record_is_not_remembered():
+    broker = FakeBroker(nack=True)
+
+    async def scenario(publisher):
+        await publisher.publish_batch([payload(1)])
+        broker.nack = False
+        return await publisher.publish_batch([payload(1)])
+
+    _, results = run(broker, scenario)
+    assert results == [None]
+    assert len(broker.messages) == 2
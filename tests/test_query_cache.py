@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime
+from query_cache import QueryCache, parse_window
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_solo_load_is_cached():
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return "rows"
+
+    async def scenario():
+        first = await cache.get_or_load("key", (None, None), loader)
+        second = await cache.get_or_load("key", (None, None), loader)
+        return first, second
+
+    assert run(scenario()) == ("rows", "rows")
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.hits == 1
+    assert not cache.inflight
+
+
+def test_concurrent_misses_share_one_load():
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "rows"
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_load("key", (None, None), loader) for _ in range(3)])
+
+    assert run(scenario()) == ["rows", "rows", "rows"]
+    assert len(calls) == 1
+    assert cache.coalesced == 2
+    assert "key" in cache.entries
+
+
+def test_failed_load_reaches_every_waiter_and_is_not_cached():
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("db down")
+
+    async def scenario():
+        return await asyncio.gather(
+            *[cache.get_or_load("key", (None, None), loader) for _ in range(3)],
+            return_exceptions=True
+        )
+
+    results = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert not cache.entries and not cache.inflight
+
+
+def test_failed_load_overlapping_a_write_leaves_nothing_behind():
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+
+    async def loader():
+        cache.invalidate(None, None)
+        raise ValueError("db down")
+
+    try :
+        run(cache.get_or_load("key", (None, None), loader))
+    except ValueError:
+        pass
+    assert not cache.stale_loads
+
+
+def test_load_overlapping_a_write_is_served_but_not_kept():
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+
+    async def loader():
+        cache.invalidate(None, None)
+        return "rows"
+
+    assert run(cache.get_or_load("key", (None, None), loader)) == "rows"
+    assert not cache.entries
+
+
+def test_lru_eviction():
+    cache = QueryCache(ttl_seconds=60, max_entries=2)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await cache.get_or_load(key, (None, None), lambda: asyncio.sleep(0, key))
+
+    run(scenario())
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.evictions == 1
+
+
+def test_aware_windows_compare_with_stored_timestamps():
+    window = parse_window("2025-01-06T10:00:00+00:00", "2025-01-06T11:00:00Z")
+    assert window == (datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11))
+    cache = QueryCache(ttl_seconds=60, max_entries=10)
+    run(cache.get_or_load("key", window, lambda: asyncio.sleep(0, "rows")))
+    cache.invalidate(datetime(2025, 1, 6, 10, 30), datetime(2025, 1, 6, 10, 31))
+    assert not cache.entries
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from models import CallPayload
+from rollups import NULL_DTMF, aggregate, minute_bucket, rollup_window
+from storage import payload_to_row
+from tests.calls import make_call
+
+
+def row(index, **fields):
+    return payload_to_row(CallPayload.model_validate(make_call(index, **fields)), storage_time_ms=10)
+
+
+def test_rows_fold_into_minute_buckets():
+    buckets = aggregate([
+        row(0), row(1), row(2, DTMF_Capture=None),
+        row(3, timestamp="2025-01-06T10:01:05", Overall_Call_Status="Missed")
+    ])
+    assert buckets == {
+        (datetime(2025, 1, 6, 10, 0), "Renewals", "Answered", "INBOUND", 1) : [2, 0.0, 0, 20.0, 2, 242.0, 2],
+        (datetime(2025, 1, 6, 10, 0), "Renewals", "Answered", "INBOUND", NULL_DTMF) : [1, 0.0, 0, 10.0, 1, 122.5, 1],
+        (datetime(2025, 1, 6, 10, 1), "Renewals", "Missed", "INBOUND", 1) : [1, 0.0, 0, 10.0, 1, 123.5, 1]
+    }
+
+
+def test_buckets_follow_the_stored_second():
+    # MySQL stores 10:00:59.6 as 10:01:00
+    assert minute_bucket("2025-01-06T10:00:59.600000") == datetime(2025, 1, 6, 10, 1)
+    assert minute_bucket("2025-01-06T10:00:59.400000+02:00") == datetime(2025, 1, 6, 10, 0)
+    assert minute_bucket(b"2025-01-06T10:00:30") == datetime(2025, 1, 6, 10, 0)
+
+
+def test_unreadable_measures_are_skipped():
+    rows = [row(0), row(1)]
+    duration_index = 4
+    rows[0] = rows[0][:duration_index] + ("125.5",) + rows[0][duration_index + 1:]
+    rows[1] = rows[1][:duration_index] + ("n/a",) + rows[1][duration_index + 1:]
+    (measures,) = aggregate(rows).values()
+    assert measures[0] == 2
+    assert measures[5:] == [125.5, 1]
+
+
+def test_rollup_window_needs_whole_minutes():
+    assert rollup_window("2025-01-06 10:00:00", "2025-01-06 10:59:59") == (
+        datetime(2025, 1, 6, 10, 0), datetime(2025, 1, 6, 10, 59)
+    )
+    assert rollup_window("2025-01-06 10:00:30", None) is None
+    assert rollup_window(None, "2025-01-06 10:59:00") is None
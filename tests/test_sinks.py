@@ -0,0 +1,12 @@
+import time
+from email.utils import formatdate
+
+from sinks import parse_retry_after
+
+
+def test_retry_after_seconds_or_http_date():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after(None) == 1
+    assert parse_retry_after("soon") == 1
+    assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 31
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0
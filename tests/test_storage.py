@@ -0,0 +1,116 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from dedupe import DuplicateRecord
+from storage import CALL_RECORD_COLUMNS, CoalescingWriter
+
+
+class FakeCursor:
+    """Multi-row INSERTs get consecutive ids; any row holding "bad" fails its statement.
+
+    The duplicate lookup finds the keys in `db.stored`.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.lastrowid = None
+        self.result = []
+
+    async def execute(self, query, args=None):
+        if query.startswith("SELECT client_correlation_id"):
+            keys = list(zip(args[::2], args[1::2]))
+            self.result = [(*key, self.db.stored[key]) for key in keys if key in self.db.stored]
+            return
+        if not query.startswith("INSERT INTO call_records "):
+            return
+        self.db.inserts.append(query)
+        if "bad" in args:
+            raise ValueError("Incorrect value")
+        self.lastrowid = self.db.next_id
+        self.db.next_id += len(args) // len(CALL_RECORD_COLUMNS)
+
+    async def fetchall(self):
+        return self.result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    async def commit(self):
+        self.db.commits += 1
+
+    async def rollback(self):
+        self.db.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self):
+        self.next_id = 1
+        self.stored = {}
+        self.inserts = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+
+def row(name):
+    values = dict.fromkeys(CALL_RECORD_COLUMNS)
+    values.update(overall_call_status=name, client_correlation_id=f"corr-{name}", call_timestamp=datetime(2025, 1, 6, 10))
+    return tuple(values.values())
+
+
+def write_concurrently(rows, stored=()):
+    pool = FakePool()
+    pool.stored.update(stored)
+
+    async def scenario():
+        writer = CoalescingWriter(pool, window_ms=50, max_batch=len(rows))
+        try:
+            return await asyncio.gather(*(writer.write(item) for item in rows), return_exceptions=True)
+        finally:
+            await writer.close()
+
+    return pool, asyncio.run(scenario())
+
+
+def test_concurrent_writes_share_one_insert():
+    pool, results = write_concurrently([row("a"), row("b"), row("c")])
+    assert results == [1, 2, 3]
+    assert len(pool.inserts) == 1 and pool.commits == 1
+
+
+def test_failed_batch_falls_back_to_one_row_at_a_time():
+    pool, results = write_concurrently([row("a"), row("bad"), row("c")])
+    assert results[0] == 1 and results[2] == 2
+    assert isinstance(results[1], ValueError)
+    # The merged INSERT, then one per row
+    assert len(pool.inserts) == 4
+    assert pool.commits == 2 and pool.rollbacks == 2
+
+
+def test_stored_keys_come_back_as_duplicates():
+    stored = {("corr-b", datetime(2025, 1, 6, 10)) : 41}
+    pool, results = write_concurrently([row("a"), row("b"), row("a")], stored)
+    assert results[0] == 1
+    assert isinstance(results[1], DuplicateRecord) and results[1].record_id == 41
+    # The second "a" in the same batch is the first one's duplicate
+    assert isinstance(results[2], DuplicateRecord) and results[2].record_id == 1
+    assert len(pool.inserts) == 1
+
+    # Committed keys are answered from recent_keys next time, without a lookup
+    _, results = write_concurrently([row("a")])
+    assert isinstance(results[0], DuplicateRecord) and results[0].record_id == 1
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from summary import build_summary
+
+
+def group(campaign, dtmf, status, call_type, total, processing=(None, 0), storage=(None, 0)):
+    # Shaped like a GROUPED_SUMMARY_QUERY row; MySQL returns the SUMs as Decimal
+    return {
+        "campaign_name" : campaign, "dtmf_capture" : dtmf, "overall_call_status" : status, "call_type" : call_type,
+        "total" : total,
+        "processing_sum" : processing[0], "processing_count" : processing[1],
+        "storage_sum" : storage[0], "storage_count" : storage[1]
+    }
+
+
+def test_groups_fold_into_every_section():
+    summary = build_summary([
+        group("Renewals", 1, "Answered", "INBOUND", 6, storage=(Decimal("60"), 6)),
+        group("Renewals", 0, "Missed", "INBOUND", 2),
+        group("Sales", 1, "Answered", "OUTBOUND", 2, processing=(Decimal("30"), 2), storage=(Decimal("40"), 2)),
+    ])
+
+    assert summary["total_calls"] == 10
+    assert summary["by_campaign"] == [
+        {"campaign_name" : "Renewals", "total" : 8, "answered" : 6, "missed" : 2, "connected" : 0},
+        {"campaign_name" : "Sales", "total" : 2, "answered" : 2, "missed" : 0, "connected" : 0}
+    ]
+    assert summary["by_dtmf"] == [
+        {"dtmf_value" : 1, "total" : 8, "answered" : 8, "missed" : 0, "connected" : 0},
+        {"dtmf_value" : 0, "total" : 2, "answered" : 0, "missed" : 2, "connected" : 0}
+    ]
+    assert summary["by_call_status"] == [
+        {"status" : "Answered", "count" : 8, "percentage" : 80.0},
+        {"status" : "Missed", "count" : 2, "percentage" : 20.0}
+    ]
+    assert summary["by_call_type"] == [{"type" : "INBOUND", "count" : 8}, {"type" : "OUTBOUND", "count" : 2}]
+    # Averages are over the non-NULL values only
+    assert summary["performance_metrics"]["avg_processing_time_ms"] == 15
+    assert summary["performance_metrics"]["avg_storage_time_ms"] == 12.5
+
+
+def test_empty_range():
+    summary = build_summary([])
+    assert summary["total_calls"] == 0
+    assert summary["by_call_status"] == []
+    assert summary["performance_metrics"]["avg_storage_time_ms"] == 0
@@ -0,0 +1,54 @@
+import random
+from decimal import Decimal
+
+from sketch import RELATIVE_ACCURACY, bin_index, quantiles
+from timeseries import build_series, bucket_count
+
+
+def test_bucket_count():
+    assert bucket_count("minute", "2025-01-06T10:00:00", "2025-01-06T10:59:59") == 60
+    assert bucket_count("hour", "2025-01-06T00:00:00", "2025-01-07T00:00:00") == 25
+    assert bucket_count("day", "2025-01-06T00:00:00+00:00", "2025-01-08T00:00:00") == 3
+    assert bucket_count("minute", None, "2025-01-06T10:00:00") is None
+    assert bucket_count("minute", "yesterday", "2025-01-06T10:00:00") is None
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(5000)]
+    bins = {}
+    for value in values:
+        bins[bin_index(value)] = bins.get(bin_index(value), 0) + 1
+    ordered = sorted(values)
+    for q, estimate in zip((0.5, 0.9, 0.99), quantiles(bins, (0.5, 0.9, 0.99), max(values))):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(estimate - exact) <= exact * RELATIVE_ACCURACY + 0.001
+    assert quantiles({}, (0.5,)) == [0]
+
+
+def row(bucket_start, latency_bin, total, answered, latency_max):
+    # Shaped like a TIMESERIES_QUERY row; MySQL returns the SUMs as Decimal
+    return {
+        "bucket_start" : bucket_start, "latency_bin" : latency_bin, "total" : total,
+        "overall_call_status:Answered" : Decimal(answered), "overall_call_status:Missed" : Decimal(total - answered),
+        "overall_call_status:Connected" : None, "call_type:INBOUND" : Decimal(total), "call_type:OUTBOUND" : None,
+        "processing_sum" : None, "processing_count" : 0,
+        "storage_sum" : Decimal(10 * total), "storage_count" : total,
+        "latency_max" : latency_max
+    }
+
+
+def test_bins_fold_into_one_point_per_bucket():
+    series = build_series([
+        row("2025-01-06 10:00", bin_index(10), 3, 3, 10.0),
+        row("2025-01-06 10:00", bin_index(50), 1, 0, 50.0),
+        row("2025-01-06 10:01", None, 2, 1, None)
+    ])
+    assert [point["bucket_start"] for point in series] == ["2025-01-06 10:00", "2025-01-06 10:01"]
+    first, second = series
+    assert first["total"] == 4 and first["by_status"] == {"Answered" : 3, "Missed" : 1, "Connected" : 0}
+    assert first["answer_rate"] == 75.0
+    assert first["latency"]["avg_storage_time_ms"] == 10
+    assert abs(first["latency"]["p50"] - 10) <= 10 * RELATIVE_ACCURACY
+    assert first["latency"]["max"] == 50.0
+    assert second["latency"]["p99"] == 0 and second["answer_rate"] == 50.0
@@ -0,0 +1,59 @@
+import pytest
+
+import timings
+from models import CallPayload
+from storage import payload_to_row
+from tests.calls import make_call
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = {"now" : 5000}
+    monkeypatch.setattr(timings, "now_ms", lambda after=None: max(clock["now"], after or 0))
+    return clock
+
+
+def row(**stamps):
+    return payload_to_row(CallPayload.model_validate(make_call()), **stamps)
+
+
+def test_stamp_insert_derives_the_lag_and_storage_time(clock):
+    stamped, = timings.stamp_insert([row(storage_time_ms=None, received_at_ms=1000, published_at_ms=1200, consumed_at_ms=3000)])
+    assert stamped[timings.INSERT_INDEX] == 5000
+    assert stamped[timings.LAG_INDEX] == 4000
+    assert stamped[timings.STORAGE_INDEX] == 2000
+
+
+def test_stamp_insert_keeps_a_storage_time_already_set(clock):
+    stamped, = timings.stamp_insert([row(storage_time_ms=12.5)])
+    assert stamped[timings.STORAGE_INDEX] == 12.5
+    # No received stamp, no lag
+    assert stamped[timings.LAG_INDEX] is None
+
+
+def test_insert_stamp_never_goes_backwards(clock):
+    # A consumer whose clock runs ahead: the insert stage is 0 ms, not negative
+    stamped, = timings.stamp_insert([row(storage_time_ms=None, received_at_ms=1000, consumed_at_ms=9000)])
+    assert stamped[timings.INSERT_INDEX] == 9000
+    assert stamped[timings.STORAGE_INDEX] == 0
+
+
+def test_received_list_reads_per_record_and_shared_stamps():
+    assert timings.received_list({timings.RECEIVED_HEADER : [1, None, 3]}, 3) == [1, None, 3]
+    assert timings.received_list({timings.RECEIVED_HEADER : "7"}, 2) == [7, 7]
+    assert timings.received_list({timings.RECEIVED_HEADER : "garbage"}, 1) == [None]
+
+
+def test_lag_report_folds_bins_per_campaign_and_stage():
+    rows = [
+        {"stage" : "store", "campaign_name" : "A", "bucket_start" : "2026-10-17 10:00", "lag_bin" : 10, "calls" : 3, "lag_max" : 12.0},
+        {"stage" : "store", "campaign_name" : "A", "bucket_start" : "2026-10-17 10:00", "lag_bin" : 20, "calls" : 1, "lag_max" : 90.0},
+        {"stage" : "ingest_to_insert", "campaign_name" : "A", "bucket_start" : "2026-10-17 10:00", "lag_bin" : 20, "calls" : 4, "lag_max" : 95.0},
+    ]
+    campaign, = timings.build_lag_report(rows)
+    assert campaign["campaign_name"] == "A"
+    point, = campaign["series"]
+    assert set(point["stages"]) == {"store", "ingest_to_insert"}
+    store = point["stages"]["store"]
+    assert (store["calls"], store["max_ms"]) == (4, 90.0)
+    assert store["p50_ms"] <= store["p99_ms"] <= store["max_ms"]
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime
+
+from tailing import IdTail
+from watermark import WatermarkFollower
+
+
+class FakeCursor:
+    """Answers the follower's polls from `visible`, the watermark rows committed so far."""
+
+    def __init__(self):
+        self.visible = {}
+        self.result = None
+
+    async def execute(self, query, params=()):
+        if "MAX(id)" in query:
+            self.result = [(max(self.visible, default=0),)]
+        elif query.startswith("SELECT id"):
+            last_id, *gaps = params
+            self.result = [(entry_id, *self.visible[entry_id]) for entry_id in sorted(self.visible)
+                           if entry_id > last_id or entry_id in gaps]
+
+    async def fetchone(self):
+        return self.result[0]
+
+    async def fetchall(self):
+        return self.result
+
+
+def window(minute):
+    return datetime(2025, 1, 6, 10, minute), datetime(2025, 1, 6, 10, minute, 59)
+
+
+def test_ids_committed_late_are_still_followed():
+    cursor = FakeCursor()
+    advanced = []
+    follower = WatermarkFollower(None, lambda min_ts, max_ts: advanced.append(min_ts.minute))
+
+    async def scenario():
+        cursor.visible[1] = window(1)
+        await follower.poll_once(cursor)
+        # Id 3 commits before id 2
+        cursor.visible[3] = window(3)
+        await follower.poll_once(cursor)
+        cursor.visible[2] = window(2)
+        await follower.poll_once(cursor)
+        await follower.poll_once(cursor)
+
+    asyncio.run(scenario())
+    assert advanced == [3, 2]
+    assert follower.tail.last_id == 3 and not follower.tail.gaps
+
+
+def test_gaps_expire():
+    tail = IdTail(10, gap_timeout=0)
+    tail.seen([11, 14])
+    assert sorted(tail.gaps) == [12, 13]
+    # A rolled-back insert never shows up: after gap_timeout it is no longer asked for
+    assert tail.condition() == ("id > %s", [14])
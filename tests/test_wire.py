@@ -0,0 +1,52 @@
+import pytest
+
+import wire
+import timings
+from models import CallPayload, CALL_RECORD_COLUMNS, stored_datetime
+from storage import payload_to_row
+from tests.calls import make_call
+
+TIMESTAMP = 11
+
+
+def payloads(count):
+    return [CallPayload.model_validate(make_call(index)) for index in range(count)]
+
+
+@pytest.mark.parametrize("fmt", wire.FORMATS)
+@pytest.mark.parametrize("count", [1, 3])
+def test_encode_decode_round_trip(fmt, count):
+    calls = payloads(count)
+    body, content_type, headers = wire.encode(calls, fmt)
+    assert headers.get(wire.RECORD_COUNT_HEADER) == (count if count > 1 else None)
+
+    rows = wire.decode(body, content_type, headers)
+    assert len(rows) == count
+    for call, row in zip(calls, rows):
+        expected = payload_to_row(call, None)
+        assert row[:TIMESTAMP] + row[TIMESTAMP + 1:] == expected[:TIMESTAMP] + expected[TIMESTAMP + 1:]
+        # JSON rows carry a datetime, msgpack rows the text MySQL parses
+        assert stored_datetime(row[TIMESTAMP]) == call.timestamp
+
+
+def test_decode_carries_stage_stamps():
+    body, content_type, headers = wire.encode(payloads(2), "json")
+    headers[timings.RECEIVED_HEADER] = [1000, None]
+    headers[timings.PUBLISHED_HEADER] = 2000
+
+    # Consumed is clamped to never come before published
+    rows = wire.decode(body, content_type, headers, consumed_at_ms=1500)
+    assert [row[timings.RECEIVED_INDEX] for row in rows] == [1000, None]
+    assert all(row[CALL_RECORD_COLUMNS.index("published_at_ms")] == 2000 for row in rows)
+    assert all(row[timings.CONSUMED_INDEX] == 2000 for row in rows)
+    assert all(row[timings.STORAGE_INDEX] is None for row in rows)
+
+
+def test_unknown_row_schema_is_rejected():
+    with pytest.raises(ValueError):
+        wire.decode(b"", wire.MSGPACK_CONTENT_TYPE, {wire.SCHEMA_HEADER : "call-row.v0"})
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        wire.check_format("protobuf")
@@ -0,0 +1,211 @@
+import asyncio
+import pytest
+import pymysql
+from pamqp.commands import Basic
+from contextlib import asynccontextmanager
+
+import worker
+
+
+class FakeMessage:
+    def __init__(self, tag, body=b"", content_type="application/json", headers=None):
+        self.tag = tag
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.settled = None
+
+    async def ack(self, multiple=False):
+        self.settled = ("ack", multiple)
+
+    async def nack(self, multiple=False, requeue=True):
+        self.settled = ("nack", multiple)
+
+    async def reject(self, requeue=False):
+        self.settled = ("reject", requeue)
+
+
+class FakeExchange:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        if self.fail:
+            raise ConnectionError("channel closed")
+        self.published.append((routing_key, message))
+        return Basic.Ack(delivery_tag=len(self.published))
+
+
+class FakeChannel:
+    def __init__(self, fail=False):
+        self.default_exchange = FakeExchange(fail)
+
+
+class FakeConnection:
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    @asynccontextmanager
+    async def cursor(self):
+        yield None
+
+
+class FakePool:
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection()
+
+
+def test_settle_covers_the_batch_with_one_multiple_ack():
+    messages = [FakeMessage(tag) for tag in range(3)]
+    asyncio.run(worker.settle(messages, ack=True))
+    assert [message.settled for message in messages] == [None, None, ("ack", True)]
+    asyncio.run(worker.settle(messages, ack=False))
+    assert messages[-1].settled == ("nack", True)
+
+
+class FakeWriter:
+    """Stands in for write_records: fails a whole batch holding any record in `bad`."""
+
+    def __init__(self, bad=(), error=None):
+        self.bad = set(bad)
+        self.error = error
+        self.batches = []
+        self.stored = []
+
+    async def __call__(self, pool, records):
+        self.batches.append(list(records))
+        if self.error is not None:
+            raise self.error
+        bad = [record for record in records if record in self.bad]
+        if bad:
+            raise pymysql.err.DataError(1366, f"Incorrect value for record {bad[0]}")
+        self.stored.extend(records)
+        return 0
+
+
+def flush(monkeypatch, writer, records):
+    monkeypatch.setattr(worker, "write_records", writer)
+    return asyncio.run(worker.flush_buffer(None, records))
+
+
+def test_clean_batch_is_one_write(monkeypatch):
+    writer = FakeWriter()
+    assert flush(monkeypatch, writer, list(range(8))) == ([], 0)
+    assert writer.batches == [list(range(8))]
+
+
+def test_bisection_isolates_only_the_bad_records(monkeypatch):
+    writer = FakeWriter(bad={3, 12})
+    failures, duplicates = flush(monkeypatch, writer, list(range(16)))
+    assert [record for record, _ in failures] == [3, 12]
+    assert all(isinstance(error, pymysql.err.DataError) for _, error in failures)
+    assert duplicates == 0
+    assert sorted(writer.stored) == [record for record in range(16) if record not in (3, 12)]
+    # Far fewer writes than one per record
+    assert len(writer.batches) < 16
+
+
+@pytest.mark.parametrize("error", [
+    pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query"),
+    pymysql.err.OperationalError(1205, "Lock wait timeout exceeded"),
+    pymysql.err.IntegrityError(1062, "Duplicate entry 'x' for key 'ux_call_records_correlation'")
+])
+def test_non_data_errors_are_raised_without_bisecting(monkeypatch, error):
+    writer = FakeWriter(error=error)
+    with pytest.raises(type(error)):
+        flush(monkeypatch, writer, list(range(8)))
+    assert len(writer.batches) == 1
+
+
+def test_is_data_error():
+    assert worker.is_data_error(pymysql.err.DataError(1406, "Data too long"))
+    assert worker.is_data_error(pymysql.err.IntegrityError(1048, "Column cannot be null"))
+    assert not worker.is_data_error(pymysql.err.IntegrityError(1062, "Duplicate entry"))
+    assert not worker.is_data_error(pymysql.err.OperationalError(2006, "MySQL server has gone away"))
+
+
+def test_rejected_records_are_dead_lettered(monkeypatch):
+    async def flush_buffer(pool, records):
+        return [(records[1], pymysql.err.DataError(1406, "Data too long"))], 0
+
+    dead = []
+
+    async def publish_dead_letters(channel, failures):
+        dead.extend(failures)
+
+    monkeypatch.setattr(worker, "flush_buffer", flush_buffer)
+    monkeypatch.setattr(worker, "publish_dead_letters", publish_dead_letters)
+    message = FakeMessage(0)
+
+    async def scenario():
+        consumer = worker.Consumer("test", FakePool(), FakeChannel())
+        consumer.buffer.extend(["a", "b"])
+        consumer.pending_messages.append(message)
+        await consumer.drain()
+
+    asyncio.run(scenario())
+    assert [record for record, _ in dead] == ["b"]
+    assert message.settled == ("ack", True)
+
+
+@pytest.mark.parametrize("dlq_fails", [False, True])
+def test_undecodable_message_goes_to_the_dlq(dlq_fails):
+    channel = FakeChannel(fail=dlq_fails)
+    message = FakeMessage(0, body=b"{not json", headers={"x-record-count" : 2})
+
+    async def scenario():
+        consumer = worker.Consumer("test", FakePool(), channel)
+        await consumer.process_message(message)
+        return consumer
+
+    consumer = asyncio.run(scenario())
+    assert not consumer.buffer and not consumer.pending_messages
+    if dlq_fails:
+        assert message.settled == ("reject", False)
+        return
+    (routing_key, dead_letter), = channel.default_exchange.published
+    assert routing_key == worker.DLQ_NAME
+    assert dead_letter.body == b"{not json"
+    assert dead_letter.headers["x-error-type"] == "JSONDecodeError"
+    assert dead_letter.headers["x-record-count"] == 2
+    assert message.settled == ("ack", False)
+
+
+def test_batches_settle_in_order(monkeypatch):
+    """A later batch that commits first still waits for the earlier one to settle."""
+    releases = {}
+    settled = []
+
+    async def flush_buffer(pool, records):
+        releases[records[0]] = asyncio.Event()
+        await releases[records[0]].wait()
+        if records[0] == "bad":
+            raise ConnectionError("lost connection")
+        return [], 0
+
+    async def settle(messages, ack):
+        settled.append((messages[-1].tag, ack))
+
+    monkeypatch.setattr(worker, "flush_buffer", flush_buffer)
+    monkeypatch.setattr(worker, "settle", settle)
+
+    async def scenario():
+        consumer = worker.Consumer("test", FakePool(), FakeChannel())
+        for tag, record in enumerate(["bad", "good"]):
+            consumer.buffer.append(record)
+            consumer.pending_messages.append(FakeMessage(tag))
+            consumer.start_flush()
+        await asyncio.sleep(0)
+        releases["good"].set()
+        await asyncio.sleep(0.01)
+        assert settled == []
+        releases["bad"].set()
+        await consumer.drain()
+
+    asyncio.run(scenario())
+    assert settled == [(0, False), (1, True)]
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from summary import STATUSES
+from sketch import sql_bin_expression, quantiles
+
+CALL_TYPES = ("INBOUND", "OUTBOUND")
+PERCENTILES = (0.5, 0.9, 0.99)
+
+BUCKET_FORMATS = {
+    "minute" : "%%Y-%%m-%%d %%H:%%i:00",
+    "hour" : "%%Y-%%m-%%d %%H:00:00",
+    "day" : "%%Y-%%m-%%d 00:00:00"
+}
+BUCKET_SIZES = {"minute" : timedelta(minutes=1), "hour" : timedelta(hours=1), "day" : timedelta(days=1)}
+# Upper bound on buckets per response when both dates are given
+MAX_BUCKETS = 2000
+
+LATENCY_METRICS = {"storage" : "storage_time_ms", "processing" : "processing_time_ms"}
+
+# One grouped scan per chart: (bucket, latency bin) rows. Statuses and call types are
+# closed sets, so they are counted with conditional sums instead of extra group columns;
+# the latency bins of a bucket form a mergeable histogram for its percentiles.
+TIMESERIES_QUERY = """
+    SELECT DATE_FORMAT(call_timestamp, '{bucket_format}') AS bucket_start,
+        {bin_expression} AS latency_bin,
+        COUNT(*) AS total,
+        {status_counts},
+        {type_counts},
+        SUM(processing_time_ms) AS processing_sum, COUNT(processing_time_ms) AS processing_count,
+        SUM(storage_time_ms) AS storage_sum, COUNT(storage_time_ms) AS storage_count,
+        MAX({latency_column}) AS latency_max
+    FROM call_records {where_sql}
+    GROUP BY bucket_start, latency_bin
+    ORDER BY bucket_start
+"""
+
+
+def count_column(column, value):
+    return f"SUM({column} = '{value}') AS `{column}:{value}`"
+
+
+def build_timeseries_query(bucket, metric, where_sql):
+    latency_column = LATENCY_METRICS[metric]
+    return TIMESERIES_QUERY.format(
+        bucket_format=BUCKET_FORMATS[bucket],
+        bin_expression=sql_bin_expression(latency_column),
+        status_counts=", ".join(count_column("overall_call_status", status) for status in STATUSES),
+        type_counts=", ".join(count_column("call_type", call_type) for call_type in CALL_TYPES),
+        latency_column=latency_column,
+        where_sql=where_sql
+    )
+
+
+def bucket_count(bucket, date_from, date_to):
+    # None when the range is open or unparseable (the query is still bounded by the data)
+    try :
+        start = datetime.fromisoformat(date_from).replace(tzinfo=None)
+        end = datetime.fromisoformat(date_to).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+    return (end - start) // BUCKET_SIZES[bucket] + 1
+
+
+def build_series(rows):
+    """Folds (bucket, latency bin) rows into one point per bucket, in time order."""
+    points = {}
+    for row in rows:
+        point = points.get(row["bucket_start"])
+        if point is None:
+            point = points[row["bucket_start"]] = {
+                "total" : 0,
+                "by_status" : dict.fromkeys(STATUSES, 0),
+                "by_call_type" : dict.fromkeys(CALL_TYPES, 0),
+                "processing_sum" : 0, "processing_count" : 0,
+                "storage_sum" : 0, "storage_count" : 0,
+                "bins" : {}, "max" : None
+            }
+        point["total"] += int(row["total"])
+        for status in STATUSES:
+            point["by_status"][status] += int(row[f"overall_call_status:{status}"] or 0)
+        for call_type in CALL_TYPES:
+            point["by_call_type"][call_type] += int(row[f"call_type:{call_type}"] or 0)
+        for name in ("processing", "storage"):
+            point[f"{name}_sum"] += row[f"{name}_sum"] or 0
+            point[f"{name}_count"] += int(row[f"{name}_count"] or 0)
+        if row["latency_bin"] is not None:
+            point["bins"][int(row["latency_bin"])] = int(row["total"])
+            latency_max = float(row["latency_max"])
+            point["max"] = latency_max if point["max"] is None else max(point["max"], latency_max)
+
+    series = []
+    for bucket_start, point in points.items():
+        total = point["total"]
+        p50, p90, p99 = quantiles(point["bins"], PERCENTILES, point["max"])
+        series.append({
+            "bucket_start" : bucket_start,
+            "total" : total,
+            "by_status" : point["by_status"],
+            "by_call_type" : point["by_call_type"],
+            "answer_rate" : round(point["by_status"]["Answered"] / total * 100, 2) if total else 0,
+            "latency" : {
+                "avg_processing_time_ms" : round(point["processing_sum"] / point["processing_count"], 2) if point["processing_count"] else 0,
+                "avg_storage_time_ms" : round(point["storage_sum"] / point["storage_count"], 2) if point["storage_count"] else 0,
+                "p50" : p50,
+                "p90" : p90,
+                "p99" : p99,
+                "max" : round(point["max"], 3) if point["max"] is not None else 0
+            }
+        })
+    return series
@@ -0,0 +1,153 @@
+import time
+from sketch import sql_bin_expression, quantiles
+from timeseries import BUCKET_FORMATS, PERCENTILES
+from models import CALL_RECORD_COLUMNS
+
+# Per-call pipeline stamps, stored in call_records (see models.CallRecord):
+#
+#   received_at_ms   API-1 (or whichever API took the call first) read the request
+#   published_at_ms  the message holding the call was handed to RabbitMQ (queue mode)
+#   consumed_at_ms   the storing service took the call: the worker decoded its message,
+#                    or API-2 / API-1's mysql sink started handling the request
+#   insert_at_ms     the writer issued the INSERT, in the transaction that commits the
+#                    row. The commit comes after it, and a row cannot record that time.
+#
+# Derived when the row is written:
+#
+#   ingest_lag_ms    insert_at_ms - received_at_ms
+#   storage_time_ms  insert_at_ms - consumed_at_ms, when the writer left it unset:
+#                    reading, validation, pool and batching waits up to the INSERT.
+#                    The INSERT and commit themselves are only in db_insert_seconds
+#                    and API-2's response.
+#
+# They are wall-clock epoch milliseconds, because they are compared across processes
+# and hosts, where a monotonic clock means nothing. Each stamp is clamped to be no
+# earlier than the one before it, so the stages stay monotonic per call and clock skew
+# between hosts shows up as a 0 ms stage instead of a negative one.
+#
+# The received stamp travels API-1 -> API-2 / api-2_mq as an HTTP header, and on into
+# the worker as an AMQP header next to the published stamp (a list with one value per
+# record for batched messages), plus the message's own timestamp property.
+
+RECEIVED_HEADER = "x-received-at-ms"
+PUBLISHED_HEADER = "x-published-at-ms"
+
+# The columns from storage_time_ms on are measured by the pipeline, not sent by the client
+TAIL_START = CALL_RECORD_COLUMNS.index("storage_time_ms")
+STORAGE_INDEX = TAIL_START
+RECEIVED_INDEX = CALL_RECORD_COLUMNS.index("received_at_ms")
+CONSUMED_INDEX = CALL_RECORD_COLUMNS.index("consumed_at_ms")
+INSERT_INDEX = CALL_RECORD_COLUMNS.index("insert_at_ms")
+LAG_INDEX = CALL_RECORD_COLUMNS.index("ingest_lag_ms")
+
+
+def now_ms(after=None):
+    # Never earlier than `after`, the previous stage's stamp
+    now = time.time_ns() // 1_000_000
+    return now if after is None else max(now, after)
+
+
+def header_ms(headers, name=RECEIVED_HEADER):
+    # Stamp from an HTTP or AMQP header; None when missing or unreadable
+    value = headers.get(name) if headers else None
+    try :
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def received_at(headers):
+    # An upstream service's received stamp, else this service is where the call came in
+    return header_ms(headers) or now_ms()
+
+
+def received_list(headers, count):
+    """One received stamp per record of an AMQP message (None where unknown)."""
+    value = headers.get(RECEIVED_HEADER) if headers else None
+    if isinstance(value, (list, tuple)) and len(value) == count:
+        return [int(stamp) if stamp else None for stamp in value]
+    stamp = header_ms(headers)
+    return [stamp] * count
+
+
+def row_tail(storage_time_ms=None, received_at_ms=None, published_at_ms=None, consumed_at_ms=None):
+    # storage_time_ms .. ingest_lag_ms; insert_at_ms and the lag are set by stamp_insert
+    return (storage_time_ms, received_at_ms, published_at_ms, consumed_at_ms, None, None)
+
+
+def stamp_insert(rows):
+    """Sets insert_at_ms on rows about to be written, and the latencies derived from it."""
+    stamped = []
+    for row in rows:
+        row = list(row)
+        received, consumed = row[RECEIVED_INDEX], row[CONSUMED_INDEX]
+        inserted = now_ms(max((stamp for stamp in row[RECEIVED_INDEX:INSERT_INDEX] if stamp is not None), default=None))
+        row[INSERT_INDEX] = inserted
+        if received is not None:
+            row[LAG_INDEX] = inserted - received
+        if row[STORAGE_INDEX] is None and consumed is not None:
+            row[STORAGE_INDEX] = inserted - consumed
+        stamped.append(tuple(row))
+    return stamped
+
+
+# Lag report (API-3 /api/monitor/lag): one histogram per stage, campaign and time
+# bucket, in one scan of the call_timestamp range. Stages of calls that skipped them
+# (no queue in between) are NULL and land in no bin.
+STAGES = {
+    "ingest_to_insert" : "ingest_lag_ms",
+    "publish" : "published_at_ms - received_at_ms",
+    "queue_wait" : "consumed_at_ms - published_at_ms",
+    "store" : "insert_at_ms - consumed_at_ms"
+}
+
+STAGE_QUERY = """
+    SELECT '{stage}' AS stage, campaign_name,
+        DATE_FORMAT(call_timestamp, '{bucket_format}') AS bucket_start,
+        {bin_expression} AS lag_bin,
+        COUNT(*) AS calls, MAX({lag}) AS lag_max
+    FROM call_records {where_sql}{conjunction} {lag} IS NOT NULL
+    GROUP BY campaign_name, bucket_start, lag_bin
+"""
+
+
+def build_lag_query(bucket, stages, where_sql):
+    # The WHERE parameters repeat once per stage
+    conjunction = " AND" if where_sql else " WHERE"
+    return " UNION ALL ".join(
+        STAGE_QUERY.format(
+            stage=stage,
+            bucket_format=BUCKET_FORMATS[bucket],
+            bin_expression=sql_bin_expression(STAGES[stage]),
+            lag=STAGES[stage],
+            where_sql=where_sql,
+            conjunction=conjunction
+        )
+        for stage in stages
+    )
+
+
+def build_lag_report(rows):
+    """Folds (stage, campaign, bucket, bin) rows into per-campaign series of lag percentiles."""
+    groups = {}
+    for row in rows:
+        key = (row["campaign_name"], row["bucket_start"], row["stage"])
+        bins, maximum = groups.get(key, ({}, 0))
+        index = int(row["lag_bin"])
+        bins[index] = bins.get(index, 0) + int(row["calls"])
+        groups[key] = (bins, max(maximum, float(row["lag_max"])))
+
+    campaigns = {}
+    for (campaign, bucket_start, stage), (bins, maximum) in sorted(groups.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        series = campaigns.setdefault(campaign, {})
+        point = series.setdefault(bucket_start, {"bucket_start" : bucket_start, "stages" : {}})
+        estimates = quantiles(bins, PERCENTILES, maximum)
+        point["stages"][stage] = {
+            "calls" : sum(bins.values()),
+            **{f"p{int(q * 100)}_ms" : round(estimate, 2) for q, estimate in zip(PERCENTILES, estimates)},
+            "max_ms" : round(maximum, 2)
+        }
+    return [
+        {"campaign_name" : campaign, "series" : list(series.values())}
+        for campaign, series in campaigns.items()
+    ]
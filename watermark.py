@@ -0,0 +1,66 @@
+import os
+import logging
+import derived
+from models import CALL_RECORD_COLUMNS, IngestWatermark, stored_datetime
+from tailing import IdTail, Poller
+
+# Ingest watermark: every write transaction appends the call_timestamp range it
+# committed to `ingest_watermarks`. Readers (API-3's result cache) follow that log
+# and drop cached results for windows that are still being written.
+WATERMARK_ENABLED = os.getenv("WATERMARK_ENABLED", "0") == "1"
+WATERMARK_TABLE = IngestWatermark.__tablename__
+# How long the log is kept; readers only ever need the last few seconds of it
+RETENTION_MINUTES = 60
+
+logger = logging.getLogger("Watermark")
+
+TIMESTAMP_INDEX = CALL_RECORD_COLUMNS.index("call_timestamp")
+
+
+async def advance(cur, rows):
+    timestamps = [stored_datetime(row[TIMESTAMP_INDEX]) for row in rows if row[TIMESTAMP_INDEX] is not None]
+    if not timestamps:
+        return
+    await cur.execute(
+        f"INSERT INTO {WATERMARK_TABLE} (min_call_timestamp, max_call_timestamp) VALUES (%s, %s)",
+        (min(timestamps), max(timestamps))
+    )
+
+
+async def create_table(cur):
+    await cur.execute(derived.create_table_ddl(IngestWatermark.__table__))
+
+
+class WatermarkFollower(Poller):
+    """Polls the watermark log and calls `on_advance(min_ts, max_ts)` for every new entry."""
+
+    def __init__(self, pool, on_advance, interval=0.5):
+        super().__init__(pool, interval, logger, "Watermark")
+        self.on_advance = on_advance
+        self.tail = None
+        self.polls = 0
+
+    async def poll_once(self, cur):
+        if self.tail is None:
+            # Start from "now": older writes are already reflected in anything we load
+            await cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {WATERMARK_TABLE}")
+            self.tail = IdTail((await cur.fetchone())[0])
+            return
+        condition, params = self.tail.condition()
+        await cur.execute(
+            f"SELECT id, min_call_timestamp, max_call_timestamp FROM {WATERMARK_TABLE} "
+            f"WHERE {condition} ORDER BY id LIMIT 10000",
+            params
+        )
+        entries = await cur.fetchall()
+        for _, min_ts, max_ts in entries:
+            self.on_advance(min_ts, max_ts)
+        self.tail.seen([entry_id for entry_id, _, _ in entries])
+        self.polls += 1
+        if self.polls % 120 == 0:
+            await self.prune(cur)
+
+    async def prune(self, cur):
+        await cur.execute(
+            f"DELETE FROM {WATERMARK_TABLE} WHERE committed_at < NOW() - INTERVAL {RETENTION_MINUTES} MINUTE LIMIT 10000"
+        )
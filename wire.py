@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timezone
+from storage import payload_to_row
+from models import Participant
+import timings
+
+try :
+    import msgpack
+except ImportError:  # optional: without it everything stays on JSON
+    msgpack = None
+
+# Message formats between api-2_mq (and API-1's mq sink) and the worker.
+# The publisher marks every message with its content type; the worker picks the
+# decoder from it, so old JSON messages keep working next to the binary ones.
+#
+#   application/json     -> one CallPayload object, or a JSON array of them
+#   application/x-msgpack + x-schema: call-row.v1
+#                        -> msgpack array of rows, each row already in
+#                           storage.CALL_RECORD_COLUMNS order up to session_id,
+#                           participants as a ready-to-insert JSON string
+#
+# Stage stamps (timings.py) travel in the headers, never in the body.
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/x-msgpack"
+SCHEMA_HEADER = "x-schema"
+ROW_SCHEMA = "call-row.v1"
+# Header carried by messages that pack several call records into one body
+RECORD_COUNT_HEADER = "x-record-count"
+
+FORMATS = ("json", "msgpack")
+# Raw bodies may carry extra participant fields; store what Participant.model_dump would
+PARTICIPANT_KEYS = tuple(Participant.model_fields)
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown wire format '{fmt}', expected one of {FORMATS}")
+    if fmt == "msgpack" and msgpack is None:
+        raise ValueError("Wire format 'msgpack' needs the msgpack package (pip install msgpack)")
+    return fmt
+
+
+def encode(payloads, fmt="json"):
+    """Returns (body, content_type, headers) for one AMQP message holding `payloads`."""
+    headers = {RECORD_COUNT_HEADER : len(payloads)} if len(payloads) > 1 else {}
+    if fmt == "msgpack":
+        rows = []
+        for payload in payloads:
+            row = list(payload_to_row(payload)[:timings.TAIL_START])
+            row[11] = row[11].isoformat(sep=" ")  # call_timestamp
+            rows.append(row)
+        headers[SCHEMA_HEADER] = ROW_SCHEMA
+        return msgpack.packb(rows, use_bin_type=True), MSGPACK_CONTENT_TYPE, headers
+    if len(payloads) == 1:
+        return payloads[0].model_dump_json().encode(), JSON_CONTENT_TYPE, headers
+    return b"[" + b",".join(payload.model_dump_json().encode() for payload in payloads) + b"]", JSON_CONTENT_TYPE, headers
+
+
+def parse_timestamp(value):
+    # Trusted bodies carry CallPayload's ISO 8601 dump (see ingest.py); Unix seconds /
+    # milliseconds are read the way CallPayload reads them
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000 if abs(value) > 2e10 else value, timezone.utc)
+    return value
+
+
+def json_payload_to_row(payload, storage_time_ms=0, received_at_ms=None, published_at_ms=None, consumed_at_ms=None):
+    return (
+            payload['Overall_Call_Status'],
+            payload['Customer_Name'],
+            payload['Client_Correlation_Id'],
+            payload['callType'],
+            payload['conversationDuration'],
+            payload['Overall_Call_Duration'],
+            payload['Campaign_Id'],
+            payload['Campaign_Name'],
+            payload['Caller_ID'],
+            payload.get('DTMF_Capture'),
+            json.dumps([{key : participant.get(key) for key in PARTICIPANT_KEYS} for participant in payload['participants']]),
+            parse_timestamp(payload['timestamp']),
+            payload['Session_ID'],
+            *timings.row_tail(storage_time_ms, received_at_ms, published_at_ms, consumed_at_ms)
+        )
+
+
+def decode(body, content_type=None, headers=None, consumed_at_ms=None):
+    """Turns a message body into insert-ready rows (storage.CALL_RECORD_COLUMNS order).
+
+    storage_time_ms is left unset: the writer fills it in with timings.stamp_insert.
+    """
+    published = timings.header_ms(headers, timings.PUBLISHED_HEADER)
+    if consumed_at_ms is not None:
+        consumed_at_ms = max(consumed_at_ms, published or 0)
+    if content_type == MSGPACK_CONTENT_TYPE:
+        schema = (headers or {}).get(SCHEMA_HEADER)
+        if schema != ROW_SCHEMA:
+            raise ValueError(f"Unsupported row schema '{schema}'")
+        if msgpack is None:
+            raise ValueError("Received a msgpack message but msgpack is not installed")
+        rows = msgpack.unpackb(body, raw=False)
+        received = timings.received_list(headers, len(rows))
+        return [(*row, *timings.row_tail(None, stamp, published, consumed_at_ms)) for row, stamp in zip(rows, received)]
+
+    payload = json.loads(body)
+    # Batched publishes (x-record-count header) carry a JSON array of records
+    payloads = payload if isinstance(payload, list) else [payload]
+    received = timings.received_list(headers, len(payloads))
+    return [json_payload_to_row(payload, None, stamp, published, consumed_at_ms) for payload, stamp in zip(payloads, received)]